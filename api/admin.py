@@ -1,7 +1,21 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from .models import AlertMessage, TurnitinAccount, TurnitinClass,\
     User, Assignment, UserAssignment,PackageConfig,RechargeRecord,\
-        WebUser, WebAssignments, WebUserAssignments, WebTurnitinClass
+        WebUser, WebAssignments, WebUserAssignments, WebTurnitinClass, WebPipelineStatHourly, \
+        WebUserAssignmentsArchive, WebAssignmentTimeline, WebStoredFile
+from .pagination import EstimatedCountPaginator
+from turnitin_admin.service.stats_service import dashboard_data
+from turnitin_admin.service.circuit_breaker import states as circuit_states
+from turnitin_admin.service.timeline_service import stage_percentiles
+from turnitin_admin.service.bulk_transition_service import apply_bulk_transition
+from turnitin_admin.service.credit_service import recharge_web_user
+from turnitin_admin.service.provision_service import provision_web_users, iter_provision_csv, \
+    validate_provision_params, WEB_USER_URL_PREFIX, PROVISION_MAX_COUNT
 
 admin.site.register(AlertMessage)
 admin.site.register(TurnitinAccount)
@@ -51,35 +65,41 @@ class UserAssignmentAdmin(admin.ModelAdmin):
         'create_datetime',  # 创建时间范围筛选
     )
     
-    # 4. 默认排序（按创建时间倒序）
+    # 4. 默认排序（按创建时间倒序，走 create_datetime 索引）
     ordering = ('-create_datetime',)
     
     # 5. 可快速编辑的字段
     list_editable = ('status',)
+
+    # 大表：估算总数，不计算全表结果数
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
-    # 6. 自定义字段显示方法
+    # 6. 列表查询时用子查询一次带出用户昵称，避免每行单独查询 User
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        nick_name = User.objects.filter(wechat_id=OuterRef('user_id')).values('nick_name')[:1]
+        return queryset.annotate(user_nick_name=Subquery(nick_name))
+
+    # 7. 自定义字段显示方法
     def display_user_nickname(self, obj):
         """显示关联用户的昵称"""
-        user = obj.user_info  # 使用之前定义的user_info属性
-        return user.nick_name if user else '--'
+        return obj.user_nick_name or '--'
     display_user_nickname.short_description = '用户昵称'
     display_user_nickname.admin_order_field = 'user_id'  # 支持按user_id排序
 
-    # 7. 重写get_search_results实现智能搜索
+    # 8. 重写get_search_results实现智能搜索
     def get_search_results(self, request, queryset, search_term):
         """
         重写搜索逻辑，支持：
-        1. 直接输入微信ID（精确匹配）
-        2. 输入用户ID（自动关联查询）
+        1. 直接输入微信ID（普通搜索）
+        2. 输入用户ID（子查询关联，不额外查询）
         """
-        # 调用Model的安全搜索方法
-        result_queryset = UserAssignment.search_by_user(search_term)
-        
-        # 如果按用户ID搜索无结果，尝试普通搜索
-        if not result_queryset.exists():
-            return super().get_search_results(request, queryset, search_term)
-            
-        return result_queryset, False
+        search_queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.isdigit():
+            wechat_ids = User.objects.filter(id=int(search_term)).values('wechat_id')
+            search_queryset = search_queryset | queryset.filter(user_id__in=Subquery(wechat_ids))
+        return search_queryset, may_have_duplicates
     
 
 @admin.register(Assignment)
@@ -125,21 +145,25 @@ class RechargeRecordAdmin(admin.ModelAdmin):
     list_display = ('id', 'wechat_id', 'trans_id', 'display_user', 'amount', 'create_datetime')
     search_fields = ('wechat_id',)
     list_filter = ('create_datetime',)
+    # 大表：估算总数，不计算全表结果数
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        user_pk = User.objects.filter(wechat_id=OuterRef('wechat_id')).values('id')[:1]
+        return queryset.annotate(user_pk=Subquery(user_pk))
+
     def display_user(self, obj):
-        user = obj.user_info
-        return f"短ID: 【{user.id}】" if user else ""
+        return f"短ID: 【{obj.user_pk}】" if obj.user_pk else ""
     display_user.short_description = '关联用户'
     
     def get_search_results(self, request, queryset, search_term):
+        search_queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
         if search_term.isdigit():
-            from .models import User
-            try:
-                user = User.objects.get(id=int(search_term))
-                return queryset.filter(wechat_id=user.wechat_id), False
-            except User.DoesNotExist:
-                pass
-        return super().get_search_results(request, queryset, search_term)
+            wechat_ids = User.objects.filter(id=int(search_term)).values('wechat_id')
+            search_queryset = search_queryset | queryset.filter(wechat_id__in=Subquery(wechat_ids))
+        return search_queryset, may_have_duplicates
     
 class WebAdminSite(admin.AdminSite):
     site_header = 'Web平台管理'
@@ -162,19 +186,113 @@ class WebUserAssignmentsAdmin(admin.ModelAdmin):
     list_display = ('id', 'show_user', 'assignment_id', 'title', 'status', 'create_datetime')
     search_fields = ('user_id', 'assignment_id', 'title', 'assignment_id')
     list_filter = ('status', 'create_datetime')
-    list_editable = ('status',)
+    ordering = ('-id',)
+    # 大表：估算总数，不计算全表结果数
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # status 受 FSM 保护，不能在列表页直接编辑，改用下面的批量操作
+    actions = ['bulk_requeue', 'bulk_fail', 'bulk_delete']
     
     # 显示关联用户信息
     def show_user(self, obj):
         return f"{obj.user_id} ({obj.uid})"
     show_user.short_description = '用户信息'
+
+    # 批量状态转换：条件 UPDATE，状态不允许的行跳过
+    def _bulk_transition(self, request, queryset, action):
+        result = apply_bulk_transition(action, queryset.values_list('id', flat=True))
+        self.message_user(
+            request,
+            f"{action}: 选中 {result['requested']} 条，更新 {result['updated']} 条，"
+            f"因状态不允许跳过 {result['skipped']} 条",
+            level=messages.SUCCESS if result['updated'] else messages.WARNING,
+        )
+
+    def bulk_requeue(self, request, queryset):
+        self._bulk_transition(request, queryset, 'requeue')
+
+    def bulk_fail(self, request, queryset):
+        self._bulk_transition(request, queryset, 'fail')
+
+    def bulk_delete(self, request, queryset):
+        self._bulk_transition(request, queryset, 'delete')
+
+    bulk_requeue.short_description = "重新排队上传（提交中/解析中）"
+    bulk_fail.short_description = "标记失败并退还次数"
+    bulk_delete.short_description = "标记删除"
     
     
 
+@admin.register(WebUserAssignmentsArchive)
+class WebUserAssignmentsArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'uid', 'assignment_id', 'title', 'status', 'create_datetime', 'archived_datetime')
+    search_fields = ('=uid', '=id')
+    list_filter = ('status',)
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WebPipelineStatHourly)
+class WebPipelineStatHourlyAdmin(admin.ModelAdmin):
+    """流水线统计看板，只读汇总表"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': '流水线统计看板',
+            **dashboard_data(),
+            'circuit_states': circuit_states(),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/api/webpipelinestathourly/dashboard.html', context)
+
+
+@admin.register(WebAssignmentTimeline)
+class WebAssignmentTimelineAdmin(admin.ModelAdmin):
+    """作业时间线：列表页为各阶段耗时分位数，单个作业的时间线可在详情页查看"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = max(1, min(int(request.GET.get('days', 7)), 90))
+        except ValueError:
+            days = 7
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': '作业各阶段耗时',
+            **stage_percentiles(days=days),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/api/webassignmenttimeline/percentiles.html', context)
+
+
 @admin.register(WebUser)
 class WebUserAdmin(admin.ModelAdmin):
-    # 设置只读字段（包含自动生成的字段）
-    readonly_fields = ('uid', 'create_datetime', 'update_datetime')
+    # 设置只读字段（包含自动生成的字段）；次数只能通过充值操作变更，保证每次变动都有流水
+    readonly_fields = ('uid', 'available_cnt', 'create_datetime', 'update_datetime')
     search_fields = ('uid',)
     # 表单字段排列顺序
     fieldsets = [
@@ -196,93 +314,36 @@ class WebUserAdmin(admin.ModelAdmin):
             return []  # 添加页面显示所有字段
         return super().get_exclude(request, obj)
 
-    # 批量插入方法1：批量插入 100 个中文用户，1 次使用机会
+    # 批量插入：所有快捷操作共用同一个批量创建逻辑
+    def _batch_insert(self, request, count, language, credits, nick_prefix):
+        uids = [WEB_USER_URL_PREFIX + user.uid
+                for user in provision_web_users(count, language, credits, nick_prefix)]
+        language_name = '中文' if language == 'zh' else '英文'
+        self.message_user(request, f"成功批量插入 {count} 个{language_name}用户，{credits} 次使用机会。插入的用户 UID：{', '.join(uids)}")
+
     def batch_insert_chinese_1(self, request, queryset):
-        new_users = [
-            WebUser(language='zh', nick_name=f'用户{i}', available_cnt=1)
-            for i in range(100)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 100 个中文用户，1 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 100, 'zh', 1, '用户')
 
-    # 批量插入方法2：批量插入 10 个中文用户，3 次使用机会
     def batch_insert_chinese_3(self, request, queryset):
-        new_users = [
-            WebUser(language='zh', nick_name=f'用户{i}', available_cnt=3)
-            for i in range(10)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 10 个中文用户，3 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 10, 'zh', 3, '用户')
 
-    # 批量插入方法3：批量插入 10 个中文用户，5 次使用机会
     def batch_insert_chinese_5(self, request, queryset):
-        new_users = [
-            WebUser(language='zh', nick_name=f'用户{i}', available_cnt=5)
-            for i in range(10)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 10 个中文用户，5 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 10, 'zh', 5, '用户')
 
-    # 批量插入方法4：批量插入 10 个中文用户，12 次使用机会
     def batch_insert_chinese_12(self, request, queryset):
-        new_users = [
-            WebUser(language='zh', nick_name=f'用户{i}', available_cnt=12)
-            for i in range(10)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 10 个中文用户，12 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 10, 'zh', 12, '用户')
 
-    # 批量插入方法5：批量插入 100 个英文用户，1 次使用机会
     def batch_insert_english_1(self, request, queryset):
-        new_users = [
-            WebUser(language='en', nick_name=f'User{i}', available_cnt=1)
-            for i in range(100)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 100 个英文用户，1 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 100, 'en', 1, 'User')
 
-    # 批量插入方法6：批量插入 10 个英文用户，3 次使用机会
     def batch_insert_english_3(self, request, queryset):
-        new_users = [
-            WebUser(language='en', nick_name=f'User{i}', available_cnt=3)
-            for i in range(10)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 10 个英文用户，3 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 10, 'en', 3, 'User')
 
-    # 批量插入方法7：批量插入 10 个英文用户，5 次使用机会
     def batch_insert_english_5(self, request, queryset):
-        new_users = [
-            WebUser(language='en', nick_name=f'User{i}', available_cnt=5)
-            for i in range(10)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 10 个英文用户，5 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 10, 'en', 5, 'User')
 
-    # 批量插入方法8：批量插入 10 个英文用户，12 次使用机会
     def batch_insert_english_12(self, request, queryset):
-        new_users = [
-            WebUser(language='en', nick_name=f'User{i}', available_cnt=12)
-            for i in range(10)
-        ]
-        WebUser.objects.bulk_create(new_users)
-        
-        uids = ['https://turnitingood.com/' + user.uid for user in new_users]
-        self.message_user(request, f"成功批量插入 10 个英文用户，12 次使用机会。插入的用户 UID：{', '.join(map(str, uids))}")
+        self._batch_insert(request, 10, 'en', 12, 'User')
 
     # 为操作添加描述
     batch_insert_chinese_1.short_description = "批量插入 100 个中文用户，1 次使用机会"
@@ -294,8 +355,38 @@ class WebUserAdmin(admin.ModelAdmin):
     batch_insert_english_5.short_description = "批量插入 10 个英文用户，5 次使用机会"
     batch_insert_english_12.short_description = "批量插入 10 个英文用户，12 次使用机会"
 
+    def recharge_selected(self, request, queryset):
+        """充值：先显示表单，确认后为每个选中用户写充值记录并加次数"""
+        if 'apply' in request.POST:
+            try:
+                cnt = int(request.POST.get('cnt', 0))
+                amount = int(request.POST.get('amount') or 0)
+                if cnt <= 0 or amount < 0:
+                    raise ValueError("充值次数必须大于 0，金额不能为负数")
+            except ValueError as e:
+                self.message_user(request, f"参数错误: {e}", level=messages.ERROR)
+                return None
+            trans_id = request.POST.get('trans_id', '').strip()
+            uids = list(queryset.values_list('uid', flat=True))
+            for uid in uids:
+                recharge_web_user(uid, cnt, amount, trans_id)
+            self.message_user(request, f"已为 {len(uids)} 个用户各充值 {cnt} 次")
+            return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': '充值',
+            'queryset': queryset,
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/api/webuser/recharge.html', context)
+
+    recharge_selected.short_description = "为选中用户充值"
+
     # 将批量插入操作添加到 actions 中
     actions = [
+        'recharge_selected',
         'batch_insert_chinese_1',
         'batch_insert_chinese_3',
         'batch_insert_chinese_5',
@@ -305,3 +396,55 @@ class WebUserAdmin(admin.ModelAdmin):
         'batch_insert_english_5',
         'batch_insert_english_12',
     ]
+
+    # 大批量创建：参数化表单，结果以 CSV 流式下载
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('provision/', self.admin_site.admin_view(self.provision_view), name='api_webuser_provision'),
+        ]
+        return custom_urls + urls
+
+    def provision_view(self, request):
+        if request.method == 'POST':
+            try:
+                count = int(request.POST.get('count', 0))
+                credits = int(request.POST.get('credits', 1))
+                language = request.POST.get('language', 'zh')
+                nick_prefix = request.POST.get('nick_prefix', '')
+                validate_provision_params(count, language, credits)
+            except ValueError as e:
+                self.message_user(request, f"参数错误: {e}", level=messages.ERROR)
+            else:
+                filename = f"web_users_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                response = StreamingHttpResponse(
+                    iter_provision_csv(count, language, credits, nick_prefix),
+                    content_type='text/csv; charset=utf-8',
+                )
+                response['Content-Disposition'] = f'attachment; filename="{filename}"'
+                return response
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': '批量创建 Web 用户',
+            'language_choices': WebUser.LANGUAGE_CHOICES,
+            'max_count': PROVISION_MAX_COUNT,
+        }
+        return TemplateResponse(request, 'admin/api/webuser/provision.html', context)
+
+
+@admin.register(WebStoredFile)
+class WebStoredFileAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_id', 'kind', 'path', 'size', 'create_datetime')
+    search_fields = ('=job_id', '=content_hash')
+    list_filter = ('kind',)
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
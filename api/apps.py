@@ -6,6 +6,8 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     def ready(self):
+        from . import signals  # noqa: F401  注册状态转换统计
+
         # 仅在主进程中启动，避免多进程重复
         if os.environ.get('RUN_MAIN', None) != 'true' or 'pytest' in sys.argv[0]:
             return
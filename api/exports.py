@@ -0,0 +1,91 @@
+import csv
+import json
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from turnitin_admin.service.provision_service import Echo
+from .filters import filter_by_params
+from .models import UserAssignment, RechargeRecord, WebUserAssignments
+
+# 每批读取的行数；按主键 keyset 分批，MySQL 驱动不支持服务端游标时内存同样恒定
+EXPORT_CHUNK_SIZE = 2000
+
+# 导出名 -> (模型, 导出字段, 可过滤字段, 时间范围字段)
+EXPORTS = {
+    'web_user_assignments': (
+        WebUserAssignments,
+        ['id', 'uid', 'user_id', 'title', 'origin_title', 'assignment_id', 'status', 'create_datetime', 'update_datetime'],
+        {'status': 'status', 'uid': 'uid', 'user_id': 'user_id'},
+        'create_datetime',
+    ),
+    'user_assignment': (
+        UserAssignment,
+        ['id', 'user_id', 'filename', 'title', 'assignment_id', 'status', 'create_datetime', 'update_datetime'],
+        {'status': 'status', 'user_id': 'user_id'},
+        'create_datetime',
+    ),
+    'recharge_record': (
+        RechargeRecord,
+        ['id', 'wechat_id', 'trans_id', 'amount', 'create_datetime', 'update_datetime'],
+        {'wechat_id': 'wechat_id'},
+        'create_datetime',
+    ),
+}
+
+
+def iter_export_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """按主键 keyset 分批读取，每批只保留 chunk_size 行"""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+@require_GET
+@staff_member_required
+def export_view(request, name):
+    """
+    流式导出：/turnitingood/export/<name>/?output=csv|ndjson&status=...&created_after=...&created_before=...
+    """
+    if name not in EXPORTS:
+        return JsonResponse({'error': f'未知的导出类型: {name}', 'status': 'error'}, status=404)
+    output = request.GET.get('output', 'csv')
+    if output not in ('csv', 'ndjson'):
+        return JsonResponse({'error': 'output 只支持 csv 或 ndjson', 'status': 'error'}, status=400)
+
+    model, fields, filter_fields, date_field = EXPORTS[name]
+    try:
+        queryset = filter_by_params(model.objects.all(), request.GET, filter_fields, date_field)
+    except ValidationError as e:
+        return JsonResponse({'error': '参数错误', 'details': e.detail, 'status': 'error'}, status=400)
+
+    rows = iter_export_rows(queryset, fields)
+    if output == 'csv':
+        content, content_type = iter_csv(rows, fields), 'text/csv; charset=utf-8'
+    else:
+        content, content_type = iter_ndjson(rows, fields), 'application/x-ndjson; charset=utf-8'
+
+    filename = f"{name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{output}"
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,41 @@
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def _parse_datetime_param(name, value):
+    parsed = parse_datetime(value) or parse_date(value)
+    if parsed is None:
+        raise ValidationError({name: '无效的日期格式，应为 YYYY-MM-DD 或 ISO 8601'})
+    return parsed
+
+
+def filter_by_params(queryset, params, filter_fields=None, date_field=None):
+    """
+    按查询参数过滤
+    filter_fields: {参数名: 模型字段}，只应声明有索引的字段
+    date_field: 支持 created_after / created_before 范围过滤的时间字段
+    """
+    for param, field in (filter_fields or {}).items():
+        value = params.get(param)
+        if value:
+            queryset = queryset.filter(**{field: value})
+
+    if date_field:
+        created_after = params.get('created_after')
+        if created_after:
+            queryset = queryset.filter(**{f'{date_field}__gte': _parse_datetime_param('created_after', created_after)})
+        created_before = params.get('created_before')
+        if created_before:
+            queryset = queryset.filter(**{f'{date_field}__lt': _parse_datetime_param('created_before', created_before)})
+    return queryset
+
+
+class QueryParamFilterMixin:
+    """ViewSet 混入：根据 filter_fields / date_filter_field 声明过滤 queryset"""
+    filter_fields = {}
+    date_filter_field = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return filter_by_params(queryset, self.request.query_params,
+                                self.filter_fields, self.date_filter_field)
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from turnitin_admin.bench import serializer_bench
+
+
+class Command(BaseCommand):
+    help = '列表序列化微基准（不访问数据库），输出 JSON 结果'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='行数')
+        parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+
+    def handle(self, *args, **options):
+        result = serializer_bench.run(options['rows'], options['repeat'])
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from turnitin_admin import tasks, view
+from turnitin_admin.query_budget import missing_budgets, registered_budgets
+
+# 必须声明查询预算的视图和后台任务
+BUDGETED_VIEWS = ['home_view', 'upload_file', 'get_web_user_assignments', 'delete_job', 'download_file', 'metrics_view']
+BUDGETED_TASKS = ['download_reports', '_download_one', '_upload_to_turnitin_task', '_upload_one', 'failed_task',
+                  'archive_finished_assignments', 'update_queue_depth']
+
+
+class Command(BaseCommand):
+    help = ('检查视图 / 后台任务是否都声明了 SQL 查询预算并列出预算；'
+            '预算是否够用由 turnitin_admin.tests.QueryBudgetTests 以严格模式实际调用检查')
+
+    def handle(self, *args, **options):
+        missing = [f'view.{name}' for name in missing_budgets(view, BUDGETED_VIEWS)]
+        missing += [f'tasks.{name}' for name in missing_budgets(tasks, BUDGETED_TASKS)]
+        if missing:
+            raise CommandError(f"未声明查询预算: {', '.join(missing)}")
+
+        for name, budget in sorted(registered_budgets.items()):
+            self.stdout.write(f"{name}: {budget}")
@@ -0,0 +1,130 @@
+import hashlib
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from api.models import WebUserAssignments, WebUserAssignmentsArchive, WebStoredFile, WebReportIndex
+from turnitin_admin.service import storage_service
+
+Kind = WebStoredFile.Kind
+REPORT_KINDS = [Kind.AI_REPORT, Kind.PLAGIARISM_REPORT]
+
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with default_storage.open(path, 'rb') as source:
+        for chunk in source.chunks():
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('把旧布局（<user_id>/<标题><ext>，报告在同目录）的论文和报告复制到新布局并登记文件清单；'
+            '可重复执行，已登记的作业跳过。--delete-legacy 删除不再被引用的旧文件')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不复制也不写数据库')
+        parser.add_argument('--delete-legacy', action='store_true', help='迁移完成后删除不再被引用的旧文件')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.stats = {'migrated': 0, 'missing': 0, 'overwritten': 0, 'reports': 0, 'legacy_deleted': 0}
+        self.legacy_papers = set()
+        for model in (WebUserAssignments, WebUserAssignmentsArchive):
+            self._migrate_model(model, options['batch_size'])
+        if options['delete_legacy'] and not self.dry_run:
+            self._delete_legacy()
+        self.stdout.write(', '.join(f'{name}={count}' for name, count in self.stats.items()))
+
+    def _migrate_model(self, model, batch_size):
+        migrated_ids = WebStoredFile.objects.filter(kind=Kind.PAPER).values('job_id')
+        last_id = 0
+        while True:
+            jobs = list(
+                model.objects.filter(id__gt=last_id).exclude(id__in=migrated_ids)
+                .exclude(filepath__isnull=True).exclude(filepath='')
+                .only('id', 'filepath', 'content_hash').order_by('id')[:batch_size]
+            )
+            if not jobs:
+                break
+            for job in jobs:
+                self._migrate_job(model, job)
+            last_id = jobs[-1].id
+            self.stdout.write(f'{model.__name__}: 已处理到 id {last_id}')
+
+    def _migrate_job(self, model, job):
+        legacy = job.filepath
+        if not default_storage.exists(legacy):
+            self.stats['missing'] += 1
+            return
+        if legacy.startswith(storage_service.PAPERS_DIR + '/'):
+            # 已在新布局但缺少清单记录，只补登记
+            if not self.dry_run:
+                storage_service.record_file(job.id, Kind.PAPER, legacy, default_storage.size(legacy), job.content_hash)
+            self.stats['migrated'] += 1
+            return
+        content_hash = _sha256(legacy)
+        if self._overwritten(job, legacy, content_hash):
+            # 旧布局同名文件互相覆盖，磁盘上已不是该作业的论文，不迁移
+            self.stats['overwritten'] += 1
+            self.stderr.write(f'作业 {job.id} 的论文已被同名文件覆盖，跳过: {legacy}')
+            return
+        self.legacy_papers.add(legacy)
+        if self.dry_run:
+            self.stats['migrated'] += 1
+            return
+
+        paper = storage_service.paper_path(content_hash, Path(legacy).suffix.lower())
+        if not default_storage.exists(paper):
+            storage_service.copy_file(legacy, paper)
+        reports = {}
+        for kind in REPORT_KINDS:
+            old = storage_service.legacy_path(legacy, kind)
+            if default_storage.exists(old):
+                new = storage_service.report_path(job.id, kind)
+                storage_service.copy_file(old, new)
+                reports[kind] = (old, new)
+
+        with transaction.atomic():
+            storage_service.record_file(job.id, Kind.PAPER, paper, default_storage.size(paper), content_hash)
+            for kind, (old, new) in reports.items():
+                storage_service.record_file(job.id, kind, new, default_storage.size(new))
+            model.objects.filter(id=job.id).update(filepath=paper, content_hash=content_hash)
+            # 去重索引中该作业的报告路径同步改到新位置
+            for kind, field in ((Kind.AI_REPORT, 'ai_path'), (Kind.PLAGIARISM_REPORT, 'plagiarism_path')):
+                if kind in reports:
+                    old, new = reports[kind]
+                    WebReportIndex.objects.filter(source_job_id=job.id, **{field: old}).update(**{field: new})
+        self.stats['migrated'] += 1
+        self.stats['reports'] += len(reports)
+
+    def _overwritten(self, job, legacy, content_hash):
+        """
+        有哈希的作业直接比较；没有哈希的旧作业无法比较内容，
+        同一路径之后又有作业上传（id 更大）时视为已被覆盖
+        """
+        if job.content_hash:
+            return job.content_hash != content_hash
+        # 旧布局 filepath 与逻辑名 filename 相同；之后的作业迁移后 filepath 已改，按 filename 仍能找到
+        later = Q(filepath=legacy) | Q(filename=legacy)
+        return WebUserAssignments.objects.filter(later, id__gt=job.id).exists() \
+            or WebUserAssignmentsArchive.objects.filter(later, id__gt=job.id).exists()
+
+    def _delete_legacy(self):
+        """旧论文不再被任何作业 / 清单引用时，连同同目录的报告一起删除"""
+        for legacy in self.legacy_papers:
+            paths = [legacy] + [storage_service.legacy_path(legacy, kind) for kind in REPORT_KINDS]
+            if WebUserAssignments.objects.filter(filepath=legacy).exists() \
+                    or WebUserAssignmentsArchive.objects.filter(filepath=legacy).exists() \
+                    or WebStoredFile.objects.filter(path__in=paths).exists() \
+                    or WebReportIndex.objects.filter(ai_path__in=paths).exists() \
+                    or WebReportIndex.objects.filter(plagiarism_path__in=paths).exists():
+                continue
+            for path in paths:
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                    self.stats['legacy_deleted'] += 1
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from turnitin_admin.service.provision_service import iter_provision_csv, validate_provision_params, \
+    PROVISION_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = '批量创建 Web 用户，并以 CSV 输出访问链接'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, required=True, help='创建数量')
+        parser.add_argument('--language', choices=['zh', 'en'], default='zh', help='页面语言')
+        parser.add_argument('--credits', type=int, default=1, help='每个用户的可用次数')
+        parser.add_argument('--prefix', default='用户', help='昵称前缀，后接序号')
+        parser.add_argument('--chunk-size', type=int, default=PROVISION_CHUNK_SIZE, help='每批 bulk_create 的数量')
+        parser.add_argument('--output', help='输出 CSV 文件路径，默认输出到标准输出')
+
+    def handle(self, *args, **options):
+        try:
+            validate_provision_params(options['count'], options['language'], options['credits'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = iter_provision_csv(options['count'], options['language'], options['credits'],
+                                  options['prefix'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(rows)
+            self.stderr.write(f"已创建 {options['count']} 个用户，结果写入 {options['output']}")
+        else:
+            sys.stdout.writelines(rows)
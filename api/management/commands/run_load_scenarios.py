@@ -0,0 +1,71 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import WebUserAssignments
+from turnitin_admin.bench import load_scenarios, seed
+from turnitin_admin.bench.common import run_metadata
+
+LOADTEST_SETTINGS = 'turnitin_admin.settings_loadtest'
+
+
+class Command(BaseCommand):
+    help = ('学生端流量压测：按并发阶梯驱动已启动的 Django 服务，输出各接口饱和点。'
+            '与被测服务使用相同的 settings_loadtest 配置')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='被测 Django 服务地址')
+        parser.add_argument('--scenario', nargs='+', default=list(load_scenarios.SCENARIOS),
+                            choices=list(load_scenarios.SCENARIOS))
+        parser.add_argument('--steps', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32, 64],
+                            help='并发阶梯（虚拟用户数）；polling 场景建议使用更大的值')
+        parser.add_argument('--duration', type=float, default=30, help='每个阶段持续秒数')
+        parser.add_argument('--users', type=int, default=2000, help='压测用户数')
+        parser.add_argument('--history-rows', type=int, default=100_000, help='历史作业行数')
+        parser.add_argument('--poll-interval', type=float, default=30)
+        parser.add_argument('--upload-size-kb', type=int, default=100)
+        parser.add_argument('--slo-p95-ms', type=float, default=2000)
+        parser.add_argument('--max-error-rate', type=float, default=0.01)
+        parser.add_argument('--output', help='结果写入文件（JSON），默认输出到标准输出')
+
+    def handle(self, *args, **options):
+        if settings.SETTINGS_MODULE != LOADTEST_SETTINGS:
+            raise CommandError(f'请使用 DJANGO_SETTINGS_MODULE={LOADTEST_SETTINGS} 运行，避免向正式库写入压测数据')
+        if not all(step > 0 for step in options['steps']):
+            raise CommandError('--steps 必须为正整数')
+
+        seed.ensure_turnitin_class()
+        seed.seed_history(max(options['history_rows'], options['users'] * seed.JOBS_PER_USER))
+        uids = [seed.bench_uid(i) for i in range(options['users'])]
+
+        finished = list(
+            WebUserAssignments.objects.filter(uid__startswith=seed.BENCH_PREFIX,
+                                              status=WebUserAssignments.Status.DOWNLOADED)
+            .order_by('-id')[:20000]
+        )
+        downloadable, deletable = finished[:1000], finished[1000:]
+        seed.write_reports(downloadable)
+
+        ctx = load_scenarios.ScenarioContext(
+            uids=uids,
+            downloadable=[(job.uid, job.id) for job in downloadable],
+            deletable=[(job.uid, job.id) for job in deletable],
+            upload_size_kb=options['upload_size_kb'],
+            poll_interval=options['poll_interval'],
+        )
+        result = {
+            'meta': {**run_metadata(), 'base_url': options['base_url'], 'duration': options['duration']},
+            'scenarios': load_scenarios.run(
+                options['base_url'], options['scenario'], sorted(options['steps']), options['duration'], ctx,
+                slo_p95_ms=options['slo_p95_ms'], max_error_rate=options['max_error_rate'],
+            ),
+        }
+
+        text = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text)
+            self.stdout.write(f"结果已写入 {options['output']}")
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,61 @@
+import json
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import WebTurnitinClass
+from turnitin_admin.bench import pipeline_bench
+from turnitin_admin.bench.seed import BENCH_CLASS_NAME
+from turnitin_admin.bench.common import parse_scale
+from turnitin_admin.bench.turnitin_standin import StandinConfig, start_in_thread
+from turnitin_admin.service.turnitin_web_constants import STANDIN_URL
+
+
+class Command(BaseCommand):
+    help = '上传→报告流水线和学生端接口压测（需设置 TURNITIN_STANDIN_URL，只在压测数据库上运行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', nargs='+', default=['1k'], help='历史作业行数：1k / 100k / 1m 或具体数字')
+        parser.add_argument('--sweep-jobs', type=int, default=20, help='每个后台任务处理的作业数')
+        parser.add_argument('--requests', type=int, default=200, help='每个接口的请求数')
+        parser.add_argument('--external-standin', action='store_true',
+                            help='替身服务已单独启动（run_turnitin_standin），不在本进程内启动')
+        parser.add_argument('--standin-latency-ms', type=float, default=5)
+        parser.add_argument('--keep-data', action='store_true', help='保留压测数据，下次运行可直接复用')
+        parser.add_argument('--output', help='结果写入文件（JSON），默认输出到标准输出')
+        parser.add_argument('--compare', help='与之前的结果文件对比')
+
+    def handle(self, *args, **options):
+        if not STANDIN_URL:
+            raise CommandError('未设置 TURNITIN_STANDIN_URL，压测不能访问真实的 Turnitin')
+        try:
+            scales = [parse_scale(value) for value in options['scale']]
+        except ValueError as e:
+            raise CommandError(f'无效的 --scale: {e}')
+
+        server = None
+        if not options['external_standin']:
+            address = urlsplit(STANDIN_URL)
+            active = WebTurnitinClass.objects.filter(active_flag='Y').first()
+            class_name = active.class_name if active else BENCH_CLASS_NAME
+            config = StandinConfig(class_name=class_name, latency_ms=options['standin_latency_ms'],
+                                   latency_jitter_ms=0, metadata_delay_s=0, ai_delay_s=0, similarity_delay_s=0)
+            server, _ = start_in_thread(config, address.hostname, address.port)
+
+        try:
+            result = pipeline_bench.run(scales, options['sweep_jobs'], options['requests'], options['keep_data'])
+        finally:
+            if server:
+                server.shutdown()
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                result['comparison'] = pipeline_bench.compare(json.load(baseline), result)
+
+        text = json.dumps(result, indent=2, ensure_ascii=False, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text)
+            self.stdout.write(f"结果已写入 {options['output']}")
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from turnitin_admin.bench.turnitin_standin import StandinConfig, StandinServer
+
+
+def _parse_overrides(values, option):
+    """endpoint=value 形式的参数，endpoint 为 http_session.classify_endpoint 的逻辑接口名"""
+    overrides = {}
+    for value in values or []:
+        endpoint, sep, number = value.partition('=')
+        if not sep:
+            raise CommandError(f"{option} 格式应为 endpoint=value: {value}")
+        try:
+            overrides[endpoint] = float(number)
+        except ValueError:
+            raise CommandError(f"{option} 的值不是数字: {value}")
+    return overrides
+
+
+class Command(BaseCommand):
+    help = '启动本地 Turnitin 替身服务；配合环境变量 TURNITIN_STANDIN_URL 做离线压测'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--class-name', default=None, help='班级名，需与 WebTurnitinClass 中启用的班级一致')
+        parser.add_argument('--ports', type=int, default=5, help='作业端口数')
+        parser.add_argument('--latency-ms', type=float, default=50)
+        parser.add_argument('--latency-jitter-ms', type=float, default=20)
+        parser.add_argument('--failure-rate', type=float, default=0.0)
+        parser.add_argument('--latency', action='append', metavar='ENDPOINT=MS', help='按接口覆盖延迟，可重复')
+        parser.add_argument('--failure', action='append', metavar='ENDPOINT=RATE', help='按接口覆盖失败率，可重复')
+        parser.add_argument('--metadata-delay', type=float, default=2, help='元数据就绪时间（秒）')
+        parser.add_argument('--ai-delay', type=float, default=10, help='AI 报告生成时间（秒）')
+        parser.add_argument('--similarity-delay', type=float, default=5, help='重复率 PDF 生成时间（秒）')
+        parser.add_argument('--pdf-size-kb', type=int, default=200)
+
+    def handle(self, *args, **options):
+        class_name = options['class_name']
+        if class_name is None:
+            from api.models import WebTurnitinClass
+            active = WebTurnitinClass.objects.filter(active_flag='Y').first()
+            class_name = active.class_name if active else StandinConfig.class_name
+
+        config = StandinConfig(
+            class_name=class_name,
+            ports=options['ports'],
+            latency_ms=options['latency_ms'],
+            latency_jitter_ms=options['latency_jitter_ms'],
+            failure_rate=options['failure_rate'],
+            endpoint_latency_ms=_parse_overrides(options['latency'], '--latency'),
+            endpoint_failure_rate=_parse_overrides(options['failure'], '--failure'),
+            metadata_delay_s=options['metadata_delay'],
+            ai_delay_s=options['ai_delay'],
+            similarity_delay_s=options['similarity_delay'],
+            pdf_size_kb=options['pdf_size_kb'],
+        )
+        server = StandinServer((options['host'], options['port']), config)
+        url = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(f"Turnitin 替身服务已启动: {url}")
+        self.stdout.write(f"设置 TURNITIN_STANDIN_URL={url} 后启动 Web / qcluster")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -449,6 +449,7 @@ class UserAssignment(models.Model):
             models.Index(fields=['user_id'], name='idx_user_assignment_user_id'),
             models.Index(fields=['assignment_id'], name='idx_user_assignment_id'),
             models.Index(fields=['status'], name='idx_user_assignment_status'),
+            models.Index(fields=['create_datetime'], name='idx_user_assignment_ctime'),
         ]
 
     def __str__(self):
@@ -553,6 +554,7 @@ class RechargeRecord(models.Model):
         ordering = ['-create_datetime']
         indexes = [
             models.Index(fields=['wechat_id'], name='idx_recharge_wechat_id'),
+            models.Index(fields=['create_datetime'], name='idx_recharge_ctime'),
         ]
 
     def __str__(self):
@@ -656,6 +658,7 @@ class WebUserAssignments(models.Model):
         DOWNLOADED = 'DOWNLOADED', '已下载'
         DELETED = 'DELETED', '删除'
         FAILED = 'FAILED', '失败'
+        RETRY = 'RETRY', '重新排队'
     
     status = FSMField(
         choices=Status.choices,
@@ -682,8 +685,16 @@ class WebUserAssignments(models.Model):
     filepath = models.CharField(max_length=255, null=True, blank=True)
     filter_quote = models.CharField(max_length=255, null=True, blank=True)
     filter_reference = models.CharField(max_length=255, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # 上传文件的 sha256
+    previous_assignment_id = models.CharField(max_length=50, null=True, blank=True)  # 重新排队前的端口，重新上传时避开
+    requeue_datetime = models.DateTimeField(null=True, blank=True)  # 最近一次重新排队时间，超时从此起算
     create_datetime = models.DateTimeField(auto_now_add=True)
     update_datetime = models.DateTimeField(auto_now=True)
+
+    @property
+    def timeout_start(self):
+        """超时起算时间：重新排队过的作业从重新排队时算起"""
+        return self.requeue_datetime or self.create_datetime
     
     @transition(
     field=status,
@@ -708,14 +719,19 @@ class WebUserAssignments(models.Model):
         """禁止从 FAILED 状态转到任何其他状态"""
         raise ValueError("FAILED 状态不可变更")
 
-    @transition(field=status, source=[Status.SUBMITTED, Status.ANALYSING, Status.DOWNLOADED, Status.FAILED], target=Status.DELETED)
+    @transition(field=status, source=[Status.SUBMITTED, Status.ANALYSING, Status.DOWNLOADED, Status.FAILED, Status.RETRY], target=Status.DELETED)
     def mark_delete(self):
         """只允许从 SUBMITTED 状态转换到 ANALYSING"""
         pass
     
-    @transition(field=status, source=[Status.SUBMITTED], target=Status.ANALYSING)
+    @transition(field=status, source=[Status.SUBMITTED, Status.RETRY], target=Status.ANALYSING)
     def mark_analysising(self):
-        """只允许从 SUBMITTED 状态转换到 ANALYSING"""
+        """只允许从 SUBMITTED / RETRY 状态转换到 ANALYSING"""
+        pass
+
+    @transition(field=status, source=[Status.SUBMITTED, Status.ANALYSING], target=Status.RETRY)
+    def mark_retry(self):
+        """处理中的作业重新排队上传（FAILED 不可重新排队）"""
         pass
     
     @transition(field=status, source=[Status.ANALYSING], target=Status.DOWNLOADED)
@@ -723,7 +739,7 @@ class WebUserAssignments(models.Model):
         """只允许从 ANALYSING 状态转换到 DOWNLOADED"""
         pass
 
-    @transition(field=status, source=[Status.SUBMITTED, Status.ANALYSING], target=Status.FAILED)
+    @transition(field=status, source=[Status.SUBMITTED, Status.ANALYSING, Status.RETRY], target=Status.FAILED)
     def mark_failed(self):
         """任何状态都可以标记为失败（但失败后不可逆）"""
         pass
@@ -736,7 +752,200 @@ class WebUserAssignments(models.Model):
             models.Index(fields=['user_id', 'uid'], name='idx_user_assign_user'),
             models.Index(fields=['assignment_id'], name='idx_user_assign_assign'),
             models.Index(fields=['status'], name='idx_user_assign_status'),
+            models.Index(fields=['uid', 'create_datetime', 'id'], name='idx_user_assign_uid_ctime'),
+            models.Index(fields=['create_datetime'], name='idx_user_assign_ctime'),
+            models.Index(fields=['status', 'update_datetime'], name='idx_user_assign_status_utime'),
         ]
         
     def __str__(self):
-        return f"{self.title} ({self.status}) by User {self.user_id}"
\ No newline at end of file
+        return f"{self.title} ({self.status}) by User {self.user_id}"
+
+
+class WebReportIndex(models.Model):
+    """
+    内容哈希 -> 报告 索引
+    相同文件（相同过滤设置）在时间窗口内再次上传时直接复用已有报告
+    """
+    id = models.BigAutoField(primary_key=True)
+    content_hash = models.CharField(max_length=64)
+    filter_quote = models.CharField(max_length=255, default='', blank=True)
+    filter_reference = models.CharField(max_length=255, default='', blank=True)
+    ai_path = models.CharField(max_length=255, null=True, blank=True)
+    plagiarism_path = models.CharField(max_length=255)
+    source_job_id = models.BigIntegerField()  # 生成报告的 WebUserAssignments.id
+    hit_count = models.IntegerField(default=0)
+    create_datetime = models.DateTimeField(auto_now_add=True)
+    update_datetime = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'web_report_index'
+        verbose_name = 'Web Report Index'
+        verbose_name_plural = 'Web Report Index'
+        indexes = [
+            models.Index(fields=['content_hash', 'filter_quote', 'filter_reference', 'create_datetime'],
+                         name='idx_report_index_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} -> job {self.source_job_id}"
+
+
+class WebCreditLedger(models.Model):
+    """
+    Web 用户额度流水（只追加，不修改）
+    available_cnt 的每次变动都对应一条流水
+    """
+    class Reason(models.TextChoices):
+        UPLOAD_DEBIT = 'UPLOAD_DEBIT', '上传扣减'
+        FAILURE_REFUND = 'FAILURE_REFUND', '失败退还'
+        RECHARGE_CREDIT = 'RECHARGE_CREDIT', '充值'
+        PROVISION_CREDIT = 'PROVISION_CREDIT', '开户赠送'
+
+    id = models.BigAutoField(primary_key=True)
+    uid = models.CharField(max_length=33)
+    delta = models.IntegerField()  # 正数为增加，负数为扣减
+    reason = models.CharField(max_length=20, choices=Reason.choices)
+    job_id = models.BigIntegerField(null=True, blank=True)  # WebUserAssignments.id
+    recharge_record_id = models.BigIntegerField(null=True, blank=True)  # RechargeRecord.id
+    create_datetime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'web_credit_ledger'
+        verbose_name = 'Web Credit Ledger'
+        verbose_name_plural = 'Web Credit Ledger'
+        indexes = [
+            models.Index(fields=['uid', 'create_datetime'], name='idx_credit_ledger_uid'),
+            models.Index(fields=['job_id'], name='idx_credit_ledger_job'),
+        ]
+
+    def __str__(self):
+        return f"{self.uid} {self.delta:+d} ({self.reason})"
+
+
+class WebPipelineStatHourly(models.Model):
+    """
+    流水线统计汇总（小时 × 状态 × 端口 × 耗时分桶）
+    由 WebUserAssignments 的状态转换增量维护，看板只读这张表
+    """
+    id = models.BigAutoField(primary_key=True)
+    hour = models.DateTimeField()  # 截断到整点
+    status = models.CharField(max_length=20)  # 转换后的状态
+    port = models.CharField(max_length=50, default='', blank=True)  # Turnitin 端口（assignment_id）
+    latency_bucket = models.SmallIntegerField(default=0)  # 从提交到该状态的耗时分桶
+    count = models.IntegerField(default=0)
+    latency_sum_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'web_pipeline_stat_hourly'
+        verbose_name = '流水线统计'
+        verbose_name_plural = '流水线统计'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'status', 'port', 'latency_bucket'],
+                                    name='uniq_pipeline_stat_hourly'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'hour'], name='idx_pipeline_stat_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}:00 {self.status} {self.port} x{self.count}"
+
+
+class WebAssignmentTimeline(models.Model):
+    """
+    作业流水线时间线，每个作业一行，每个阶段一列（第一次到达该阶段的时间）
+    由 turnitin_admin.service.timeline_service.record_stage 写入
+    """
+    job_id = models.BigIntegerField(primary_key=True)  # WebUserAssignments.id（归档后仍保留）
+    stored_at = models.DateTimeField(null=True, blank=True)  # 文件落盘，作业创建
+    picked_up_at = models.DateTimeField(null=True, blank=True)  # 上传任务取到作业
+    uploaded_at = models.DateTimeField(null=True, blank=True)  # t_submit 返回
+    uuid_received_at = models.DateTimeField(null=True, blank=True)
+    metadata_ready_at = models.DateTimeField(null=True, blank=True)
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+    oid_found_at = models.DateTimeField(null=True, blank=True)
+    ai_job_created_at = models.DateTimeField(null=True, blank=True)
+    ai_ready_at = models.DateTimeField(null=True, blank=True)
+    similarity_ready_at = models.DateTimeField(null=True, blank=True)
+    saved_at = models.DateTimeField(null=True, blank=True)  # 报告保存，状态 DOWNLOADED
+
+    class Meta:
+        db_table = 'web_assignment_timeline'
+        verbose_name = '作业时间线'
+        verbose_name_plural = '作业时间线'
+        indexes = [
+            models.Index(fields=['stored_at'], name='idx_timeline_stored'),
+        ]
+
+    def __str__(self):
+        return f"Timeline of job {self.job_id}"
+
+
+class WebStoredFile(models.Model):
+    """
+    作业文件清单：作业 -> 论文 / 报告的存储路径和大小
+    论文按内容哈希存放，相同内容的作业共用一个文件；删除时只有最后一个引用才删除文件
+    由 turnitin_admin.service.storage_service 维护
+    """
+    class Kind(models.TextChoices):
+        PAPER = 'PAPER', '论文'
+        AI_REPORT = 'AI_REPORT', 'AI 报告'
+        PLAGIARISM_REPORT = 'PLAGIARISM_REPORT', '重复率报告'
+
+    id = models.BigAutoField(primary_key=True)
+    job_id = models.BigIntegerField()  # WebUserAssignments.id（归档后仍保留）
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    path = models.CharField(max_length=255)  # 相对 MEDIA_ROOT
+    size = models.BigIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    create_datetime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'web_stored_file'
+        verbose_name = '作业文件'
+        verbose_name_plural = '作业文件'
+        constraints = [
+            models.UniqueConstraint(fields=['job_id', 'kind'], name='uniq_stored_file_job_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['path'], name='idx_stored_file_path'),
+        ]
+
+    def __str__(self):
+        return f"job {self.job_id} {self.kind}: {self.path}"
+
+
+class WebUserAssignmentsArchive(models.Model):
+    """
+    已结束作业归档表（冷数据）
+    字段与 WebUserAssignments 一致，保留原 id；由 tasks.archive_finished_assignments 分批迁入
+    """
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(max_length=50, choices=WebUserAssignments.Status.choices)
+    user_id = models.CharField(max_length=255)
+    uid = models.CharField(max_length=33)
+    filename = models.CharField(max_length=255)
+    title = models.CharField(max_length=255)
+    origin_title = models.TextField()
+    assignment_id = models.CharField(max_length=50)
+    review = models.TextField(null=True, blank=True)
+    filepath = models.CharField(max_length=255, null=True, blank=True)
+    filter_quote = models.CharField(max_length=255, null=True, blank=True)
+    filter_reference = models.CharField(max_length=255, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    previous_assignment_id = models.CharField(max_length=50, null=True, blank=True)
+    requeue_datetime = models.DateTimeField(null=True, blank=True)
+    create_datetime = models.DateTimeField()
+    update_datetime = models.DateTimeField()
+    archived_datetime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'web_user_assignments_archive'
+        verbose_name = 'Web User Assignment (Archive)'
+        verbose_name_plural = 'Web User Assignments (Archive)'
+        indexes = [
+            models.Index(fields=['uid', 'create_datetime', 'id'], name='idx_assign_archive_uid_ctime'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.status}) by User {self.user_id} [archived]"
@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.exceptions import ParseError
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时退回 DRF 默认实现
+    orjson = None
+
+
+def _default(obj):
+    """orjson 不认识的类型（Decimal、惰性翻译字符串等）统一转字符串；Decimal 用定点格式，不输出 "0E-8" 这类科学计数法"""
+    if isinstance(obj, Decimal):
+        return format(obj, 'f')
+    return str(obj)
+
+
+class FastJSONRenderer(BaseRenderer):
+    """基于 orjson 的 JSON 渲染"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return JSONRenderer().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONParser(BaseParser):
+    """基于 orjson 的 JSON 解析"""
+    media_type = 'application/json'
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return JSONParser().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f'JSON parse error - {e}')
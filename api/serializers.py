@@ -4,68 +4,88 @@ from .models import AlertMessage, TurnitinAccount, \
     PackageConfig,RechargeRecord,\
     WebUser, WebAssignments, WebUserAssignments, WebTurnitinClass
 
-class AlertMessageSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    """
+    支持 ?fields=id,status,title 只返回指定字段（仅读请求生效）
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        fields = request.query_params.get('fields')
+        if not fields:
+            return
+        requested = {name.strip() for name in fields.split(',') if name.strip()}
+        for name in set(self.fields) - requested:
+            self.fields.pop(name)
+
+
+class AlertMessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AlertMessage
         fields = '__all__'
 
 
-class TurnitinAccountSerializer(serializers.ModelSerializer):
+class TurnitinAccountSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TurnitinAccount
         fields = '__all__'
         
         
-class TurnitinClassSerializer(serializers.ModelSerializer):
+class TurnitinClassSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TurnitinClass
         fields = '__all__'
         
         
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
         
-class AssignmentSerializer(serializers.ModelSerializer):
+class AssignmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Assignment
         fields = '__all__'
         
-class UserAssignmentSerializer(serializers.ModelSerializer):
+class UserAssignmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAssignment
         fields = '__all__'
         
-class PackageConfigSerializer(serializers.ModelSerializer):
+class PackageConfigSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = PackageConfig
         fields = '__all__'
         
 
-class RechargeRecordSerializer(serializers.ModelSerializer):
+class RechargeRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = RechargeRecord
         fields = '__all__'
         
-class WebUserSerializer(serializers.ModelSerializer):
+class WebUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WebUser
         fields = '__all__'
+        # 次数只能经 credit_service 变更（每次变更都有流水），接口不可直接写
+        read_only_fields = ['available_cnt']
 
-class WebAssignmentsSerializer(serializers.ModelSerializer):
+class WebAssignmentsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WebAssignments
         fields = '__all__'
 
-class WebUserAssignmentsSerializer(serializers.ModelSerializer):
+class WebUserAssignmentsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WebUserAssignments
         fields = '__all__'
         
         
 
-class WebTurnitinClassSerializer(serializers.ModelSerializer):
+class WebTurnitinClassSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WebTurnitinClass
         fields = '__all__'
\ No newline at end of file
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django_fsm.signals import post_transition
+
+from .models import WebUserAssignments
+
+
+@receiver(post_transition, sender=WebUserAssignments)
+def on_assignment_transition(sender, instance, name, source, target, **kwargs):
+    """状态转换后（事务提交时）更新流水线统计"""
+    from turnitin_admin.service.stats_service import record_assignment_transition
+    transaction.on_commit(lambda: record_assignment_transition(instance, target))
+
+
+@receiver(post_save, sender=WebUserAssignments)
+def on_assignment_created(sender, instance, created, **kwargs):
+    """新建作业计入提交统计"""
+    if not created:
+        return
+    from turnitin_admin.service.stats_service import record_assignment_transition
+    transaction.on_commit(lambda: record_assignment_transition(instance, instance.status))
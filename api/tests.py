@@ -0,0 +1,251 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db.models import Sum
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from turnitin_admin.service.bulk_transition_service import apply_bulk_transition
+from turnitin_admin.service.provision_service import provision_web_users
+from .models import RechargeRecord, User, UserAssignment, WebCreditLedger, WebStoredFile, WebUser, WebUserAssignments
+
+
+def create_jobs(count, uid='tests-uid', **fields):
+    return WebUserAssignments.objects.bulk_create([
+        WebUserAssignments(
+            user_id=uid, uid=uid, filename=f'{uid}/paper-{n}.docx', title=f'paper-{n}',
+            origin_title=f'paper-{n}.docx', assignment_id=f'{uid}-{n}', **fields)
+        for n in range(count)
+    ])
+
+
+class SparseFieldsPaginationTests(TestCase):
+    url = '/turnitingood/web/web_user_assignments/'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_jobs(3)
+
+    def test_fields_without_id_still_paginates(self):
+        response = self.client.get(self.url, {'fields': 'status', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['results'], [{'status': 'SUBMITTED'}] * 2)
+        self.assertIsNotNone(data['next'])
+
+        response = self.client.get(data['next'])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['results'], [{'status': 'SUBMITTED'}])
+        self.assertIsNone(data['next'])
+
+    def test_fields_with_id_keeps_id(self):
+        response = self.client.get(self.url, {'fields': 'id,status', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'status'})
+
+
+class ListDetailConsistencyTests(TestCase):
+    """list 走 values()，输出仍须与 detail（序列化器）逐字段一致"""
+
+    def assertListMatchesDetail(self, url, pk):
+        detail = self.client.get(f'{url}{pk}/')
+        self.assertEqual(detail.status_code, 200)
+        listed = self.client.get(url)
+        self.assertEqual(listed.status_code, 200)
+        self.assertEqual(listed.json()['results'], [detail.json()])
+
+    def test_decimal_fields_match_serializer(self):
+        user = User.objects.create(wechat_id='wx-decimal', balance='0')
+        self.assertListMatchesDetail('/turnitingood/wechat_user/', user.pk)
+
+    def test_web_user_assignment_matches_serializer(self):
+        job, = create_jobs(1)
+        self.assertListMatchesDetail('/turnitingood/web/web_user_assignments/', job.pk)
+
+
+class CreditLedgerTests(TestCase):
+
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+
+    def assertLedgerMatchesBalance(self, user):
+        user.refresh_from_db()
+        total = WebCreditLedger.objects.filter(uid=user.uid).aggregate(total=Sum('delta'))['total']
+        self.assertEqual(total, user.available_cnt)
+
+    def test_provisioning_writes_ledger_rows(self):
+        users = list(provision_web_users(3, 'zh', 5, 'tests', chunk_size=2))
+        self.assertEqual(WebCreditLedger.objects.filter(reason=WebCreditLedger.Reason.PROVISION_CREDIT).count(), 3)
+        for user in users:
+            self.assertLedgerMatchesBalance(user)
+
+    def test_recharge_action_links_recharge_record(self):
+        user, = provision_web_users(1, 'en', 1, 'tests')
+        response = self.client.post('/admin/api/webuser/', {
+            'action': 'recharge_selected', ACTION_CHECKBOX_NAME: [user.pk]})
+        self.assertContains(response, 'name="apply"')
+
+        response = self.client.post('/admin/api/webuser/', {
+            'action': 'recharge_selected', ACTION_CHECKBOX_NAME: [user.pk],
+            'apply': '1', 'cnt': '4', 'amount': '990', 'trans_id': 'T-1',
+        })
+        self.assertEqual(response.status_code, 302)
+        record = RechargeRecord.objects.get(wechat_id=user.uid)
+        self.assertEqual((record.amount, record.trans_id), (990, 'T-1'))
+        entry = WebCreditLedger.objects.get(uid=user.uid, reason=WebCreditLedger.Reason.RECHARGE_CREDIT)
+        self.assertEqual((entry.delta, entry.recharge_record_id), (4, record.id))
+        self.assertLedgerMatchesBalance(user)
+
+    def test_available_cnt_is_read_only_in_api(self):
+        user, = provision_web_users(1, 'en', 1, 'tests')
+        response = self.client.patch(f'/turnitingood/web/web_user/{user.pk}/', {'available_cnt': 999},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['available_cnt'], 1)
+        self.assertLedgerMatchesBalance(user)
+
+    def test_available_cnt_is_read_only_in_admin(self):
+        user, = provision_web_users(1, 'en', 1, 'tests')
+        response = self.client.post(f'/admin/api/webuser/{user.pk}/change/', {
+            'language': 'en', 'nick_name': 'changed', 'available_cnt': '100',
+        })
+        self.assertEqual(response.status_code, 302)
+        user.refresh_from_db()
+        self.assertEqual((user.nick_name, user.available_cnt), ('changed', 1))
+
+
+class BulkTransitionTests(TestCase):
+
+    def test_requeue_moves_port_and_keeps_create_datetime(self):
+        job, = create_jobs(1, review='upload error')
+        job = WebUserAssignments.objects.get(id=job.id)
+
+        result = apply_bulk_transition('requeue', [job.id])
+        self.assertEqual((result['updated'], result['skipped']), (1, 0))
+
+        requeued = WebUserAssignments.objects.get(id=job.id)
+        self.assertEqual(requeued.status, WebUserAssignments.Status.RETRY)
+        self.assertEqual((requeued.assignment_id, requeued.previous_assignment_id), ('', job.assignment_id))
+        self.assertEqual(requeued.review, 'upload error')
+        self.assertEqual(requeued.create_datetime, job.create_datetime)
+        self.assertEqual(requeued.timeout_start, requeued.requeue_datetime)
+
+    def test_endpoint_requires_admin(self):
+        job, = create_jobs(1)
+        url = '/turnitingood/web/web_user_assignments/bulk_transition/'
+        payload = {'action': 'fail', 'ids': [job.id]}
+
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(WebUserAssignments.objects.get(id=job.id).status, WebUserAssignments.Status.SUBMITTED)
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebUserAssignments.objects.get(id=job.id).status, WebUserAssignments.Status.FAILED)
+
+    def test_fail_refunds_only_transitioned_rows(self):
+        user, = provision_web_users(1, 'zh', 0, 'tests')
+        submitted, downloaded = create_jobs(2, uid=user.uid)
+        WebUserAssignments.objects.filter(id=downloaded.id).update(status=WebUserAssignments.Status.DOWNLOADED)
+
+        result = apply_bulk_transition('fail', [submitted.id, downloaded.id])
+        self.assertEqual((result['updated'], result['skipped']), (1, 1))
+        self.assertEqual(
+            list(WebCreditLedger.objects.filter(reason=WebCreditLedger.Reason.FAILURE_REFUND).values_list('job_id', flat=True)),
+            [submitted.id])
+        user.refresh_from_db()
+        self.assertEqual(user.available_cnt, 1)
+
+
+class MigrateStorageLayoutTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = self.settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _migrate(self):
+        call_command('migrate_storage_layout', stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_unhashed_job_overwritten_by_later_upload_is_skipped(self):
+        legacy = 'tests-uid/paper.docx'
+        default_storage.save(legacy, ContentFile(b'second upload'))
+        older, newer = create_jobs(2)
+        WebUserAssignments.objects.filter(id__in=[older.id, newer.id]).update(filename=legacy, filepath=legacy)
+
+        for _ in range(2):  # 重复执行时较新的作业已迁移，较旧的作业仍不能迁移
+            self._migrate()
+            self.assertFalse(WebStoredFile.objects.filter(job_id=older.id).exists())
+            self.assertEqual(WebUserAssignments.objects.get(id=older.id).filepath, legacy)
+
+        migrated = WebUserAssignments.objects.get(id=newer.id)
+        self.assertNotEqual(migrated.filepath, legacy)
+        self.assertIsNotNone(migrated.content_hash)
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    """
+    后台列表页查询数与行数无关：先测 1 行的查询数，再要求 N 行时完全相同
+    每行单独查询关联数据（N+1）会让第二次断言失败
+    """
+    rows = 20
+
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+
+    def _create_user_assignments(self, start, stop):
+        User.objects.bulk_create([User(wechat_id=f'wx-{n}', nick_name=f'nick-{n}') for n in range(start, stop)])
+        UserAssignment.objects.bulk_create([
+            UserAssignment(user_id=f'wx-{n}', filename=f'{n}.docx', title=f'paper-{n}', assignment_id=str(n))
+            for n in range(start, stop)
+        ])
+
+    def _create_recharge_records(self, start, stop):
+        User.objects.bulk_create([User(wechat_id=f'wx-{n}') for n in range(start, stop)])
+        RechargeRecord.objects.bulk_create([
+            RechargeRecord(wechat_id=f'wx-{n}', amount=100, trans_id=f'T-{n}') for n in range(start, stop)
+        ])
+
+    def _create_web_user_assignments(self, start, stop):
+        for n in range(start, stop):
+            create_jobs(1, uid=f'uid-{n}')
+
+    def _create_web_users(self, start, stop):
+        WebUser.objects.bulk_create([WebUser(nick_name=f'user-{n}', available_cnt=1) for n in range(start, stop)])
+
+    def assertChangelistQueriesConstant(self, url, create_rows):
+        create_rows(0, 1)
+        with CaptureQueriesContext(connection) as single:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        create_rows(1, self.rows)
+        with self.assertNumQueries(len(single)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, self.rows)
+
+    def test_user_assignment_changelist(self):
+        self.assertChangelistQueriesConstant('/admin/api/userassignment/', self._create_user_assignments)
+
+    def test_recharge_record_changelist(self):
+        self.assertChangelistQueriesConstant('/admin/api/rechargerecord/', self._create_recharge_records)
+
+    def test_web_user_assignments_changelist(self):
+        self.assertChangelistQueriesConstant('/admin/api/webuserassignments/', self._create_web_user_assignments)
+
+    def test_web_user_changelist(self):
+        self.assertChangelistQueriesConstant('/admin/api/webuser/', self._create_web_users)
@@ -5,6 +5,7 @@ from .views import AlertMessageViewSet, TurnitinAccountViewSet,\
     PackageConfigViewSet,RechargeRecordViewSet,\
     WebUserViewSet, WebAssignmentsViewSet, WebUserAssignmentsViewSet,\
     WebTurnitinClassViewSet
+from .exports import export_view
     
 router = DefaultRouter()
 router.register(r'alert_message', AlertMessageViewSet)
@@ -28,4 +29,5 @@ web_router.register(r'web_turnitin_class', WebTurnitinClassViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('web/', include(web_router.urls)),
+    path('export/<str:name>/', export_view, name='export'),
 ]
\ No newline at end of file
@@ -1,6 +1,9 @@
+from django.db import models
 from django.shortcuts import render
 
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from .models import AlertMessage, TurnitinAccount, TurnitinClass,\
     User, Assignment,UserAssignment,PackageConfig,RechargeRecord,\
     WebUser, WebAssignments, WebUserAssignments,WebTurnitinClass
@@ -11,57 +14,139 @@ UserSerializer, AssignmentSerializer,UserAssignmentSerializer,\
 PackageConfigSerializer, RechargeRecordSerializer,\
 WebUserSerializer, WebAssignmentsSerializer, WebUserAssignmentsSerializer,\
 WebTurnitinClassSerializer
+from .filters import QueryParamFilterMixin
+from rest_framework.response import Response
+from turnitin_admin.service.bulk_transition_service import apply_bulk_transition, BULK_TRANSITIONS
 
 
+class ValuesListMixin:
+    """
+    list 接口直接返回 values() 字典，跳过 ModelSerializer 的逐字段处理
+    输出与序列化器一致（同样支持 ?fields= 稀疏字段），写接口仍走序列化器
+    """
+    def get_list_fields(self):
+        names = [field.attname for field in self.queryset.model._meta.concrete_fields]
+        requested = self.request.query_params.get('fields')
+        if requested:
+            wanted = {name.strip() for name in requested.split(',') if name.strip()}
+            names = [name for name in names if name in wanted]
+        return names
 
-class AlertMessageViewSet(viewsets.ModelViewSet):
+    def get_ordering_fields(self, queryset):
+        """游标分页按排序字段定位下一页，这些字段必须查出来"""
+        if self.paginator is None or not hasattr(self.paginator, 'get_ordering'):
+            return []
+        return [name.lstrip('-') for name in self.paginator.get_ordering(self.request, queryset, self)]
+
+    def get_field_converters(self, fields):
+        """
+        values() 原始值与序列化器输出不一致的字段：Decimal 由序列化器字段按 decimal_places 转成字符串
+        （"0.00000000"，而不是 float 或 "0E-8"）
+        """
+        serializer_fields = self.get_serializer().fields
+        return {
+            field.attname: serializer_fields[field.name].to_representation
+            for field in self.queryset.model._meta.concrete_fields
+            if isinstance(field, models.DecimalField) and field.attname in fields and field.name in serializer_fields
+        }
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self.get_list_fields()
+        hidden = [name for name in self.get_ordering_fields(queryset) if name not in fields]
+        converters = self.get_field_converters(fields)
+        queryset = queryset.values(*fields, *hidden)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            # 分页器保留原始行计算游标，输出时去掉客户端没要的排序字段
+            if hidden or converters:
+                page = [self._represent(row, fields, converters) for row in page]
+            return self.get_paginated_response(page)
+        if converters:
+            return Response([self._represent(row, fields, converters) for row in queryset])
+        return Response(list(queryset))
+
+    @staticmethod
+    def _represent(row, fields, converters):
+        return {
+            name: converters[name](row[name]) if name in converters and row[name] is not None else row[name]
+            for name in fields
+        }
+
+
+class AlertMessageViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = AlertMessage.objects.all()
     serializer_class = AlertMessageSerializer
 
 
-class TurnitinAccountViewSet(viewsets.ModelViewSet):
+class TurnitinAccountViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = TurnitinAccount.objects.all()
     serializer_class = TurnitinAccountSerializer
+    filter_fields = {'username': 'username'}
     
 
-class TurnitinClassViewSet(viewsets.ModelViewSet):
+class TurnitinClassViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = TurnitinClass.objects.all()
     serializer_class = TurnitinClassSerializer
     
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    filter_fields = {'wechat_id': 'wechat_id'}
     
     
-class AssignmentViewSet(viewsets.ModelViewSet):
+class AssignmentViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = Assignment.objects.all()
     serializer_class = AssignmentSerializer
+    filter_fields = {'assignment_id': 'assignment_id'}
     
-class UserAssignmentViewSet(viewsets.ModelViewSet):
+class UserAssignmentViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = UserAssignment.objects.all()
     serializer_class = UserAssignmentSerializer
+    filter_fields = {'status': 'status', 'user_id': 'user_id', 'assignment_id': 'assignment_id'}
+    date_filter_field = 'create_datetime'
     
-class PackageConfigViewSet(viewsets.ModelViewSet):
+class PackageConfigViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = PackageConfig.objects.all()
     serializer_class = PackageConfigSerializer
     
-class RechargeRecordViewSet(viewsets.ModelViewSet):
+class RechargeRecordViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = RechargeRecord.objects.all()
     serializer_class = RechargeRecordSerializer
+    filter_fields = {'wechat_id': 'wechat_id'}
+    date_filter_field = 'create_datetime'
     
-class WebUserViewSet(viewsets.ModelViewSet):
+class WebUserViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = WebUser.objects.all()
     serializer_class = WebUserSerializer
+    filter_fields = {'uid': 'uid'}
 
-class WebAssignmentsViewSet(viewsets.ModelViewSet):
+class WebAssignmentsViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = WebAssignments.objects.all()
     serializer_class = WebAssignmentsSerializer
+    filter_fields = {'assignment_id': 'assignment_id'}
 
-class WebUserAssignmentsViewSet(viewsets.ModelViewSet):
+class WebUserAssignmentsViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = WebUserAssignments.objects.all()
     serializer_class = WebUserAssignmentsSerializer
+    filter_fields = {'status': 'status', 'uid': 'uid', 'user_id': 'user_id', 'assignment_id': 'assignment_id'}
+    date_filter_field = 'create_datetime'
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_transition(self, request):
+        """
+        批量状态转换：{"action": "requeue" | "fail" | "delete", "ids": [1, 2, 3]}
+        会批量改状态并退还次数，仅管理员可用
+        """
+        bulk_action = request.data.get('action')
+        ids = request.data.get('ids') or []
+        if bulk_action not in BULK_TRANSITIONS:
+            return Response({'error': f'action 只支持 {sorted(BULK_TRANSITIONS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(ids, list) or not all(str(job_id).isdigit() for job_id in ids):
+            return Response({'error': 'ids 必须是作业 ID 列表'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(apply_bulk_transition(bulk_action, ids))
    
-class WebTurnitinClassViewSet(viewsets.ModelViewSet):
+class WebTurnitinClassViewSet(ValuesListMixin, QueryParamFilterMixin, viewsets.ModelViewSet):
     queryset = WebTurnitinClass.objects.all()
     serializer_class = WebTurnitinClassSerializer 
     
@@ -0,0 +1,102 @@
+# turnitin_admin/bench/common.py
+"""压测公共工具：分位数、查询计数、峰值内存、结果元信息"""
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def parse_scale(value):
+    value = value.lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    """进程峰值 RSS（Linux 下 ru_maxrss 单位为 KB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Recorder:
+    """记录一组操作的耗时、查询数和结果分类"""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.queries = 0
+        self.outcomes = Counter()
+        self.wall_seconds = 0.0
+
+    def measure(self, func, outcome=None):
+        """执行一次操作；outcome(result) 返回结果分类（如 HTTP 状态码）"""
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                self.outcomes[type(e).__name__] += 1
+                result = None
+            else:
+                self.outcomes[str(outcome(result)) if outcome else 'ok'] += 1
+            elapsed = time.perf_counter() - start
+        self.samples.append(elapsed)
+        self.queries += len(captured.captured_queries)
+        self.wall_seconds += elapsed
+        return result
+
+    def result(self, **extra):
+        samples = sorted(self.samples)
+        count = len(samples)
+        return {
+            'name': self.name,
+            'count': count,
+            'throughput_per_s': round(count / self.wall_seconds, 2) if self.wall_seconds else None,
+            'p50_ms': _ms(percentile(samples, 50)),
+            'p95_ms': _ms(percentile(samples, 95)),
+            'p99_ms': _ms(percentile(samples, 99)),
+            'max_ms': _ms(samples[-1] if samples else None),
+            'queries_total': self.queries,
+            'queries_per_op': round(self.queries / count, 2) if count else None,
+            'outcomes': dict(self.outcomes),
+            'peak_rss_mb': peak_rss_mb(),
+            **extra,
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata():
+    return {
+        'commit': git_commit(),
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'host': platform.node(),
+    }
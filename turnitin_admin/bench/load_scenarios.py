@@ -0,0 +1,230 @@
+# turnitin_admin/bench/load_scenarios.py
+"""
+学生端流量的压测场景，通过 HTTP 驱动已启动的 Django 服务（settings_loadtest）
+每个场景按并发阶梯运行，统计各接口的吞吐、延迟、错误率，并给出饱和点
+请求方式与 templates/jinja2/home/index.html 中页面的行为一致
+"""
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import requests
+
+from .common import percentile
+
+CSRF_INPUT_PATTERN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class EndpointStats:
+    """线程安全的按接口统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+
+    def record(self, endpoint, seconds, outcome):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            self.outcomes[endpoint][outcome] += 1
+
+    def summary(self, duration):
+        result = {}
+        for endpoint, samples in self.samples.items():
+            samples = sorted(samples)
+            outcomes = self.outcomes[endpoint]
+            errors = sum(count for outcome, count in outcomes.items() if not outcome.startswith(('2', '3', '429')))
+            result[endpoint] = {
+                'requests': len(samples),
+                'throughput_per_s': round(len(samples) / duration, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 99) * 1000, 1),
+                'error_rate': round(errors / len(samples), 4),
+                'rejected': outcomes.get('429', 0),
+                'outcomes': dict(outcomes),
+            }
+        return result
+
+
+class VirtualUser:
+    """一个浏览器标签页：独立的 Cookie / CSRF token"""
+
+    def __init__(self, base_url, uid, stats, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.uid = uid
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.csrf_token = None
+
+    def request(self, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            outcome = str(response.status_code)
+        except requests.RequestException as e:
+            response = None
+            outcome = type(e).__name__
+        self.stats.record(endpoint, time.perf_counter() - start, outcome)
+        return response
+
+    def open_page(self):
+        """打开首页，页面加载后立即请求一次作业列表"""
+        response = self.request('home', 'GET', f'/{self.uid}/')
+        if response is not None:
+            match = CSRF_INPUT_PATTERN.search(response.text)
+            self.csrf_token = match.group(1) if match else self.session.cookies.get('csrftoken')
+        self.list_jobs()
+
+    def list_jobs(self):
+        return self.request('list_jobs', 'GET', '/turnitingood/assignments/', params={'user_id': self.uid})
+
+    def upload(self, size_kb):
+        content = b'%PDF-1.4\n' + uuid.uuid4().bytes * (size_kb * 64)
+        return self.request('upload', 'POST', '/turnitingood/upload/',
+                            data={'user_id': self.uid, 'csrfmiddlewaretoken': self.csrf_token or ''},
+                            files={'document': (f'{uuid.uuid4().hex[:8]}.pdf', content, 'application/pdf')})
+
+    def download(self, job_id):
+        # 页面的 downloadReport 会对同一 URL 发两次请求（第二次用于超时提示）
+        params = {'job_id': job_id, 'user_id': self.uid, 'type': 'report'}
+        self.request('download', 'GET', '/turnitingood/job/download/', params=params)
+        self.request('download', 'GET', '/turnitingood/job/download/', params=params)
+
+    def delete(self, job_id):
+        return self.request('delete', 'POST', '/turnitingood/job/delete/',
+                            data={'user_id': self.uid, 'job_id': job_id,
+                                  'csrfmiddlewaretoken': self.csrf_token or ''})
+
+
+class ScenarioContext:
+    """场景共享数据：可用用户、可下载作业、可删除作业"""
+
+    def __init__(self, uids, downloadable, deletable, upload_size_kb=100, poll_interval=30.0):
+        self.uids = uids
+        self.downloadable = downloadable  # [(uid, job_id)]
+        self.deletable = deletable  # [(uid, job_id)]，删除后不可复用
+        self.upload_size_kb = upload_size_kb
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+
+    def uid_for(self, index):
+        return self.uids[index % len(self.uids)]
+
+    def take_deletable(self):
+        with self.lock:
+            return self.deletable.pop() if self.deletable else None
+
+
+# ---- 场景：每个函数是一个虚拟用户在 stop_at 之前的行为 ----
+
+def page_load(vu, ctx, index, stop_at):
+    while time.monotonic() < stop_at:
+        vu.open_page()
+
+
+def upload(vu, ctx, index, stop_at):
+    vu.open_page()
+    while time.monotonic() < stop_at:
+        vu.upload(ctx.upload_size_kb)
+        vu.list_jobs()  # 上传成功后页面刷新列表
+
+
+def polling(vu, ctx, index, stop_at):
+    """打开页面后保持标签页，按页面的间隔（30 秒）轮询作业列表；各用户错开起始时间"""
+    vu.open_page()
+    time.sleep((index * 0.37) % ctx.poll_interval)
+    while time.monotonic() < stop_at:
+        vu.list_jobs()
+        time.sleep(min(ctx.poll_interval, max(0.0, stop_at - time.monotonic())))
+
+
+def download(vu, ctx, index, stop_at):
+    uid, job_id = ctx.downloadable[index % len(ctx.downloadable)]
+    vu.uid = uid
+    while time.monotonic() < stop_at:
+        vu.download(job_id)
+
+
+def delete(vu, ctx, index, stop_at):
+    vu.open_page()
+    while time.monotonic() < stop_at:
+        job = ctx.take_deletable()
+        if job is None:
+            break
+        vu.uid = job[0]
+        vu.delete(job[1])
+
+
+SCENARIOS = {
+    'page_load': page_load,
+    'upload': upload,
+    'polling': polling,
+    'download': download,
+    'delete': delete,
+}
+
+
+def run_step(base_url, scenario, ctx, concurrency, duration, timeout=60):
+    """以固定并发运行一个阶段，返回各接口统计"""
+    stats = EndpointStats()
+    stop_at = time.monotonic() + duration
+    behaviour = SCENARIOS[scenario]
+
+    def worker(index):
+        behaviour(VirtualUser(base_url, ctx.uid_for(index), stats, timeout), ctx, index, stop_at)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(max(duration, time.monotonic() - started))
+
+
+def find_saturation(steps, endpoint, min_gain=0.1, slo_p95_ms=2000, max_error_rate=0.01):
+    """
+    饱和点：并发增加后吞吐提升不足 min_gain、p95 超过 SLO 或错误率超限的第一个阶段
+    steps: [(并发数, 该阶段各接口统计)]
+    """
+    previous = None
+    best = 0
+    for concurrency, summary in steps:
+        stats = summary.get(endpoint)
+        if not stats:
+            continue
+        best = max(best, stats['throughput_per_s'])
+        reason = None
+        if stats['error_rate'] > max_error_rate:
+            reason = f"错误率 {stats['error_rate']:.2%}"
+        elif stats['p95_ms'] > slo_p95_ms:
+            reason = f"p95 {stats['p95_ms']}ms 超过 {slo_p95_ms}ms"
+        elif previous and stats['throughput_per_s'] < previous['throughput_per_s'] * (1 + min_gain):
+            reason = f"吞吐提升不足 {min_gain:.0%}"
+        if reason:
+            return {'saturated_at': concurrency, 'reason': reason, 'max_throughput_per_s': best}
+        previous = stats
+    return {'saturated_at': None, 'reason': '未饱和', 'max_throughput_per_s': best}
+
+
+def run(base_url, scenarios, steps, duration, ctx, slo_p95_ms=2000, max_error_rate=0.01):
+    """按场景、按并发阶梯运行，返回每阶段结果和各接口饱和点"""
+    report = {}
+    for scenario in scenarios:
+        step_results = []
+        for concurrency in steps:
+            step_results.append((concurrency, run_step(base_url, scenario, ctx, concurrency, duration)))
+        endpoints = sorted({endpoint for _, summary in step_results for endpoint in summary})
+        report[scenario] = {
+            'steps': [{'concurrency': concurrency, 'endpoints': summary} for concurrency, summary in step_results],
+            'saturation': {
+                endpoint: find_saturation(step_results, endpoint, slo_p95_ms=slo_p95_ms,
+                                          max_error_rate=max_error_rate)
+                for endpoint in endpoints
+            },
+        }
+    return report
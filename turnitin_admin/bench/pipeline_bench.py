@@ -0,0 +1,153 @@
+# turnitin_admin/bench/pipeline_bench.py
+"""
+上传→报告流水线和学生端接口压测
+后台任务（上传 / 下载 / 失败判定）和页面接口都对着本地 Turnitin 替身服务运行，
+结果为 JSON，带提交号，便于比较不同提交
+"""
+import time
+import uuid
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, override_settings
+from django.conf import settings
+
+from api.models import WebUserAssignments
+from turnitin_admin import tasks
+from turnitin_admin.service.admission_service import redis_client as admission_redis, THROUGHPUT_CACHE_KEY
+from . import seed
+from .common import Recorder, run_metadata, peak_rss_mb
+
+
+def _count_status(ids, status):
+    return WebUserAssignments.objects.filter(id__in=ids, status=status).count()
+
+
+def bench_sweeps(sweep_jobs):
+    """依次运行上传、下载、失败判定三个后台任务，每个任务只跑一轮"""
+    results = []
+
+    pending = seed.create_pending_jobs(sweep_jobs)
+    recorder = Recorder('sweep_upload')
+    recorder.measure(tasks._upload_to_turnitin_task)
+    uploaded = _count_status(pending, WebUserAssignments.Status.ANALYSING)
+    results.append(recorder.result(jobs=uploaded, jobs_per_s=_rate(uploaded, recorder.wall_seconds)))
+
+    recorder = Recorder('sweep_download')
+    recorder.measure(tasks.download_reports)
+    downloaded = _count_status(pending, WebUserAssignments.Status.DOWNLOADED)
+    results.append(recorder.result(jobs=downloaded, jobs_per_s=_rate(downloaded, recorder.wall_seconds)))
+
+    # 超过失败时限的作业，由 failed_task 标记失败并退还次数
+    stale = seed.create_pending_jobs(sweep_jobs, age_minutes=settings.FAILED_TASK_TIMEOUT_MINUTES + 5)
+    recorder = Recorder('sweep_failed')
+    recorder.measure(tasks.failed_task)
+    failed = _count_status(stale, WebUserAssignments.Status.FAILED)
+    results.append(recorder.result(jobs=failed, jobs_per_s=_rate(failed, recorder.wall_seconds)))
+    return results
+
+
+def bench_endpoints(users, requests_per_endpoint):
+    """学生端接口：首页、作业列表、上传、下载、删除"""
+    client = Client(HTTP_HOST='localhost')
+    uids = [seed.bench_uid(i % users) for i in range(requests_per_endpoint)]
+    results = []
+
+    recorder = Recorder('home')
+    for uid in uids:
+        recorder.measure(lambda: client.get(f'/{uid}/'), lambda r: r.status_code)
+    results.append(recorder.result())
+
+    recorder = Recorder('list_jobs')
+    for uid in uids:
+        recorder.measure(lambda: client.get('/turnitingood/assignments/', {'user_id': uid}),
+                         lambda r: r.status_code)
+    results.append(recorder.result())
+
+    # 上传会累积排队作业，压测时放宽准入控制，只测上传本身
+    admission_redis.delete(THROUGHPUT_CACHE_KEY)
+    uploaded_jobs = []
+    recorder = Recorder('upload')
+    with override_settings(ADMISSION_DEFAULT_THROUGHPUT_PER_MINUTE=1_000_000):
+        for index, uid in enumerate(uids):
+            document = SimpleUploadedFile(f'upload{index}.pdf', b'%PDF-1.4\n' + uuid.uuid4().bytes * 1024,
+                                          content_type='application/pdf')
+            response = recorder.measure(
+                lambda: client.post('/turnitingood/upload/', {'user_id': uid, 'document': document}),
+                lambda r: r.status_code)
+            if response is not None and response.status_code == 200:
+                uploaded_jobs.append((uid, response.json()['job_id']))
+    results.append(recorder.result())
+
+    downloadable = list(
+        WebUserAssignments.objects.filter(uid__startswith=seed.BENCH_PREFIX,
+                                          status=WebUserAssignments.Status.DOWNLOADED)
+        .order_by('-id')[:requests_per_endpoint]
+    )
+    seed.write_reports(downloadable)
+    recorder = Recorder('download')
+    for job in downloadable:
+        recorder.measure(
+            lambda: client.get('/turnitingood/job/download/',
+                               {'user_id': job.uid, 'job_id': job.id, 'type': 'report'}),
+            lambda r: r.status_code)
+    results.append(recorder.result())
+
+    recorder = Recorder('delete')
+    for uid, job_id in uploaded_jobs:
+        recorder.measure(lambda: client.post('/turnitingood/job/delete/', {'user_id': uid, 'job_id': job_id}),
+                         lambda r: r.status_code)
+    results.append(recorder.result())
+    return results
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 3) if seconds else None
+
+
+def run(scales, sweep_jobs=20, requests_per_endpoint=200, keep_data=False):
+    """按规模依次压测；每个规模在上一个规模的数据基础上补齐"""
+    output = {'meta': run_metadata(), 'runs': []}
+    _, created_class = seed.ensure_turnitin_class()
+    try:
+        for rows in sorted(scales):
+            start = time.perf_counter()
+            users = seed.seed_history(rows)
+            seed_seconds = time.perf_counter() - start
+            output['runs'].append({
+                'rows': rows,
+                'seed_seconds': round(seed_seconds, 1),
+                'results': bench_sweeps(sweep_jobs) + bench_endpoints(users, requests_per_endpoint),
+            })
+    finally:
+        if not keep_data:
+            seed.cleanup(remove_class=created_class)
+    output['meta']['peak_rss_mb'] = peak_rss_mb()
+    return output
+
+
+def compare(baseline, current):
+    """对比两次结果（同规模、同项）的 p50 / p95 / 吞吐变化"""
+    def index(data):
+        return {(run['rows'], item['name']): item for run in data['runs'] for item in run['results']}
+
+    old, new = index(baseline), index(current)
+    rows = []
+    for key in sorted(new.keys() & old.keys()):
+        before, after = old[key], new[key]
+        rows.append({
+            'rows': key[0],
+            'name': key[1],
+            **{metric: _delta(before.get(metric), after.get(metric))
+               for metric in ('p50_ms', 'p95_ms', 'throughput_per_s', 'queries_per_op')},
+        })
+    return {
+        'baseline': baseline['meta'].get('commit'),
+        'current': current['meta'].get('commit'),
+        'changes': rows,
+    }
+
+
+def _delta(before, after):
+    if before in (None, 0) or after is None:
+        return {'before': before, 'after': after}
+    return {'before': before, 'after': after, 'change_pct': round((after - before) / before * 100, 1)}
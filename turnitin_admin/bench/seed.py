@@ -0,0 +1,166 @@
+# turnitin_admin/bench/seed.py
+"""
+压测数据：合成 WebUser / WebUserAssignments，uid 以 bench 开头，便于识别和清理
+只应在独立的压测数据库上使用
+"""
+import os
+import random
+import shutil
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import WebUser, WebUserAssignments, WebTurnitinClass, WebCreditLedger, \
+    WebAssignmentTimeline, WebReportIndex, WebStoredFile
+from turnitin_admin.service import storage_service
+from turnitin_admin.service.dedup_service import new_content_hasher
+
+BENCH_PREFIX = 'bench'
+BENCH_CLASS_NAME = f'{BENCH_PREFIX} class'
+BATCH_SIZE = 5000
+JOBS_PER_USER = 20
+HISTORY_DAYS = 60
+
+# 已结束作业的状态分布
+FINISHED_STATUS_WEIGHTS = [
+    (WebUserAssignments.Status.DOWNLOADED, 85),
+    (WebUserAssignments.Status.FAILED, 10),
+    (WebUserAssignments.Status.DELETED, 5),
+]
+
+
+def bench_uid(index):
+    return f'{BENCH_PREFIX}{index:027x}'
+
+
+@contextmanager
+def _explicit_timestamps(model):
+    """批量插入时保留指定的 create_datetime / update_datetime（临时关闭 auto_now_add / auto_now）"""
+    flags = ('auto_now_add', 'auto_now')
+    saved = [(field, flag) for field in model._meta.concrete_fields for flag in flags if getattr(field, flag, False)]
+    for field, flag in saved:
+        setattr(field, flag, False)
+    try:
+        yield
+    finally:
+        for field, flag in saved:
+            setattr(field, flag, True)
+
+
+def ensure_turnitin_class():
+    """没有启用的班级时创建一个压测班级，返回 (班级名, 是否新建)"""
+    active = WebTurnitinClass.objects.filter(active_flag='Y').first()
+    if active:
+        return active.class_name, False
+    created = WebTurnitinClass.objects.create(class_name=BENCH_CLASS_NAME, active_flag='Y')
+    return created.class_name, True
+
+
+def seed_users(count):
+    """补齐 count 个压测用户（已存在的不重复创建）"""
+    existing = WebUser.objects.filter(uid__startswith=BENCH_PREFIX).count()
+    for start in range(existing, count, BATCH_SIZE):
+        WebUser.objects.bulk_create([
+            WebUser(uid=bench_uid(i), language='zh', nick_name=f'bench user {i}', available_cnt=1_000_000)
+            for i in range(start, min(count, start + BATCH_SIZE))
+        ])
+    return count
+
+
+def seed_history(rows):
+    """补齐 rows 条已结束的历史作业，时间均匀分布在最近 HISTORY_DAYS 天"""
+    users = max(1, rows // JOBS_PER_USER)
+    seed_users(users)
+    existing = WebUserAssignments.objects.filter(uid__startswith=BENCH_PREFIX).count()
+    now = timezone.now()
+    statuses = [status for status, _ in FINISHED_STATUS_WEIGHTS]
+    weights = [weight for _, weight in FINISHED_STATUS_WEIGHTS]
+    rng = random.Random(existing)
+    span_seconds = HISTORY_DAYS * 86400
+
+    with _explicit_timestamps(WebUserAssignments):
+        for start in range(existing, rows, BATCH_SIZE):
+            batch = []
+            for i in range(start, min(rows, start + BATCH_SIZE)):
+                uid = bench_uid(i % users)
+                created = now - timedelta(seconds=span_seconds * (rows - i) / rows)
+                path = f'{uid}/paper{i}.pdf'
+                batch.append(WebUserAssignments(
+                    user_id=uid,
+                    uid=uid,
+                    filename=path,
+                    title=f'paper{i}',
+                    origin_title=f'论文{i}.pdf',
+                    assignment_id=str(100001 + i % 5),
+                    status=rng.choices(statuses, weights)[0],
+                    filepath=path,
+                    content_hash=f'{i:064x}',
+                    create_datetime=created,
+                    update_datetime=created + timedelta(minutes=rng.randint(3, 30)),
+                ))
+            with transaction.atomic():
+                WebUserAssignments.objects.bulk_create(batch)
+    return users
+
+
+def create_pending_jobs(count, age_minutes=0, size_kb=20):
+    """创建待上传作业并写入论文文件（内容各不相同，不会命中去重），返回作业 id 列表"""
+    seed_users(max(count, 1))
+    created = timezone.now() - timedelta(minutes=age_minutes)
+    ids = []
+    with _explicit_timestamps(WebUserAssignments):
+        for i in range(count):
+            uid = bench_uid(i)
+            content = b'%PDF-1.4\n' + os.urandom(size_kb * 1024)
+            hasher = new_content_hasher()
+            hasher.update(content)
+            content_hash = hasher.hexdigest()
+            incoming = default_storage.save(storage_service.incoming_path('.pdf'), ContentFile(content))
+            path, size = storage_service.store_paper(incoming, content_hash, '.pdf')
+            job = WebUserAssignments.objects.create(
+                user_id=uid,
+                uid=uid,
+                filename=f'{uid}/pending-{i}.pdf',
+                title=f'pending-{i}',
+                origin_title=f'pending-{i}.pdf',
+                assignment_id='',
+                filepath=path,
+                content_hash=content_hash,
+                create_datetime=created,
+                update_datetime=created,
+            )
+            storage_service.record_file(job.id, WebStoredFile.Kind.PAPER, path, size, content_hash)
+            ids.append(job.id)
+    return ids
+
+
+def write_reports(jobs):
+    """给已下载的作业写入重复率报告文件，供下载接口压测"""
+    for job in jobs:
+        if not default_storage.exists(storage_service.report_path(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT)):
+            storage_service.save_report(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT, b'%PDF-1.4\n' + b'0' * 50 * 1024)
+
+
+def cleanup(remove_class=False):
+    """删除全部压测数据和文件"""
+    jobs = WebUserAssignments.objects.filter(uid__startswith=BENCH_PREFIX)
+    WebAssignmentTimeline.objects.filter(job_id__in=jobs.values('id')).delete()
+    WebReportIndex.objects.filter(source_job_id__in=jobs.values('id')).delete()
+    # 新布局的文件按清单删除（共用文件只在无其他引用时删除），旧布局目录在下面整体删除
+    for job in jobs.filter(id__in=WebStoredFile.objects.values('job_id')).only('id', 'filepath').iterator():
+        storage_service.delete_job_files(job)
+    jobs.delete()
+    WebCreditLedger.objects.filter(uid__startswith=BENCH_PREFIX).delete()
+    WebUser.objects.filter(uid__startswith=BENCH_PREFIX).delete()
+    if remove_class:
+        WebTurnitinClass.objects.filter(class_name=BENCH_CLASS_NAME).delete()
+    media_root = str(settings.MEDIA_ROOT)
+    if os.path.isdir(media_root):
+        for name in os.listdir(media_root):
+            if name.startswith(BENCH_PREFIX):
+                shutil.rmtree(os.path.join(media_root, name), ignore_errors=True)
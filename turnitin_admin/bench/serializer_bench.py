@@ -0,0 +1,66 @@
+# turnitin_admin/bench/serializer_bench.py
+"""API 列表序列化微基准：ModelSerializer + JSONRenderer 对比 values() 字典 + FastJSONRenderer"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import WebUserAssignments
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import WebUserAssignmentsSerializer
+
+
+def build_rows(count):
+    """构造内存中的作业对象和对应的 values() 字典，不访问数据库"""
+    now = timezone.now()
+    field_names = [field.attname for field in WebUserAssignments._meta.concrete_fields]
+    instances = []
+    for i in range(count):
+        instances.append(WebUserAssignments(
+            id=i + 1,
+            user_id=f'{i:032x}',
+            uid=f'{i:032x}',
+            filename=f'{i:032x}/paper{i}.docx',
+            title=f'paper{i}',
+            origin_title=f'论文{i}.docx',
+            assignment_id=str(100000 + i % 20),
+            status=WebUserAssignments.Status.DOWNLOADED,
+            filepath=f'{i:032x}/paper{i}.docx',
+            content_hash=f'{i:064x}',
+            create_datetime=now - timedelta(minutes=i),
+            update_datetime=now,
+        ))
+    rows = [{name: getattr(obj, name) for name in field_names} for obj in instances]
+    return instances, rows
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        'best_ms': round(min(samples) * 1000, 2),
+        'median_ms': round(statistics.median(samples) * 1000, 2),
+    }
+
+
+def run(count=10000, repeat=5):
+    instances, rows = build_rows(count)
+    serializer_renderer = JSONRenderer()
+    fast_renderer = FastJSONRenderer()
+
+    before = _time(
+        lambda: serializer_renderer.render(WebUserAssignmentsSerializer(instances, many=True).data), repeat)
+    after = _time(lambda: fast_renderer.render(rows), repeat)
+    return {
+        'rows': count,
+        'repeat': repeat,
+        'orjson': orjson is not None,
+        'model_serializer_json_renderer': before,
+        'values_fast_renderer': after,
+        'speedup': round(before['median_ms'] / after['median_ms'], 1) if after['median_ms'] else None,
+    }
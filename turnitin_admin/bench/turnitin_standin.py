@@ -0,0 +1,306 @@
+# turnitin_admin/bench/turnitin_standin.py
+"""
+本地 Turnitin 替身服务，实现 TurnitinService 用到的全部接口，只依赖标准库
+用法：python manage.py run_turnitin_standin --port 8090
+      TURNITIN_STANDIN_URL=http://127.0.0.1:8090 启动 Web / worker
+www / ev / sas 三个域名的接口都挂在同一个地址下
+"""
+import email
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid as uuid_lib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from turnitin_admin.service.http_session import classify_endpoint
+from turnitin_admin.service.turnitin_web_constants import TurnitinWebConstants
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StandinConfig:
+    class_name: str = 'Standin Class'
+    class_id: int = 40000001
+    ports: int = 5  # 作业端口数
+    latency_ms: float = 50  # 每个请求的基础延迟
+    latency_jitter_ms: float = 20
+    failure_rate: float = 0.0  # 每个请求返回 500 的概率
+    endpoint_latency_ms: dict = field(default_factory=dict)  # 按逻辑接口覆盖延迟
+    endpoint_failure_rate: dict = field(default_factory=dict)  # 按逻辑接口覆盖失败率
+    metadata_delay_s: float = 2  # 提交后元数据就绪时间
+    ai_delay_s: float = 10  # AI 报告生成时间
+    similarity_delay_s: float = 5  # 重复率 PDF 生成时间
+    pdf_size_kb: int = 200
+
+    def latency_for(self, endpoint):
+        base = self.endpoint_latency_ms.get(endpoint, self.latency_ms)
+        return max(0.0, base + random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)) / 1000
+
+    def failure_rate_for(self, endpoint):
+        return self.endpoint_failure_rate.get(endpoint, self.failure_rate)
+
+
+class StandinState:
+    """提交、AI 任务、PDF 任务的内存状态"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.port_ids = [str(100000 + i) for i in range(1, config.ports + 1)]
+        self.pending = {}  # uuid -> {'aid', 'filename', 'created'}
+        self.inbox = {}  # aid -> 最近一次确认的提交 {'oid', 'filename'}
+        self.ai_jobs = {}  # job_id -> 创建时间
+        self.pdf_jobs = {}  # oid -> queue_pdf 时间
+        self._next_oid = 2000000000
+
+    def add_submission(self, aid, filename):
+        submission_uuid = uuid_lib.uuid4().hex
+        with self.lock:
+            self.pending[submission_uuid] = {'aid': aid, 'filename': filename, 'created': time.time()}
+        return submission_uuid
+
+    def metadata_status(self, submission_uuid):
+        with self.lock:
+            submission = self.pending.get(submission_uuid)
+        if not submission:
+            return -1
+        return 1 if time.time() - submission['created'] >= self.config.metadata_delay_s else 0
+
+    def confirm(self, submission_uuid):
+        with self.lock:
+            submission = self.pending.pop(submission_uuid, None)
+            if not submission:
+                return False
+            self._next_oid += 1
+            self.inbox[submission['aid']] = {'oid': str(self._next_oid), 'filename': submission['filename']}
+        return True
+
+    def create_ai_job(self):
+        job_id = uuid_lib.uuid4().hex
+        with self.lock:
+            self.ai_jobs[job_id] = time.time()
+        return job_id
+
+    def ai_job_ready(self, job_id):
+        with self.lock:
+            created = self.ai_jobs.get(job_id)
+        if created is None:
+            return None
+        return time.time() - created >= self.config.ai_delay_s
+
+    def queue_pdf(self, oid):
+        with self.lock:
+            self.pdf_jobs.setdefault(oid, time.time())
+
+    def pdf_ready(self, oid):
+        with self.lock:
+            queued = self.pdf_jobs.get(oid)
+        return queued is not None and time.time() - queued >= self.config.similarity_delay_s
+
+
+def fake_pdf(size_kb):
+    body = b'%PDF-1.4\n% turnitin standin\n'
+    padding = max(0, size_kb * 1024 - len(body) - 6)
+    return body + b'0' * padding + b'\n%%EOF'
+
+
+def _multipart_filename(content_type, body):
+    """从 multipart 表单中取 userfile 的文件名"""
+    message = email.message_from_bytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    for part in message.walk():
+        if part.get_param('name', header='content-disposition') == 'userfile':
+            return part.get_filename() or ''
+    return ''
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'TurnitinStandin/1.0'
+
+    # (方法, 路径正则, 处理函数名)
+    ROUTES = [
+        ('GET', r'^/admin/api/turnitin/cookie$', 'cookie'),
+        ('GET', r'^/t_home\.asp$', 't_home'),
+        ('GET', r'^/class/(\d+)/instructor_home$', 'instructor_home'),
+        ('POST', r'^/class/(\d+)/class_home$', 'class_home'),
+        ('GET', r'^/assignment/type/paper/inbox/(\d+)$', 'inbox'),
+        ('POST', r'^/t_submit\.asp$', 't_submit'),
+        ('GET', r'^/t_submit\.asp$', 't_submit_result'),
+        ('POST', r'^/panda/get_submission_metadata\.asp$', 'metadata'),
+        ('POST', r'^/submit_confirm\.asp$', 'confirm'),
+        ('GET', r'^/paper/(\d+)/sws_launch_token$', 'sws_launch_token'),
+        ('GET', r'^/assignment/(\d+)/session_token$', 'session_token'),
+        ('POST', r'^/job$', 'create_job'),
+        ('GET', r'^/job/([0-9a-f]+)$', 'job_status'),
+        ('GET', r'^/app/carta/', 'carta'),
+        ('PUT', r'^/paper/(\d+)/similarity/options$', 'similarity_options'),
+        ('GET', r'^/paper/(\d+)/similarity/options$', 'similarity_options'),
+        ('POST', r'^/paper/(\d+)/queue_pdf$', 'queue_pdf'),
+        ('GET', r'^/paper/(\d+)/pdf_status$', 'pdf_status'),
+        ('GET', r'^/files/(ai|similarity)/([\w.-]+)\.pdf$', 'pdf_file'),
+    ]
+    COMPILED_ROUTES = [(method, re.compile(pattern), name) for method, pattern, name in ROUTES]
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def config(self):
+        return self.server.state.config
+
+    def log_message(self, format, *args):
+        logger.debug("standin %s - %s", self.address_string(), format % args)
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, data, status=200):
+        self._send(status, json.dumps(data), 'application/json')
+
+    def _dispatch(self):
+        parts = urlsplit(self.path)
+        self.query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+
+        endpoint = classify_endpoint(self.path)
+        time.sleep(self.config.latency_for(endpoint))
+        if random.random() < self.config.failure_rate_for(endpoint):
+            return self._send(500, 'standin injected failure')
+
+        for method, pattern, name in self.COMPILED_ROUTES:
+            match = pattern.match(parts.path)
+            if method == self.command and match:
+                return getattr(self, f'handle_{name}')(*match.groups())
+        self._send(404, 'not found')
+
+    do_GET = do_POST = do_PUT = _dispatch
+
+    # ---- www ----
+
+    def handle_cookie(self):
+        token = uuid_lib.uuid4().hex
+        self._send(200, f"session-id={token}; legacy-session-id={token}", 'text/plain')
+
+    def handle_t_home(self):
+        self._send(200, (
+            '<table><tr><td class="class_name">'
+            f'<a href="/class/{self.config.class_id}/portfolio">{self.config.class_name}</a>'
+            '</td></tr></table>'
+        ))
+
+    def handle_instructor_home(self, class_id):
+        rows = ''.join(
+            f'<tr class="assgn-row"><td class="assgn-inbox"><a id="view_inbox_{aid}" href="#">View</a></td></tr>'
+            for aid in self.state.port_ids
+        )
+        self._send(200, f'<table>{rows}</table>')
+
+    def handle_class_home(self, class_id):
+        self._send(200, 'ok')
+
+    def handle_inbox(self, aid):
+        with self.state.lock:
+            submission = self.state.inbox.get(aid)
+        row = ''
+        if submission:
+            row = (
+                f'<tr class="student-{TurnitinWebConstants.DEFAULT_USER_ID}">'
+                f'<td><input name="object_checkbox" value="{submission["oid"]}" title="{submission["filename"]}"></td></tr>'
+            )
+        self._send(200, f'<table class="inbox_table">{row}</table>')
+
+    def handle_t_submit(self):
+        aid = self.query.get('aid', '')
+        filename = _multipart_filename(self.headers.get('Content-Type', ''), self.body)
+        submission_uuid = self.state.add_submission(aid, filename.split('/')[-1])
+        self._send(302, headers={'Location': f'/t_submit.asp?aid={aid}&uuid={submission_uuid}'})
+
+    def handle_t_submit_result(self):
+        self._send(200, json.dumps({'uuid': self.query.get('uuid', '')}, separators=(',', ':')))
+
+    def handle_metadata(self):
+        status = self.state.metadata_status(self.query.get('uuid', ''))
+        self._send(200, json.dumps({'status': status}, separators=(',', ':')), 'application/json')
+
+    def handle_confirm(self):
+        if self.state.confirm(self.query.get('uuid', '')):
+            return self._send(200, 'ok')
+        self._send(400, 'unknown uuid')
+
+    # ---- ev ----
+
+    def handle_sws_launch_token(self, oid):
+        self._send_json({
+            'token': uuid_lib.uuid4().hex,
+            'payload': {'config': {'submissions': {f'oid:1:{oid}': {}}}},
+        })
+
+    def handle_session_token(self, aid):
+        self._send_json({'session_token': uuid_lib.uuid4().hex})
+
+    def handle_carta(self):
+        self._send(200, '<html><body>carta</body></html>')
+
+    def handle_similarity_options(self, oid):
+        self._send_json({})
+
+    def handle_queue_pdf(self, oid):
+        self.state.queue_pdf(oid)
+        self._send_json({'url': f'{self._base_url()}/paper/{oid}/pdf_status?lang=en_us'})
+
+    def handle_pdf_status(self, oid):
+        if self.state.pdf_ready(oid):
+            return self._send_json({'ready': 1, 'url': f'{self._base_url()}/files/similarity/{oid}.pdf'})
+        self._send_json({'ready': 0})
+
+    def handle_pdf_file(self, kind, name):
+        self._send(200, fake_pdf(self.config.pdf_size_kb), 'application/pdf')
+
+    # ---- sas ----
+
+    def handle_create_job(self):
+        self._send(201, self.state.create_ai_job(), 'text/plain')
+
+    def handle_job_status(self, job_id):
+        ready = self.state.ai_job_ready(job_id)
+        if ready is None:
+            return self._send_json({'status': 'FAILED'}, status=404)
+        if ready:
+            return self._send_json({'status': 'SUCCESS', 'url': f'{self._base_url()}/files/ai/{job_id}.pdf'})
+        self._send_json({'status': 'PENDING'})
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, StandinHandler)
+        self.state = StandinState(config)
+
+
+def start_in_thread(config=None, host='127.0.0.1', port=0):
+    """后台线程启动替身服务（压测脚本使用），返回 (server, base_url)"""
+    server = StandinServer((host, port), config or StandinConfig())
+    threading.Thread(target=server.serve_forever, name='turnitin-standin', daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}'
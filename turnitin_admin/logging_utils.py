@@ -0,0 +1,163 @@
+# turnitin_admin/logging_utils.py
+"""
+日志管道：调用方只把记录放进内存队列，格式化和写文件在后台监听线程完成
+- AsyncQueueHandler: 队列 handler，自带 QueueListener 和实际输出的 handler；
+  fork 出的子进程（django-q cluster / worker）在第一次写日志时重建自己的队列和监听线程
+- StructuredFormatter: 每条日志一行 JSON（含 extra 字段和异常堆栈）
+- SamplingFilter: 对啰嗦的 DEBUG 日志按比例抽样
+- LazyJson: 只有真正输出时才做 json.dumps
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import random
+import sys
+from datetime import datetime
+
+# LogRecord 自带的属性，其余的视为 extra 字段
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def _json_safe(value, depth=0):
+    """extra 字段在调用线程转成纯 JSON 值，监听线程不再接触 ORM / 惰性对象"""
+    if isinstance(value, _PLAIN_TYPES):
+        return value
+    if depth < 4:
+        if isinstance(value, dict):
+            return {str(key): _json_safe(item, depth + 1) for key, item in value.items()}
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return [_json_safe(item, depth + 1) for item in value]
+    try:
+        return str(value)
+    except Exception:
+        return f'<{type(value).__name__}>'
+
+
+class LazyJson:
+    """
+    延迟序列化：logger.debug("body: %s", LazyJson(body))
+    参数在后台线程格式化，期间对象若被修改，输出的是修改后的内容
+    """
+    __slots__ = ('obj', 'kwargs')
+
+    def __init__(self, obj, **kwargs):
+        self.obj = obj
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return json.dumps(self.obj, ensure_ascii=False, default=str, **self.kwargs)
+
+
+class StructuredFormatter(logging.Formatter):
+    """一行一条 JSON 日志"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """低于 level 的日志按 rate 抽样保留，level 及以上全部保留"""
+
+    def __init__(self, rate=0.1, level='DEBUG'):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging._checkLevel(level)
+
+    def filter(self, record):
+        return record.levelno > self.level or random.random() < self.rate
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    调用线程只做入队；文件 / 控制台输出由监听线程完成
+    队列满时丢弃新日志而不是阻塞请求，丢弃数在下一条输出时补记
+    """
+
+    def __init__(self, filename=None, console=False, level=logging.NOTSET, queue_size=10000,
+                 structured=True, fmt='{levelname} {asctime} {module} {message}'):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.setLevel(level)
+        formatter = StructuredFormatter() if structured else logging.Formatter(fmt, style='{')
+        targets = []
+        if filename:
+            targets.append(logging.FileHandler(filename, encoding='utf-8'))
+        if console:
+            targets.append(logging.StreamHandler(sys.stderr))
+        for target in targets:
+            target.setFormatter(formatter)
+        self.targets = targets
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._start_listener()
+        atexit.register(self._stop_listener)
+
+    def _start_listener(self):
+        self._pid = os.getpid()
+        self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart_in_child(self):
+        """
+        fork 不复制线程：子进程继承了队列但没有监听线程，日志会堆在队列里无人写出。
+        换一个新队列（父进程队列的锁状态不可靠）并启动本进程的监听线程；
+        multiprocessing 的子进程以 os._exit 退出、不走 atexit，另外登记 Finalize 写完剩余日志
+        """
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.dropped = 0
+        self._start_listener()
+        multiprocessing.util.Finalize(self, self._stop_listener, exitpriority=0)
+
+    def prepare(self, record):
+        """
+        不在调用线程格式化 message 和异常堆栈（默认实现会在这里拼接），交给监听线程；
+        extra 字段则在这里转成纯值，避免监听线程去求值请求里的惰性对象
+        """
+        # emit 在 handler 锁内调用，子进程里只会重建一次
+        if self._pid != os.getpid():
+            self._restart_in_child()
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_') and not isinstance(value, _PLAIN_TYPES):
+                record.__dict__[key] = _json_safe(value)
+        if self.dropped:
+            record.dropped_records = self.dropped
+            self.dropped = 0
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _stop_listener(self):
+        """退出前把队列中剩余的日志写完"""
+        if self._pid == os.getpid() and self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        super().close()
@@ -1,6 +1,5 @@
 # turnitin_admin/middleware/exception_handler.py
 import logging
-import traceback
 from django.http import JsonResponse
 
 logger = logging.getLogger(__name__)
@@ -15,23 +14,13 @@ class GlobalExceptionMiddleware:
         return response
 
     def process_exception(self, request, exception):
-        # 获取完整错误堆栈
-        error_trace = traceback.format_exc()
-        
-        # 强制打印到控制台（测试用）
-        print("\n" + "="*50)
-        print(f"异常类型: {type(exception)}")
-        print(f"异常信息: {str(exception)}")
-        print(f"堆栈跟踪:\n{error_trace}")
-        print("="*50 + "\n")
-
-        # 记录到日志文件
+        # 堆栈由日志监听线程格式化，不在请求线程里拼接
         logger.error(
-            "路径: %s | 方法: %s | 异常: %s\n堆栈:\n%s",
+            "路径: %s | 方法: %s | 异常: %s",
             request.path,
             request.method,
-            str(exception),
-            error_trace
+            exception,
+            exc_info=exception,
         )
 
         return JsonResponse(
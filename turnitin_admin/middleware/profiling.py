@@ -0,0 +1,30 @@
+# turnitin_admin/middleware/profiling.py
+import logging
+
+from django.core.exceptions import MiddlewareNotUsed
+
+from turnitin_admin.profiling import profiling_config, new_profiler, should_profile_request, write_profile
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfilerMiddleware:
+    """按 PROFILING['request_sample_rate'] 抽样分析请求；未开启时不加载"""
+
+    def __init__(self, get_response):
+        if not profiling_config()['requests']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path_prefixes = tuple(profiling_config()['request_path_prefixes'])
+
+    def __call__(self, request):
+        if (self.path_prefixes and not request.path.startswith(self.path_prefixes)) \
+                or not should_profile_request():
+            return self.get_response(request)
+        profiler = new_profiler().start()
+        try:
+            return self.get_response(request)
+        finally:
+            path = write_profile(profiler.stop(), 'request', f"{request.method}_{request.path}")
+            if path:
+                logger.debug("请求 %s 性能分析已写入 %s", request.path, path)
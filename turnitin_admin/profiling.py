@@ -0,0 +1,157 @@
+# turnitin_admin/profiling.py
+"""
+按需开启的采样分析器
+后台线程定时读取目标线程的调用栈（sys._current_frames），按折叠栈计数，
+输出 .folded 文件（可直接给 flamegraph.pl / speedscope 使用）和热点函数摘要 .json
+未开启时：请求中间件直接不加载（MiddlewareNotUsed），任务包装只多一次配置判断
+"""
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 30
+
+
+def profiling_config():
+    return settings.PROFILING
+
+
+class SamplingProfiler:
+    """对单个线程做定时栈采样"""
+
+    def __init__(self, thread_id=None, interval=0.005, max_depth=128):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_label(self, frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._frame_label(frame))
+            frame = frame.f_back
+        labels.reverse()  # 折叠栈从根到叶
+        self.stacks[';'.join(labels)] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self, name):
+        """热点函数：self = 栈顶样本数，total = 出现在栈中的样本数"""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+        return {
+            'name': name,
+            'duration_ms': round(self.duration * 1000, 1),
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'top_self': self_counts.most_common(TOP_FUNCTIONS),
+            'top_total': total_counts.most_common(TOP_FUNCTIONS),
+        }
+
+
+def _rotate(directory, max_files):
+    """只保留最新的 max_files 组结果"""
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(('.folded', '.json'))),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    # 每次写入两个文件
+    for entry in entries[:max(0, len(entries) - max_files * 2)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def write_profile(profiler, kind, name):
+    """写入 <目录>/<时间>_<类型>_<名称>.folded / .json 并轮转"""
+    config = profiling_config()
+    if profiler.duration * 1000 < config['min_duration_ms'] or not profiler.samples:
+        return None
+    directory = str(config['dir'])
+    os.makedirs(directory, exist_ok=True)
+    safe_name = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in name).strip('_')[:80] or 'root'
+    base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}_{kind}_{safe_name}")
+    try:
+        with open(base + '.folded', 'w') as folded:
+            folded.write(profiler.folded())
+        with open(base + '.json', 'w') as summary:
+            json.dump(profiler.summary(name), summary, ensure_ascii=False)
+        _rotate(directory, config['max_files'])
+    except OSError as e:
+        logger.warning("写入性能分析结果失败: %s", e)
+        return None
+    return base
+
+
+def new_profiler():
+    return SamplingProfiler(interval=profiling_config()['interval_ms'] / 1000)
+
+
+def should_profile_request():
+    config = profiling_config()
+    return random.random() < config['request_sample_rate']
+
+
+def profile_task(name):
+    """后台任务包装：开启 PROFILING['tasks'] 时每次运行采集一份分析结果"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiling_config()['tasks']:
+                return func(*args, **kwargs)
+            profiler = new_profiler().start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                path = write_profile(profiler.stop(), 'task', name)
+                if path:
+                    logger.info("任务 %s 性能分析已写入 %s（%s 个样本）", name, path, profiler.samples)
+        return wrapper
+    return decorator
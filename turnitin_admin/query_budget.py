@@ -0,0 +1,139 @@
+# turnitin_admin/query_budget.py
+"""
+SQL 查询预算
+视图 / 任务用 @query_budget(name, max_queries=..., max_db_ms=...) 声明预算，
+统计每次调用的查询数和数据库耗时，超出时记 WARNING 日志并计数；
+严格模式（QUERY_BUDGET['strict'] 或 enforce_query_budgets()）下抛出 QueryBudgetExceeded
+后台任务按处理的作业数放宽：允许 max_queries + per_item * 作业数，循环中调用 count_item()
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from .service import metrics
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# 名称 -> 预算声明
+registered_budgets = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """查询数或数据库耗时超出声明的预算"""
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _strict():
+    return getattr(_local, 'strict', False) or settings.QUERY_BUDGET['strict']
+
+
+def count_item(amount=1):
+    """后台任务循环中每处理一个作业调用一次，放宽当前预算"""
+    stack = _stack()
+    if stack:
+        stack[-1].items += amount
+
+
+class QueryBudget:
+    """一次调用内的统计；只统计当前线程的数据库连接"""
+
+    def __init__(self, name, max_queries=None, max_db_ms=None, per_item=0):
+        self.name = name
+        self.max_queries = max_queries
+        self.max_db_ms = max_db_ms
+        self.per_item = per_item
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.items = 0
+        self._wrapper = None
+
+    def _execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+    def __enter__(self):
+        if not settings.QUERY_BUDGET['enabled']:
+            return self
+        self._wrapper = connection.execute_wrapper(self._execute)
+        self._wrapper.__enter__()
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._wrapper is None:
+            return False
+        _stack().pop()
+        self._wrapper.__exit__(exc_type, exc, tb)
+        self._wrapper = None
+        # 调用本身出错时不再叠加预算错误
+        if exc_type is None:
+            self.check()
+        return False
+
+    @property
+    def allowed_queries(self):
+        if self.max_queries is None:
+            return None
+        return self.max_queries + self.per_item * self.items
+
+    def check(self):
+        problems = []
+        allowed = self.allowed_queries
+        if allowed is not None and self.queries > allowed:
+            problems.append(f"查询 {self.queries} 次，预算 {allowed} 次")
+        db_ms = self.db_seconds * 1000
+        if self.max_db_ms is not None and db_ms > self.max_db_ms:
+            problems.append(f"数据库耗时 {db_ms:.1f}ms，预算 {self.max_db_ms}ms")
+        if not problems:
+            return
+        metrics.inc_counter('turnitin_query_budget_exceeded_total', {'name': self.name})
+        message = f"{self.name} 超出查询预算: {'; '.join(problems)}（作业数 {self.items}）"
+        if _strict():
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def query_budget(name, max_queries=None, max_db_ms=None, per_item=0):
+    """视图 / 任务装饰器，每次调用使用独立的 QueryBudget"""
+    registered_budgets[name] = {'max_queries': max_queries, 'max_db_ms': max_db_ms, 'per_item': per_item}
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with QueryBudget(name, max_queries, max_db_ms, per_item):
+                return func(*args, **kwargs)
+        wrapper.query_budget = name
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def enforce_query_budgets():
+    """当前线程内把超出预算当作错误（测试 / 压测时使用）"""
+    previous = getattr(_local, 'strict', False)
+    _local.strict = True
+    try:
+        yield
+    finally:
+        _local.strict = previous
+
+
+def missing_budgets(module, names):
+    """返回 module 中未声明查询预算的函数名"""
+    return [name for name in names if not getattr(getattr(module, name, None), 'query_budget', None)]
@@ -0,0 +1,108 @@
+# turnitin_admin/service/admission_service.py
+import logging
+import math
+import time
+
+import redis
+from django.conf import settings
+
+from api.models import WebUserAssignments
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
+
+COMPLETIONS_KEY = 'pipeline:completions'
+THROUGHPUT_CACHE_KEY = 'pipeline:throughput'
+THROUGHPUT_CACHE_SECONDS = 10
+
+# 仍在流水线中的状态（会被 failed_task 超时判定）
+PENDING_STATUSES = [
+    WebUserAssignments.Status.SUBMITTED,
+    WebUserAssignments.Status.ANALYSING,
+    WebUserAssignments.Status.RETRY,
+]
+
+
+class AdmissionRejected(Exception):
+    """队列积压，新作业无法在时限内完成"""
+
+    def __init__(self, retry_after, eta_seconds):
+        self.retry_after = retry_after
+        self.eta_seconds = eta_seconds
+        super().__init__(f"当前排队较多，预计需要 {math.ceil(eta_seconds / 60)} 分钟，请 {retry_after} 秒后重试")
+
+
+class AdmissionController:
+    """
+    上传准入控制
+    根据当前排队数和最近的流水线吞吐量估算新作业的完成时间，
+    超过 failed_task 时限（乘安全系数）则拒绝
+    """
+
+    def __init__(self):
+        self.window_seconds = settings.ADMISSION_THROUGHPUT_WINDOW_MINUTES * 60
+        self.deadline_seconds = settings.FAILED_TASK_TIMEOUT_MINUTES * 60 * settings.ADMISSION_DEADLINE_SAFETY
+
+    def record_completion(self, job_id):
+        """作业报告下载完成时调用，用于统计吞吐量"""
+        now = time.time()
+        pipe = redis_client.pipeline()
+        pipe.zadd(COMPLETIONS_KEY, {str(job_id): now})
+        pipe.zremrangebyscore(COMPLETIONS_KEY, 0, now - self.window_seconds)
+        pipe.execute()
+
+    def queue_depth(self):
+        return WebUserAssignments.objects.filter(status__in=PENDING_STATUSES).count()
+
+    def throughput_per_minute(self):
+        """
+        最近窗口内的完成速率（篇/分钟），短暂缓存
+        空闲时完成数少并不代表处理能力低，因此以配置的默认吞吐量为下限
+        """
+        cached = redis_client.get(THROUGHPUT_CACHE_KEY)
+        if cached:
+            measured = float(cached)
+        else:
+            now = time.time()
+            completed = redis_client.zcount(COMPLETIONS_KEY, now - self.window_seconds, now)
+            measured = completed / (self.window_seconds / 60)
+            redis_client.set(THROUGHPUT_CACHE_KEY, measured, ex=THROUGHPUT_CACHE_SECONDS)
+        return max(measured, settings.ADMISSION_DEFAULT_THROUGHPUT_PER_MINUTE)
+
+    def estimate(self):
+        """
+        估算新提交作业的等待时间
+        吞吐量变化慢，可以缓存；排队数每次现查，突发上传时不会按几秒前的旧排队数放行
+        """
+        depth = self.queue_depth()
+        throughput = self.throughput_per_minute()
+        eta_seconds = (depth + 1) / throughput * 60
+        # 能在时限内完成的最大排队数，超出部分需要等待消化
+        allowed_depth = int(self.deadline_seconds / 60 * throughput) - 1
+        retry_after = 0
+        if depth > allowed_depth:
+            retry_after = max(30, math.ceil((depth - allowed_depth) / throughput * 60))
+
+        return {
+            'queue_depth': depth,
+            'throughput_per_minute': round(throughput, 3),
+            'eta_seconds': math.ceil(eta_seconds),
+            'retry_after': retry_after,
+        }
+
+    def check(self):
+        """准入检查，不通过时抛出 AdmissionRejected；Redis 不可用时放行（不因统计缺失拒绝所有上传）"""
+        try:
+            estimate = self.estimate()
+        except redis.RedisError as e:
+            logger.warning("准入检查读取吞吐量失败，放行: %s", e)
+            return None
+        if estimate['retry_after'] > 0:
+            logger.warning("准入拒绝：排队 %s 篇，吞吐 %s 篇/分钟，预计 %s 秒",
+                           estimate['queue_depth'], estimate['throughput_per_minute'], estimate['eta_seconds'])
+            raise AdmissionRejected(estimate['retry_after'], estimate['eta_seconds'])
+        return estimate
+
+
+admission_controller = AdmissionController()
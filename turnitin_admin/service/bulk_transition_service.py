@@ -0,0 +1,77 @@
+# turnitin_admin/service/bulk_transition_service.py
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.models import WebUserAssignments
+from .credit_service import refund_for_failures
+from .stats_service import record_bulk_transitions
+
+logger = logging.getLogger(__name__)
+
+Status = WebUserAssignments.Status
+
+BULK_CHUNK_SIZE = 1000
+
+# 批量操作 -> (允许的源状态, 目标状态)，与模型上的 FSM 转换保持一致
+BULK_TRANSITIONS = {
+    'requeue': ([Status.SUBMITTED, Status.ANALYSING], Status.RETRY),
+    'fail': ([Status.SUBMITTED, Status.ANALYSING, Status.RETRY], Status.FAILED),
+    'delete': ([Status.SUBMITTED, Status.ANALYSING, Status.DOWNLOADED, Status.FAILED, Status.RETRY], Status.DELETED),
+}
+
+
+def _update_values(action, now):
+    values = {'update_datetime': now}
+    if action == 'requeue':
+        # 重新排队：旧端口移到 previous_assignment_id（上传时避开），清空端口，超时从现在重新计算
+        # MySQL 按顺序执行 SET，previous_assignment_id 必须在清空 assignment_id 之前
+        values['previous_assignment_id'] = F('assignment_id')
+        values['assignment_id'] = ''
+        values['requeue_datetime'] = now
+    return values
+
+
+def apply_bulk_transition(action, ids, chunk_size=BULK_CHUNK_SIZE):
+    """
+    对选中的作业做集合式状态转换
+    每批：锁定符合源状态的行 -> 一条 UPDATE -> 对锁定的行退还 / 统计，其余计入 skipped
+    行锁持有到事务结束，锁定后状态不会再变，UPDATE 影响行数与锁定行数一致
+    """
+    if action not in BULK_TRANSITIONS:
+        raise ValueError(f"未知的批量操作: {action}")
+    sources, target = BULK_TRANSITIONS[action]
+    ids = sorted({int(job_id) for job_id in ids})
+
+    updated = 0
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                WebUserAssignments.objects.select_for_update()
+                .filter(id__in=chunk, status__in=sources)
+                .values_list('id', 'uid', 'assignment_id', 'create_datetime')
+            )
+            if not rows:
+                continue
+            count = WebUserAssignments.objects.filter(
+                id__in=[row[0] for row in rows], status__in=sources
+            ).update(status=target, **_update_values(action, now))
+            updated += count
+
+            if action == 'fail':
+                refund_for_failures((job_id, uid) for job_id, uid, _, _ in rows)
+            record_bulk_transitions([(port, created) for _, _, port, created in rows], target, at=now)
+
+    result = {
+        'action': action,
+        'target': target,
+        'requested': len(ids),
+        'updated': updated,
+        'skipped': len(ids) - updated,
+    }
+    logger.info("批量操作 %s 完成: %s", action, result)
+    return result
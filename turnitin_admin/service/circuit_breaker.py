@@ -0,0 +1,211 @@
+# turnitin_admin/service/circuit_breaker.py
+"""
+Turnitin 上游熔断（状态保存在 Redis，所有 worker 共享）
+按主机族（cookie / www / ev / sas）统计连续失败：
+- closed: 正常放行，连续失败达到阈值后 open
+- open: 直接抛出 CircuitOpenError，不再等待上游超时；open_seconds 后进入 half_open
+- half_open: 只放行少量探测请求，成功则 closed，失败则重新 open
+从第一次 open 到恢复 closed 记为一次中断（opened_at），恢复后区间写入 circuit:{family}:outages，
+作业超时判断扣除中断时间（上游不可用时作业无法推进，不应因此失败退款）
+"""
+import logging
+import time
+from datetime import datetime
+
+import redis
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
+
+KEY_PREFIX = 'circuit'
+FAMILIES = ['cookie', 'www', 'ev', 'sas']
+STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+# 中断区间保留时长（秒），需覆盖作业最长生命周期
+OUTAGE_RETENTION_SECONDS = 24 * 3600
+
+# ARGV: open_seconds, half_open_probes；返回 {状态, 是否放行, 距离可探测的秒数, 是否刚进入 half_open}
+ALLOW_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local open_seconds = tonumber(ARGV[1])
+local changed = 0
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then
+    return {state, 1, 0, 0}
+end
+local since = tonumber(redis.call('HGET', KEYS[1], 'changed_at') or '0')
+if state == 'open' then
+    if now - since < open_seconds then
+        return {state, 0, tostring(open_seconds - (now - since)), 0}
+    end
+    state = 'half_open'
+    changed = 1
+    redis.call('HSET', KEYS[1], 'state', state, 'changed_at', now, 'probes', 0)
+elseif now - since >= open_seconds then
+    -- 探测请求没有回报结果（进程退出等），重新允许探测
+    redis.call('HSET', KEYS[1], 'changed_at', now, 'probes', 0)
+end
+if redis.call('HINCRBY', KEYS[1], 'probes', 1) <= tonumber(ARGV[2]) then
+    return {state, 1, 0, changed}
+end
+redis.call('HINCRBY', KEYS[1], 'probes', -1)
+return {state, 0, tostring(open_seconds), changed}
+"""
+
+# KEYS: 状态 hash, 中断区间 zset；ARGV: 是否成功 (1/0), failure_threshold, 区间保留秒数；返回 {原状态, 新状态}
+RECORD_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if ARGV[1] == '1' then
+    -- open 期间返回的成功来自熔断前发出的请求，不据此恢复
+    if state == 'open' then
+        return {state, state}
+    end
+    if state == 'half_open' or tonumber(redis.call('HGET', KEYS[1], 'failures') or '0') > 0 then
+        redis.call('HSET', KEYS[1], 'state', 'closed', 'failures', 0, 'probes', 0, 'changed_at', now)
+        local opened_at = redis.call('HGET', KEYS[1], 'opened_at')
+        if opened_at then
+            -- 中断结束：记录区间 opened_at:now（score 为结束时间），清理过期区间
+            redis.call('ZADD', KEYS[2], now, opened_at .. ':' .. now)
+            redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[3]))
+            redis.call('HDEL', KEYS[1], 'opened_at')
+        end
+    end
+    return {state, 'closed'}
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state == 'half_open' or (state == 'closed' and failures >= tonumber(ARGV[2])) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'changed_at', now)
+    -- half_open 探测失败重新 open 属于同一次中断，保留最初的 opened_at
+    if redis.call('HEXISTS', KEYS[1], 'opened_at') == 0 then
+        redis.call('HSET', KEYS[1], 'opened_at', now)
+    end
+    return {state, 'open'}
+end
+return {state, state}
+"""
+
+_allow = redis_client.register_script(ALLOW_SCRIPT)
+_record = redis_client.register_script(RECORD_SCRIPT)
+
+
+class CircuitOpenError(IOError):
+    """上游熔断中，作业应延后处理（不计入失败 / 重试）"""
+
+    def __init__(self, family, retry_after):
+        self.family = family
+        self.retry_after = retry_after
+        super().__init__(f"Turnitin {family} 熔断中，约 {retry_after:.0f} 秒后重试")
+
+
+def _config():
+    return settings.TURNITIN_CIRCUIT_BREAKER
+
+
+def _key(family):
+    return f"{KEY_PREFIX}:{family}"
+
+
+def _outages_key(family):
+    return f"{KEY_PREFIX}:{family}:outages"
+
+
+def _transition(family, previous, state):
+    if previous == state:
+        return
+    metrics.set_gauge('turnitin_circuit_state', {'family': family}, STATE_VALUES[state])
+    log = logger.warning if state == 'open' else logger.info
+    log("Turnitin %s 熔断状态 %s -> %s", family, previous, state)
+
+
+def before_request(family):
+    """请求前调用；熔断中抛出 CircuitOpenError。Redis 不可用时放行"""
+    config = _config()
+    if not config['enabled'] or family not in FAMILIES:
+        return
+    try:
+        state, allowed, retry_after, changed = _allow(
+            keys=[_key(family)], args=[config['open_seconds'], config['half_open_probes']])
+    except redis.RedisError as e:
+        logger.warning("熔断器不可用，放行请求: %s", e)
+        return
+    if int(changed):
+        _transition(family, 'open', state)
+    if not int(allowed):
+        metrics.inc_counter('turnitin_circuit_rejected_total', {'family': family})
+        raise CircuitOpenError(family, float(retry_after))
+
+
+def record(family, success):
+    config = _config()
+    if not config['enabled'] or family not in FAMILIES:
+        return
+    try:
+        previous, state = _record(keys=[_key(family), _outages_key(family)],
+                                  args=[1 if success else 0, config['failure_threshold'], OUTAGE_RETENTION_SECONDS])
+    except redis.RedisError as e:
+        logger.warning("熔断器不可用: %s", e)
+        return
+    _transition(family, previous, state)
+
+
+def states():
+    """后台看板：各主机族当前状态"""
+    pipe = redis_client.pipeline(transaction=False)
+    for family in FAMILIES:
+        pipe.hgetall(_key(family))
+    try:
+        rows = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("读取熔断状态失败: %s", e)
+        return []
+    return [{
+        'family': family,
+        'state': row.get('state', 'closed'),
+        'failures': int(row.get('failures', 0)),
+        'changed_at': datetime.fromtimestamp(float(row['changed_at'])) if row.get('changed_at') else None,
+    } for family, row in zip(FAMILIES, rows)]
+
+
+def outage_intervals(families, since):
+    """
+    since（时间戳）以来这些主机族的中断区间，合并重叠部分后按开始时间排序
+    尚未恢复的中断结束于当前时间；Redis 不可用时返回空列表（按无中断处理）
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for family in families:
+        pipe.hget(_key(family), 'opened_at')
+        pipe.zrangebyscore(_outages_key(family), since, '+inf')
+    try:
+        rows = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("读取熔断中断区间失败: %s", e)
+        return []
+    now = time.time()
+    intervals = []
+    for opened_at, members in zip(rows[::2], rows[1::2]):
+        if opened_at:
+            intervals.append((float(opened_at), now))
+        for member in members:
+            start, _, end = member.partition(':')
+            intervals.append((float(start), float(end)))
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def outage_overlap(intervals, since):
+    """中断区间与 [since, 当前] 重叠的总秒数"""
+    return sum(max(0.0, end - max(start, since)) for start, end in intervals)
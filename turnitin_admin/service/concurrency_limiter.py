@@ -0,0 +1,125 @@
+# turnitin_admin/service/concurrency_limiter.py
+"""
+上传 / 下载 worker 的自适应并发（AIMD，状态保存在 Redis，所有 worker 共享）
+- 每个正在处理的作业持有一个租约（有序集合，分数为过期时间，进程退出后自动回收）
+- 作业结束时按该作业的上游请求平均耗时和失败率调整上限：
+  正常则加性增加（每个上限窗口约 +1），变慢或出错则乘性减少（冷却期内只减一次）
+"""
+import logging
+import threading
+import uuid
+
+import redis
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
+
+KEY_PREFIX = 'concurrency'
+
+# KEYS: 租约集合, 状态 hash；ARGV: 租约 id, 租约秒数, 初始上限
+ACQUIRE_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local now = tonumber(redis.call('TIME')[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local limit = tonumber(redis.call('HGET', KEYS[2], 'limit') or ARGV[3])
+if redis.call('ZCARD', KEYS[1]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+# KEYS: 状态 hash；ARGV: 是否正常 (1/0), 最小, 最大, 初始, 减少系数, 冷却秒数；返回新上限
+ADJUST_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local now = tonumber(redis.call('TIME')[1])
+local min_limit, max_limit = tonumber(ARGV[2]), tonumber(ARGV[3])
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or ARGV[4])
+if ARGV[1] == '1' then
+    limit = math.min(max_limit, limit + 1 / limit)
+else
+    local last = tonumber(redis.call('HGET', KEYS[1], 'decreased_at') or '0')
+    if now - last < tonumber(ARGV[6]) then
+        return tostring(limit)
+    end
+    limit = math.max(min_limit, limit * tonumber(ARGV[5]))
+    redis.call('HSET', KEYS[1], 'decreased_at', now)
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+return tostring(limit)
+"""
+
+_acquire = redis_client.register_script(ACQUIRE_SCRIPT)
+_adjust = redis_client.register_script(ADJUST_SCRIPT)
+
+
+class AdaptiveConcurrencyLimiter:
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.config = settings.TURNITIN_CONCURRENCY[pool]
+        self.leases_key = f"{KEY_PREFIX}:{pool}:leases"
+        self.state_key = f"{KEY_PREFIX}:{pool}:state"
+        # 本进程持有的租约数，Redis 不可用时按最小并发放行
+        self._local = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_limit(self):
+        return self.config['max_limit']
+
+    def try_acquire(self):
+        """拿到租约时返回租约 id，否则返回 None。Redis 不可用时本进程按最小并发放行"""
+        lease = uuid.uuid4().hex
+        try:
+            ok = int(_acquire(keys=[self.leases_key, self.state_key],
+                              args=[lease, self.config['lease_seconds'], self.config['initial_limit']]))
+        except redis.RedisError as e:
+            logger.warning("并发控制不可用: %s", e)
+            ok = self._local < self.config['min_limit']
+        if not ok:
+            return None
+        with self._lock:
+            self._local += 1
+        return lease
+
+    def release(self, lease):
+        with self._lock:
+            self._local -= 1
+        try:
+            redis_client.zrem(self.leases_key, lease)
+        except redis.RedisError as e:
+            logger.warning("释放并发租约失败: %s", e)
+
+    def observe(self, requests_count, upstream_seconds, errors):
+        """作业结束时调用：上游请求数、请求总耗时、失败请求数"""
+        if not requests_count:
+            return None
+        config = self.config
+        mean_latency = upstream_seconds / requests_count
+        healthy = mean_latency <= config['target_latency_seconds'] and errors / requests_count <= config['max_error_rate']
+        return self._adjust(healthy)
+
+    def backoff(self):
+        """熔断等明确的过载信号，直接减少"""
+        return self._adjust(False)
+
+    def _adjust(self, healthy):
+        config = self.config
+        try:
+            limit = float(_adjust(keys=[self.state_key], args=[
+                1 if healthy else 0, config['min_limit'], config['max_limit'], config['initial_limit'],
+                config['decrease_factor'], config['decrease_cooldown_seconds'],
+            ]))
+        except redis.RedisError as e:
+            logger.warning("并发控制不可用: %s", e)
+            return None
+        metrics.set_gauge('turnitin_concurrency_limit', {'pool': self.pool}, round(limit, 2))
+        if not healthy:
+            logger.info("%s 并发上限调整为 %.2f", self.pool, limit)
+        return limit
@@ -0,0 +1,100 @@
+# turnitin_admin/service/credit_service.py
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+
+from api.models import RechargeRecord, WebUser, WebCreditLedger
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientCreditError(PermissionError):
+    """剩余检查次数不足"""
+
+
+def debit_for_upload(uid, job_id):
+    """
+    上传扣减 1 次
+    单条条件 UPDATE 完成检查和扣减：available_cnt > 0 才会更新，没有读-改-写
+    """
+    with transaction.atomic():
+        updated = WebUser.objects.filter(uid=uid, available_cnt__gt=0).update(
+            available_cnt=F('available_cnt') - 1
+        )
+        if not updated:
+            raise InsufficientCreditError("无剩余检查次数")
+        WebCreditLedger.objects.create(
+            uid=uid,
+            delta=-1,
+            reason=WebCreditLedger.Reason.UPLOAD_DEBIT,
+            job_id=job_id,
+        )
+
+
+def refund_for_failure(uid, job_id):
+    """作业失败退还 1 次"""
+    with transaction.atomic():
+        WebUser.objects.filter(uid=uid).update(
+            available_cnt=Coalesce(F('available_cnt'), Value(0)) + 1
+        )
+        WebCreditLedger.objects.create(
+            uid=uid,
+            delta=1,
+            reason=WebCreditLedger.Reason.FAILURE_REFUND,
+            job_id=job_id,
+        )
+    logger.info("用户 %s 作业 %s 失败，退还 1 次", uid, job_id)
+
+
+def credit_for_recharge(uid, recharge_record, cnt):
+    """充值增加次数，流水关联 RechargeRecord"""
+    if cnt <= 0:
+        raise ValueError("充值次数必须大于 0")
+    with transaction.atomic():
+        updated = WebUser.objects.filter(uid=uid).update(
+            available_cnt=Coalesce(F('available_cnt'), Value(0)) + cnt
+        )
+        if not updated:
+            raise WebUser.DoesNotExist(f"用户 {uid} 不存在")
+        WebCreditLedger.objects.create(
+            uid=uid,
+            delta=cnt,
+            reason=WebCreditLedger.Reason.RECHARGE_CREDIT,
+            recharge_record_id=recharge_record.id,
+        )
+    logger.info("用户 %s 充值 %s 次，充值记录 %s", uid, cnt, recharge_record.id)
+
+
+def recharge_web_user(uid, cnt, amount=0, trans_id=''):
+    """后台为 Web 用户充值：先写充值记录（wechat_id 记 Web 用户 uid），再按记录加次数"""
+    with transaction.atomic():
+        record = RechargeRecord.objects.create(wechat_id=uid, amount=amount, trans_id=trans_id)
+        credit_for_recharge(uid, record, cnt)
+    return record
+
+
+def refund_for_failures(jobs):
+    """
+    批量失败退还
+    jobs: (job_id, uid) 列表；按用户聚合后一条 UPDATE（CASE WHEN）完成加次数，流水批量写入
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    per_user = Counter(uid for _, uid in jobs)
+    with transaction.atomic():
+        WebUser.objects.filter(uid__in=list(per_user)).update(
+            available_cnt=Case(
+                *[When(uid=uid, then=Coalesce(F('available_cnt'), Value(0)) + cnt) for uid, cnt in per_user.items()],
+                default=F('available_cnt'),
+                output_field=IntegerField(),
+            )
+        )
+        WebCreditLedger.objects.bulk_create([
+            WebCreditLedger(uid=uid, delta=1, reason=WebCreditLedger.Reason.FAILURE_REFUND, job_id=job_id)
+            for job_id, uid in jobs
+        ])
+    logger.info("批量退还 %s 个作业，涉及 %s 个用户", len(jobs), len(per_user))
@@ -0,0 +1,90 @@
+# turnitin_admin/service/dedup_service.py
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+
+from api.models import WebReportIndex, WebStoredFile
+from . import metrics
+from .storage_service import share_file
+
+logger = logging.getLogger(__name__)
+
+DEDUP_METRIC = 'turnitin_dedup_lookups_total'
+
+
+def new_content_hasher():
+    """上传时边写盘边计算的哈希对象"""
+    return hashlib.sha256()
+
+
+def _filter_key(filter_quote, filter_reference):
+    """过滤设置归一化，None 与空串视为相同"""
+    return filter_quote or '', filter_reference or ''
+
+
+def find_reusable_report(content_hash, filter_quote=None, filter_reference=None):
+    """查找时间窗口内相同内容、相同过滤设置的报告，没有则返回 None"""
+    if settings.DEDUP_WINDOW_MINUTES <= 0 or not content_hash:
+        return None
+
+    quote, reference = _filter_key(filter_quote, filter_reference)
+    since = timezone.now() - timedelta(minutes=settings.DEDUP_WINDOW_MINUTES)
+    candidates = WebReportIndex.objects.filter(
+        content_hash=content_hash,
+        filter_quote=quote,
+        filter_reference=reference,
+        create_datetime__gte=since,
+    ).order_by('-create_datetime')[:3]
+
+    for entry in candidates:
+        # 报告文件可能已被清理，文件不在则继续找下一条
+        if not default_storage.exists(entry.plagiarism_path):
+            continue
+        if entry.ai_path and not default_storage.exists(entry.ai_path):
+            continue
+        metrics.inc_counter(DEDUP_METRIC, {'result': 'hit'})
+        WebReportIndex.objects.filter(pk=entry.pk).update(hit_count=F('hit_count') + 1)
+        logger.info("内容 %s 命中报告缓存，复用作业 %s 的报告", content_hash[:12], entry.source_job_id)
+        return entry
+
+    metrics.inc_counter(DEDUP_METRIC, {'result': 'miss'})
+    return None
+
+
+def reuse_report(entry, job_id):
+    """新作业直接引用命中的报告文件（文件清单计数，不复制）"""
+    share_file(job_id, WebStoredFile.Kind.PLAGIARISM_REPORT, entry.plagiarism_path)
+    if entry.ai_path:
+        share_file(job_id, WebStoredFile.Kind.AI_REPORT, entry.ai_path)
+
+
+def register_report(assignment, ai_path, plagiarism_path):
+    """报告下载完成后登记到索引"""
+    if not assignment.content_hash or not plagiarism_path:
+        return
+    quote, reference = _filter_key(assignment.filter_quote, assignment.filter_reference)
+    WebReportIndex.objects.create(
+        content_hash=assignment.content_hash,
+        filter_quote=quote,
+        filter_reference=reference,
+        ai_path=ai_path,
+        plagiarism_path=plagiarism_path,
+        source_job_id=assignment.id,
+    )
+
+
+def get_dedup_stats():
+    """去重命中率统计"""
+    hits = int(metrics.get_counter(DEDUP_METRIC, {'result': 'hit'}))
+    misses = int(metrics.get_counter(DEDUP_METRIC, {'result': 'miss'}))
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
@@ -0,0 +1,160 @@
+# turnitin_admin/service/http_session.py
+"""
+TurnitinService 使用的 HTTP 会话
+按逻辑接口（而不是完整 URL）统计耗时、状态码和收发字节数；
+发送前按主机族熔断（circuit_breaker.py）和限流（rate_limiter.py）
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+from . import circuit_breaker, metrics, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# (逻辑接口名, 路径正则)，按顺序匹配
+ENDPOINT_PATTERNS = [
+    ('cookie', re.compile(r'/admin/api/turnitin/cookie')),
+    ('t_home', re.compile(r'/t_home\.asp')),
+    ('instructor_home', re.compile(r'/class/\d+/instructor_home')),
+    ('class_home', re.compile(r'/class_home')),
+    ('inbox', re.compile(r'/assignment/type/paper/inbox/')),
+    ('t_submit', re.compile(r'/t_submit\.asp')),
+    ('submission_metadata', re.compile(r'/get_submission_metadata\.asp')),
+    ('submit_confirm', re.compile(r'/submit_confirm\.asp')),
+    ('sws_launch_token', re.compile(r'/paper/\d+/sws_launch_token')),
+    ('session_token', re.compile(r'/assignment/\d+/session_token')),
+    ('queue_pdf', re.compile(r'/paper/\d+/queue_pdf')),
+    ('similarity_options', re.compile(r'/paper/\d+/similarity/options')),
+    ('carta', re.compile(r'/app/carta/')),
+    ('sas_job_status', re.compile(r'/job/[^/]+$')),
+    ('sas_job', re.compile(r'/job$')),
+]
+
+# 逻辑接口 -> 上游主机族（限流、熔断按主机族），cookie 接口为内部服务，只熔断不限流
+ENDPOINT_FAMILIES = {
+    'cookie': 'cookie',
+    't_home': 'www', 'instructor_home': 'www', 'class_home': 'www', 'inbox': 'www',
+    't_submit': 'www', 'submission_metadata': 'www', 'submit_confirm': 'www',
+    'sws_launch_token': 'ev', 'session_token': 'ev', 'queue_pdf': 'ev', 'similarity_options': 'ev', 'carta': 'ev',
+    'sas_job_status': 'sas', 'sas_job': 'sas',
+}
+
+# 未识别的接口按主机名前缀归类
+HOST_FAMILIES = [('www.', 'www'), ('ev.', 'ev'), ('sas-api', 'sas')]
+
+DEFAULT_RETRY_AFTER_SECONDS = 30
+
+# 被重定向到登录页说明 Cookie 失效，视为上游失败
+LOGIN_PAGE_MARKER = 'login_page.asp'
+
+
+def classify_endpoint(url):
+    """URL -> 逻辑接口名，未知的归为 other（避免高基数标签）"""
+    path = urlsplit(url).path
+    for name, pattern in ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return name
+    return 'other'
+
+
+def endpoint_family(endpoint, url):
+    if endpoint in ENDPOINT_FAMILIES:
+        return ENDPOINT_FAMILIES[endpoint]
+    host = urlsplit(url).hostname or ''
+    for prefix, family in HOST_FAMILIES:
+        if host.startswith(prefix):
+            return family
+    return None
+
+
+def _is_failure(response):
+    """5xx、401 和被重定向到登录页计为熔断失败；429 由限流处理，其余 4xx 视为请求本身的问题"""
+    return response.status_code >= 500 or response.status_code == 401 or LOGIN_PAGE_MARKER in response.url
+
+
+def _retry_after(response):
+    try:
+        return max(1, int(response.headers.get('Retry-After', DEFAULT_RETRY_AFTER_SECONDS)))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+_local = threading.local()
+
+
+class UpstreamStats:
+    """当前线程一段时间内的上游请求统计（供自适应并发使用）"""
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.errors = 0
+
+
+@contextmanager
+def track_upstream():
+    """with track_upstream() as stats: 统计块内本线程发出的 Turnitin 请求"""
+    previous = getattr(_local, 'stats', None)
+    _local.stats = stats = UpstreamStats()
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def _track(seconds, failed):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.requests += 1
+        stats.seconds += seconds
+        stats.errors += failed
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0  # 流式 body 不统计
+
+
+class TurnitinSession(requests.Session):
+    """带指标统计、熔断和限流的 requests.Session"""
+
+    def request(self, method, url, *args, **kwargs):
+        endpoint = classify_endpoint(url)
+        family = endpoint_family(endpoint, url)
+        labels = {'endpoint': endpoint, 'method': method.upper()}
+        circuit_breaker.before_request(family)
+        rate_limiter.acquire(family)
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException as e:
+            elapsed = time.perf_counter() - start
+            metrics.observe_histogram('turnitin_http_request_duration_seconds', labels, elapsed)
+            metrics.inc_counter('turnitin_http_requests_total', {**labels, 'status': type(e).__name__})
+            circuit_breaker.record(family, success=False)
+            _track(elapsed, True)
+            raise
+
+        elapsed = time.perf_counter() - start
+        failed = _is_failure(response)
+        metrics.observe_histogram('turnitin_http_request_duration_seconds', labels, elapsed)
+        metrics.inc_counter('turnitin_http_requests_total', {**labels, 'status': str(response.status_code)})
+        circuit_breaker.record(family, success=not failed)
+        _track(elapsed, failed or response.status_code == 429)
+        if response.status_code == 429:
+            retry_after = _retry_after(response)
+            logger.warning("%s 被 Turnitin 限流，%s 秒内暂停该主机族请求", endpoint, retry_after)
+            rate_limiter.penalize(family, retry_after)
+        metrics.inc_counter('turnitin_http_request_bytes_total', labels, _body_size(response.request.body))
+        if not kwargs.get('stream'):
+            metrics.inc_counter('turnitin_http_response_bytes_total', labels, len(response.content))
+        return response
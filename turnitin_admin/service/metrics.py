@@ -0,0 +1,126 @@
+# turnitin_admin/service/metrics.py
+"""
+进程间共享的指标（存放在 Redis），以 Prometheus 文本格式输出
+Web 进程和 django-q worker 进程写入同一份数据，/metrics 读取汇总
+"""
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
+
+KEY_PREFIX = 'metrics'
+
+# 耗时分桶（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    'turnitin_http_request_duration_seconds': ('histogram', 'Turnitin 上游请求耗时'),
+    'turnitin_http_requests_total': ('counter', 'Turnitin 上游请求数（按状态码）'),
+    'turnitin_http_request_bytes_total': ('counter', 'Turnitin 上游请求发送字节数'),
+    'turnitin_http_response_bytes_total': ('counter', 'Turnitin 上游响应接收字节数'),
+    'turnitin_worker_in_flight_jobs': ('gauge', '后台任务正在处理的作业数'),
+    'turnitin_queue_depth': ('gauge', '各状态排队作业数'),
+    'turnitin_dedup_lookups_total': ('counter', '报告去重查找次数（hit/miss）'),
+    'turnitin_rate_limit_wait_seconds_total': ('counter', 'Turnitin 请求等待限流令牌的总秒数'),
+    'turnitin_rate_limit_timeouts_total': ('counter', 'Turnitin 请求等待限流令牌超时次数'),
+    'turnitin_circuit_state': ('gauge', 'Turnitin 熔断状态（0 closed / 1 half_open / 2 open）'),
+    'turnitin_circuit_rejected_total': ('counter', '熔断期间被直接拒绝的 Turnitin 请求数'),
+    'turnitin_concurrency_limit': ('gauge', '上传 / 下载 worker 当前自适应并发上限'),
+    'turnitin_query_budget_exceeded_total': ('counter', '视图 / 任务超出 SQL 查询预算次数'),
+}
+
+
+def _label_key(labels):
+    return ','.join(f'{name}="{value}"' for name, value in sorted((labels or {}).items()))
+
+
+def _key(kind, name):
+    return f'{KEY_PREFIX}:{kind}:{name}'
+
+
+def inc_counter(name, labels=None, amount=1):
+    try:
+        redis_client.hincrbyfloat(_key('counter', name), _label_key(labels), amount)
+    except redis.RedisError as e:
+        logger.debug("写入指标 %s 失败: %s", name, e)
+
+
+def set_gauge(name, labels=None, value=0):
+    try:
+        redis_client.hset(_key('gauge', name), _label_key(labels), value)
+    except redis.RedisError as e:
+        logger.debug("写入指标 %s 失败: %s", name, e)
+
+
+def inc_gauge(name, labels=None, amount=1):
+    try:
+        redis_client.hincrbyfloat(_key('gauge', name), _label_key(labels), amount)
+    except redis.RedisError as e:
+        logger.debug("写入指标 %s 失败: %s", name, e)
+
+
+def observe_histogram(name, labels=None, value=0.0, buckets=LATENCY_BUCKETS):
+    """只记录落入的那个桶，输出时再累加成 Prometheus 的累计桶"""
+    label_key = _label_key(labels)
+    bucket = next((str(upper) for upper in buckets if value <= upper), '+Inf')
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        key = _key('histogram', name)
+        pipe.hincrby(key, f'{label_key}|{bucket}', 1)
+        pipe.hincrbyfloat(key, f'{label_key}|sum', value)
+        pipe.hincrby(key, f'{label_key}|count', 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug("写入指标 %s 失败: %s", name, e)
+
+
+def get_counter(name, labels=None):
+    value = redis_client.hget(_key('counter', name), _label_key(labels))
+    return float(value) if value else 0.0
+
+
+def _format_labels(label_key, extra=None):
+    parts = [part for part in (label_key, extra) if part]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _render_histogram(name, data, buckets=LATENCY_BUCKETS):
+    lines = []
+    series = {}
+    for field, value in data.items():
+        label_key, _, suffix = field.rpartition('|')
+        series.setdefault(label_key, {})[suffix] = float(value)
+    for label_key, values in sorted(series.items()):
+        cumulative = 0
+        for upper in [str(upper) for upper in buckets] + ['+Inf']:
+            cumulative += values.get(upper, 0)
+            le_label = 'le="%s"' % upper
+            lines.append(f'{name}_bucket{_format_labels(label_key, le_label)} {_format_value(cumulative)}')
+        lines.append(f'{name}_sum{_format_labels(label_key)} {_format_value(values.get("sum", 0))}')
+        lines.append(f'{name}_count{_format_labels(label_key)} {_format_value(values.get("count", 0))}')
+    return lines
+
+
+def render_prometheus():
+    """Prometheus 文本格式（0.0.4）"""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        data = redis_client.hgetall(_key(kind, name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            lines.extend(_render_histogram(name, data))
+        else:
+            for label_key, value in sorted(data.items()):
+                lines.append(f'{name}{_format_labels(label_key)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,61 @@
+# turnitin_admin/service/provision_service.py
+import csv
+import logging
+
+from django.db import transaction
+
+from api.models import WebUser, WebCreditLedger
+
+logger = logging.getLogger(__name__)
+
+WEB_USER_URL_PREFIX = 'https://turnitingood.com/'
+PROVISION_CHUNK_SIZE = 1000
+PROVISION_MAX_COUNT = 200000
+PROVISION_LANGUAGES = {code for code, _ in WebUser.LANGUAGE_CHOICES}
+
+
+def validate_provision_params(count, language, credits):
+    if not 0 < count <= PROVISION_MAX_COUNT:
+        raise ValueError(f"数量必须在 1 - {PROVISION_MAX_COUNT} 之间")
+    if language not in PROVISION_LANGUAGES:
+        raise ValueError(f"无效的语言: {language}")
+    if credits < 0:
+        raise ValueError("使用次数不能为负数")
+
+
+def provision_web_users(count, language, credits, nick_prefix, chunk_size=PROVISION_CHUNK_SIZE):
+    """
+    批量创建 Web 用户（生成器）
+    整个批次在一个事务内分块 bulk_create，每块写入后逐个产出用户，内存只保留一块；
+    初始次数同时写入额度流水，保证流水与 available_cnt 对得上；
+    中途出错或调用方提前停止迭代时整个批次回滚
+    """
+    validate_provision_params(count, language, credits)
+    with transaction.atomic():
+        for start in range(0, count, chunk_size):
+            batch = [
+                WebUser(language=language, nick_name=f'{nick_prefix}{i}', available_cnt=credits)
+                for i in range(start, min(start + chunk_size, count))
+            ]
+            WebUser.objects.bulk_create(batch, batch_size=chunk_size)
+            if credits:
+                WebCreditLedger.objects.bulk_create([
+                    WebCreditLedger(uid=user.uid, delta=credits, reason=WebCreditLedger.Reason.PROVISION_CREDIT)
+                    for user in batch
+                ], batch_size=chunk_size)
+            yield from batch
+    logger.info("批量创建 %s 个 Web 用户完成，语言 %s，次数 %s", count, language, credits)
+
+
+class Echo:
+    """csv.writer 的伪文件对象，write 直接返回内容（流式 CSV 共用，见 api/exports.py）"""
+    def write(self, value):
+        return value
+
+
+def iter_provision_csv(count, language, credits, nick_prefix, chunk_size=PROVISION_CHUNK_SIZE):
+    """逐行产出批量创建结果的 CSV"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['nick_name', 'uid', 'link', 'language', 'available_cnt'])
+    for user in provision_web_users(count, language, credits, nick_prefix, chunk_size):
+        yield writer.writerow([user.nick_name, user.uid, WEB_USER_URL_PREFIX + user.uid, language, credits])
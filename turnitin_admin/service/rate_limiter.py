@@ -0,0 +1,126 @@
+# turnitin_admin/service/rate_limiter.py
+"""
+Turnitin 出站请求限流（所有进程 / 节点共享）
+每个上游主机族（www / ev / sas）和每个 Turnitin 账号各一个 Redis 令牌桶，
+一次请求需同时从两个桶各取一个令牌；取令牌由 Lua 脚本原子完成，时间使用 Redis 服务器时间，避免节点间时钟偏差
+"""
+import logging
+import time
+
+import redis
+import requests
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
+
+KEY_PREFIX = 'ratelimit'
+
+# KEYS: 令牌桶；ARGV: 每个桶的 (每秒速率, 容量) 依次排列
+# 所有桶都有令牌时各扣一个并返回 0，否则不扣并返回需要等待的毫秒数
+TAKE_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    current = math.min(capacity, current + math.max(0, now - ts) * rate / 1000)
+    tokens[i] = current
+    if current < 1 then
+        wait = math.max(wait, math.ceil((1 - current) * 1000 / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 60000)
+end
+return 0
+"""
+
+# 收到 429 时把桶清空并透支 seconds 秒的令牌，之后所有节点都会等待
+PENALIZE_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rate = tonumber(ARGV[1])
+redis.call('HSET', KEYS[1], 'tokens', -rate * tonumber(ARGV[2]), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2]) * 1000) + 60000)
+return 0
+"""
+
+_take = redis_client.register_script(TAKE_SCRIPT)
+_penalize = redis_client.register_script(PENALIZE_SCRIPT)
+
+
+class RateLimitTimeout(requests.RequestException):
+    """在允许的等待时间内没有拿到令牌"""
+
+
+def _config():
+    return settings.TURNITIN_RATE_LIMIT
+
+
+def _buckets(family):
+    """(key, 速率, 容量) 列表：主机族桶 + 账号桶"""
+    config = _config()
+    rate, burst = config['families'][family]
+    account_rate, account_burst = config['account_rate']
+    return [
+        (f"{KEY_PREFIX}:family:{family}", rate, burst),
+        (f"{KEY_PREFIX}:account:{config['account']}", account_rate, account_burst),
+    ]
+
+
+def acquire(family, max_wait=None):
+    """阻塞直到拿到令牌；family 不限流时直接返回。Redis 不可用时放行（不因限流组件故障停止业务）"""
+    config = _config()
+    if not config['enabled'] or family not in config['families']:
+        return
+    max_wait = config['max_wait_seconds'] if max_wait is None else max_wait
+    buckets = _buckets(family)
+    keys = [key for key, _, _ in buckets]
+    args = [value for _, rate, burst in buckets for value in (rate, burst)]
+    deadline = time.monotonic() + max_wait
+    waited = 0.0
+    while True:
+        try:
+            wait_ms = int(_take(keys=keys, args=args))
+        except redis.RedisError as e:
+            logger.warning("限流器不可用，放行请求: %s", e)
+            return
+        if wait_ms == 0:
+            if waited:
+                metrics.inc_counter('turnitin_rate_limit_wait_seconds_total', {'family': family}, waited)
+            return
+        wait = wait_ms / 1000
+        if time.monotonic() + wait > deadline:
+            metrics.inc_counter('turnitin_rate_limit_timeouts_total', {'family': family})
+            raise RateLimitTimeout(f"{family} 请求限流，{max_wait} 秒内未获得令牌")
+        time.sleep(wait)
+        waited += wait
+
+
+def penalize(family, seconds):
+    """上游返回 429 时调用，seconds 通常取 Retry-After"""
+    config = _config()
+    if not config['enabled'] or family not in config['families']:
+        return
+    rate, _ = config['families'][family]
+    try:
+        _penalize(keys=[f"{KEY_PREFIX}:family:{family}"], args=[rate, seconds])
+    except redis.RedisError as e:
+        logger.warning("限流器不可用: %s", e)
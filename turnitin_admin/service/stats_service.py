@@ -0,0 +1,157 @@
+# turnitin_admin/service/stats_service.py
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.models import WebPipelineStatHourly, WebUserAssignments
+
+logger = logging.getLogger(__name__)
+
+# 耗时分桶上界（秒），最后一个桶为超过 1 小时
+LATENCY_BUCKETS_SECONDS = [60, 120, 300, 600, 900, 1800, 3600]
+
+
+def latency_bucket(seconds):
+    for index, upper in enumerate(LATENCY_BUCKETS_SECONDS):
+        if seconds <= upper:
+            return index
+    return len(LATENCY_BUCKETS_SECONDS)
+
+
+def bucket_upper_seconds(bucket):
+    """分桶上界，用于近似中位数；最后一个桶按 2 小时估算"""
+    if bucket < len(LATENCY_BUCKETS_SECONDS):
+        return LATENCY_BUCKETS_SECONDS[bucket]
+    return LATENCY_BUCKETS_SECONDS[-1] * 2
+
+
+def _truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def record_transition(status, port, latency_seconds, at=None, count=1):
+    """在对应 (小时, 状态, 端口, 分桶) 上累加计数"""
+    hour = _truncate_hour(at or timezone.now())
+    latency_seconds = max(0, int(latency_seconds))
+    key = {
+        'hour': hour,
+        'status': status,
+        'port': port or '',
+        'latency_bucket': latency_bucket(latency_seconds / count),
+    }
+    increments = {
+        'count': F('count') + count,
+        'latency_sum_seconds': F('latency_sum_seconds') + latency_seconds,
+    }
+    if WebPipelineStatHourly.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            WebPipelineStatHourly.objects.create(count=count, latency_sum_seconds=latency_seconds, **key)
+    except IntegrityError:
+        # 并发下其他进程已创建该行
+        WebPipelineStatHourly.objects.filter(**key).update(**increments)
+
+
+def record_assignment_transition(assignment, target, at=None):
+    """根据作业记录一次状态转换"""
+    at = at or timezone.now()
+    latency = (at - assignment.create_datetime).total_seconds() if assignment.create_datetime else 0
+    try:
+        record_transition(target, assignment.assignment_id, latency, at=at)
+    except Exception as e:
+        # 统计失败不能影响业务流程
+        logger.warning("记录流水线统计失败: job=%s target=%s 错误: %s", assignment.id, target, e)
+
+
+def record_bulk_transitions(rows, target, at=None):
+    """
+    批量转换后按 (端口, 分桶) 聚合再写入
+    rows: (assignment_id, create_datetime) 列表
+    """
+    at = at or timezone.now()
+    grouped = defaultdict(lambda: [0, 0])
+    for port, created in rows:
+        latency = max(0, int((at - created).total_seconds())) if created else 0
+        slot = grouped[(port or '', latency_bucket(latency))]
+        slot[0] += 1
+        slot[1] += latency
+    for (port, _), (count, latency_sum) in grouped.items():
+        record_transition(target, port, latency_sum, at=at, count=count)
+
+
+def _approx_median(bucket_counts):
+    """由分桶计数估算中位数（取中位所在桶的上界）"""
+    total = sum(bucket_counts.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(bucket_counts):
+        seen += bucket_counts[bucket]
+        if seen * 2 >= total:
+            return bucket_upper_seconds(bucket)
+    return None
+
+
+def dashboard_data(hours=48, days=14):
+    """看板数据，只读汇总表"""
+    now = timezone.now()
+    hour_since = _truncate_hour(now) - timedelta(hours=hours - 1)
+    day_since = _truncate_hour(now).replace(hour=0) - timedelta(days=days - 1)
+    stats = WebPipelineStatHourly.objects
+
+    failed_per_hour = list(
+        stats.filter(status=WebUserAssignments.Status.FAILED, hour__gte=hour_since)
+        .values('hour').annotate(total=Sum('count')).order_by('-hour')
+    )
+
+    submitted_per_hour = {
+        row['hour']: row['total'] for row in
+        stats.filter(status=WebUserAssignments.Status.SUBMITTED, hour__gte=hour_since)
+        .values('hour').annotate(total=Sum('count'))
+    }
+    for row in failed_per_hour:
+        row['submitted'] = submitted_per_hour.get(row['hour'], 0)
+
+    # 提交 -> 下载完成耗时（按天）
+    download_rows = (
+        stats.filter(status=WebUserAssignments.Status.DOWNLOADED, hour__gte=day_since)
+        .annotate(day=TruncDate('hour'))
+        .values('day', 'latency_bucket')
+        .annotate(total=Sum('count'), latency_sum=Sum('latency_sum_seconds'))
+    )
+    per_day = defaultdict(lambda: {'buckets': defaultdict(int), 'count': 0, 'latency_sum': 0})
+    for row in download_rows:
+        day = per_day[row['day']]
+        day['buckets'][row['latency_bucket']] += row['total']
+        day['count'] += row['total']
+        day['latency_sum'] += row['latency_sum']
+    download_latency = [
+        {
+            'day': day,
+            'count': data['count'],
+            'median_seconds': _approx_median(data['buckets']),
+            'mean_seconds': round(data['latency_sum'] / data['count']) if data['count'] else None,
+        }
+        for day, data in sorted(per_day.items(), reverse=True)
+    ]
+
+    # 每个端口每天成功上传数（转换到 ANALYSING 时带端口）
+    uploads_per_port = list(
+        stats.filter(status=WebUserAssignments.Status.ANALYSING, hour__gte=day_since)
+        .annotate(day=TruncDate('hour'))
+        .values('day', 'port').annotate(total=Sum('count')).order_by('-day', 'port')
+    )
+
+    return {
+        'failed_per_hour': failed_per_hour,
+        'download_latency': download_latency,
+        'uploads_per_port': uploads_per_port,
+        'hours': hours,
+        'days': days,
+    }
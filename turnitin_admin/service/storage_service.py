@@ -0,0 +1,136 @@
+# turnitin_admin/service/storage_service.py
+"""
+论文 / 报告存储布局（路径均相对 MEDIA_ROOT）
+- 论文按内容寻址：papers/<hash[0:2]>/<hash[2:4]>/<sha256><ext>，相同内容只存一份
+- 报告按作业 id：reports/<id % 256 十六进制>/<id>_ai.pdf、<id>_plagiarism.pdf
+每个作业的文件位置和大小记录在 WebStoredFile，查找不需要扫描目录；
+旧布局（<user_id>/<标题><ext>，报告在旁边）的作业没有清单记录时按旧规则查找，
+可用 migrate_storage_layout 命令迁移
+"""
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from api.models import WebStoredFile
+
+logger = logging.getLogger(__name__)
+
+Kind = WebStoredFile.Kind
+
+PAPERS_DIR = 'papers'
+REPORTS_DIR = 'reports'
+INCOMING_DIR = os.path.join(PAPERS_DIR, 'incoming')
+
+REPORT_SUFFIXES = {
+    Kind.AI_REPORT: '_ai.pdf',
+    Kind.PLAGIARISM_REPORT: '_plagiarism.pdf',
+}
+
+# download_file 的 type 参数 -> 文件种类
+DOWNLOAD_KINDS = {
+    'ai': Kind.AI_REPORT,
+    'report': Kind.PLAGIARISM_REPORT,
+}
+
+
+def paper_path(content_hash, ext):
+    return os.path.join(PAPERS_DIR, content_hash[:2], content_hash[2:4], f"{content_hash}{ext}")
+
+
+def report_path(job_id, kind):
+    return os.path.join(REPORTS_DIR, f"{int(job_id) % 256:02x}", f"{job_id}{REPORT_SUFFIXES[kind]}")
+
+
+def legacy_path(filepath, kind):
+    """旧布局：报告与论文同目录，<论文名>_ai.pdf / <论文名>_plagiarism.pdf"""
+    if kind == Kind.PAPER:
+        return filepath
+    base_path = Path(filepath)
+    return str(base_path.with_name(base_path.stem + REPORT_SUFFIXES[kind]))
+
+
+def incoming_path(ext):
+    """上传时先写入临时路径，写完得到哈希后再移到内容寻址路径"""
+    return os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}{ext}")
+
+
+def _move(src, dst):
+    os.makedirs(os.path.dirname(default_storage.path(dst)), exist_ok=True)
+    os.replace(default_storage.path(src), default_storage.path(dst))
+
+
+def copy_file(src, dst):
+    """复制到新布局（旧文件可能被多个作业引用，迁移时不直接移动）"""
+    os.makedirs(os.path.dirname(default_storage.path(dst)), exist_ok=True)
+    shutil.copyfile(default_storage.path(src), default_storage.path(dst))
+
+
+def store_paper(incoming, content_hash, ext):
+    """
+    把临时文件移到内容寻址路径；相同内容已存在时丢弃临时文件。返回 (路径, 大小)
+    调用方应先在同一事务内登记清单记录再调用，避免与删除最后一个引用的作业并发时文件被删掉
+    """
+    path = paper_path(content_hash, ext)
+    if default_storage.exists(path):
+        default_storage.delete(incoming)
+    else:
+        _move(incoming, path)
+    return path, default_storage.size(path)
+
+
+def save_report(job_id, kind, content):
+    """写入报告文件并登记，返回路径"""
+    path = report_path(job_id, kind)
+    os.makedirs(os.path.dirname(default_storage.path(path)), exist_ok=True)
+    with default_storage.open(path, 'wb') as destination:
+        destination.write(content)
+    record_file(job_id, kind, path, len(content))
+    return path
+
+
+def record_file(job_id, kind, path, size, content_hash=None):
+    WebStoredFile.objects.update_or_create(
+        job_id=job_id, kind=kind, defaults={'path': path, 'size': size, 'content_hash': content_hash})
+
+
+def share_file(job_id, kind, path):
+    """新作业引用已有文件（报告复用），不复制"""
+    record_file(job_id, kind, path, default_storage.size(path))
+
+
+def file_path(job, kind):
+    """作业文件路径：优先查清单，未迁移的作业按旧布局推算"""
+    path = WebStoredFile.objects.filter(job_id=job.id, kind=kind).values_list('path', flat=True).first()
+    if path:
+        return path
+    return legacy_path(job.filepath, kind) if job.filepath else None
+
+
+def delete_job_files(job):
+    """
+    删除作业的论文和报告；共用的文件在最后一个引用删除时才删除
+    引用检查和删除文件都在持有清单行锁的事务内完成：锁住引用这些路径的所有清单行（InnoDB 同时锁住路径索引的间隙），
+    并发上传登记同一路径时会等本事务结束，之后由上传重新放置文件（见 upload_file）
+    """
+    with transaction.atomic():
+        rows = list(WebStoredFile.objects.select_for_update().filter(job_id=job.id))
+        if not rows:
+            # 未迁移的旧作业：只删除论文（与旧逻辑一致）
+            if job.filepath and default_storage.exists(job.filepath):
+                default_storage.delete(job.filepath)
+            return
+        paths = {row.path for row in rows}
+        still_used = set(
+            WebStoredFile.objects.select_for_update().filter(path__in=paths).exclude(job_id=job.id)
+            .values_list('path', flat=True)
+        )
+        WebStoredFile.objects.filter(job_id=job.id).delete()
+        for path in paths - still_used:
+            if default_storage.exists(path):
+                default_storage.delete(path)
+    logger.debug("作业 %s 文件已删除，保留共用文件 %s 个", job.id, len(still_used))
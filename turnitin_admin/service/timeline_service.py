@@ -0,0 +1,103 @@
+# turnitin_admin/service/timeline_service.py
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from api.models import WebAssignmentTimeline
+
+logger = logging.getLogger(__name__)
+
+# 流水线阶段，按先后顺序；对应 WebAssignmentTimeline 的 <stage>_at 列
+STAGES = (
+    'stored',
+    'picked_up',
+    'uploaded',
+    'uuid_received',
+    'metadata_ready',
+    'confirmed',
+    'oid_found',
+    'ai_job_created',
+    'ai_ready',
+    'similarity_ready',
+    'saved',
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def record_stage(job_id, stage, at=None):
+    """
+    记录作业第一次到达某阶段的时间，已记录过的不覆盖（重试、轮询时会重复调用）
+    时间线只用于统计，写入失败不影响业务流程
+    """
+    if not job_id:
+        return
+    if stage not in STAGES:
+        raise ValueError(f"未知阶段: {stage}")
+    field = f'{stage}_at'
+    at = at or timezone.now()
+    try:
+        updated = WebAssignmentTimeline.objects.filter(job_id=job_id, **{f'{field}__isnull': True}).update(**{field: at})
+        if not updated and stage == STAGES[0]:
+            with transaction.atomic():
+                WebAssignmentTimeline.objects.create(job_id=job_id, **{field: at})
+    except IntegrityError:
+        pass  # 时间线已存在，保留第一次的时间
+    except Exception as e:
+        logger.warning("记录作业时间线失败: job=%s stage=%s 错误: %s", job_id, stage, e)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def stage_percentiles(days=7, limit=20000):
+    """
+    各阶段耗时分位数（秒）
+    每个阶段的耗时 = 该阶段时间 - 前一个已记录阶段的时间（跳过 AI 报告的作业没有 AI 阶段）
+    """
+    since = timezone.now() - timedelta(days=days)
+    fields = [f'{stage}_at' for stage in STAGES]
+    rows = list(
+        WebAssignmentTimeline.objects.filter(stored_at__gte=since)
+        .order_by('-stored_at').values_list(*fields)[:limit]
+    )
+
+    durations = {stage: [] for stage in STAGES[1:]}
+    totals = []
+    for row in rows:
+        previous = row[0]
+        for stage, value in zip(STAGES[1:], row[1:]):
+            if value is None or previous is None:
+                continue
+            durations[stage].append(max(0.0, (value - previous).total_seconds()))
+            previous = value
+        if row[0] and row[-1]:
+            totals.append((row[-1] - row[0]).total_seconds())
+
+    def summarize(name, values):
+        values.sort()
+        return {
+            'stage': name,
+            'count': len(values),
+            'percentiles': [_percentile(values, pct) for pct in PERCENTILES],
+            'max': values[-1] if values else None,
+        }
+
+    stages = [summarize(stage, durations[stage]) for stage in STAGES[1:]]
+    # 中位耗时最长的阶段即瓶颈
+    measured = [row for row in stages if row['count']]
+    bottleneck = max(measured, key=lambda row: row['percentiles'][0])['stage'] if measured else None
+    return {
+        'stages': stages,
+        'total': summarize('total', totals),
+        'bottleneck': bottleneck,
+        'percentile_labels': [f'p{pct}' for pct in PERCENTILES],
+        'days': days,
+        'sample_size': len(rows),
+    }
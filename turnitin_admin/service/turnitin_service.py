@@ -3,12 +3,15 @@ import requests
 from bs4 import BeautifulSoup
 import re
 import time
-import json
 from django.conf import settings
 from django.db import transaction
 
 from api.models import WebTurnitinClass, WebAssignments, WebUserAssignments
 from .turnitin_web_constants import TurnitinWebConstants
+from .http_session import TurnitinSession
+from .circuit_breaker import CircuitOpenError
+from .timeline_service import record_stage
+from ..logging_utils import LazyJson
 from django.db.models import F
 from asgiref.sync import sync_to_async, async_to_sync
 from ..settings import DEBUG
@@ -17,7 +20,7 @@ logger = logging.getLogger(__name__)
 
 class TurnitinService:
     def __init__(self):
-        self.session = requests.Session()
+        self.session = TurnitinSession()
         self.session.headers.update({
             'User-Agent': TurnitinWebConstants.USER_AGENT,
             'Accept': TurnitinWebConstants.ACCEPT_HTML
@@ -39,7 +42,7 @@ class TurnitinService:
         
         try:
             response = self.session.get(
-                'http://localhost:8081/admin/api/turnitin/cookie',
+                TurnitinWebConstants.COOKIE_URL,
                 headers={
                     'User-Agent': TurnitinWebConstants.USER_AGENT,
                     'Accept': TurnitinWebConstants.ACCEPT_TEXT
@@ -50,10 +53,12 @@ class TurnitinService:
             cookie_str = response.text.strip()
             if not cookie_str or 'session-id' not in cookie_str or 'legacy-session-id' not in cookie_str:
                 raise ValueError("无效的 Cookie 格式")
-            logger.info(f"成功获取 Cookie: {cookie_str[:50]}...")
+            logger.info("成功获取 Cookie: %s...", cookie_str[:50])
             return cookie_str
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            logger.error(f"获取 Cookie 失败: {str(e)}")
+            logger.error("获取 Cookie 失败: %s", e)
             raise IOError(f"获取 Cookie 失败: {str(e)}")
 
     def get_classes(self):
@@ -65,17 +70,17 @@ class TurnitinService:
             classes = soup.select('td.class_name a')
             return [{
                 'title': elem.text.strip(),
-                'url': f"https://www.turnitin.com{elem['href']}"
+                'url': f"{TurnitinWebConstants.WWW_BASE}{elem['href']}"
             } for elem in classes if elem.text.strip() == self.class_name]
         except requests.RequestException as e:
-            logger.error(f"获取课程失败: {str(e)}")
+            logger.error("获取课程失败: %s", e)
             raise IOError(f"获取课程失败: HTTP {getattr(e.response, 'status_code', '未知')}")
 
     def get_assignments(self, class_url):
         """获取作业列表"""
         try:
             class_id = re.search(r'/class/(\d+)/', class_url).group(1)
-            detail_url = f"https://www.turnitin.com/class/{class_id}/instructor_home?lang=en_us"
+            detail_url = TurnitinWebConstants.INSTRUCTOR_HOME_URL_TEMPLATE % class_id
             response = self.session.get(detail_url, headers={'Cookie': self.cookies}, timeout=600)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -86,18 +91,23 @@ class TurnitinService:
             if not online_ports:
                 raise ValueError("未找到有效作业端口")
             
-            local_ports = list(WebAssignments.objects.filter(status=WebAssignments.Status.AVAILABLE)
-                             .values_list('assignment_id', flat=True))
+            # 一次查询取出所有端口，新端口批量创建（并发创建的重复端口忽略后重新读取）
+            local_assigns = {assign.assignment_id: assign
+                             for assign in WebAssignments.objects.filter(assignment_id__in=online_ports)}
+            new_ports = [port for port in online_ports if port not in local_assigns]
+            if new_ports:
+                WebAssignments.objects.bulk_create([
+                    WebAssignments(assignment_id=port, status=WebAssignments.Status.AVAILABLE, upload_count=0)
+                    for port in new_ports
+                ], ignore_conflicts=True)
+                local_assigns.update({assign.assignment_id: assign
+                                      for assign in WebAssignments.objects.filter(assignment_id__in=new_ports)})
             result = []
             for port in online_ports:
-                if port not in local_ports:
-                    assign = WebAssignments.objects.create(
-                        assignment_id=port,
-                        status=WebAssignments.Status.AVAILABLE,
-                        upload_count=0
-                    )
-                else:
-                    assign = WebAssignments.objects.get(assignment_id=port)
+                assign = local_assigns[port]
+                if assign.status != WebAssignments.Status.AVAILABLE:
+                    # 已删除的端口不再使用（原逻辑会因唯一约束创建失败）
+                    continue
                 result.append({
                     'aid': assign.assignment_id,
                     'title': f"Assignment {assign.assignment_id}",
@@ -105,8 +115,10 @@ class TurnitinService:
                     'upload_count': assign.upload_count
                 })
             return result
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            logger.error(f"获取作业失败: {str(e)}")
+            logger.error("获取作业失败: %s", e)
             raise IOError(f"获取作业失败: {str(e)}")
 
     def submit(self, assignment_ids, title, filename, userfile, open_id, assign_id_in_db, last_assignment_id):
@@ -133,6 +145,7 @@ class TurnitinService:
                 'Cookie': self.cookies,
                 'Referer': f"{TurnitinWebConstants.SUBMIT_URL}?aid={assignment_id}&lang={TurnitinWebConstants.LANG_EN_US}"
             }, timeout=120)
+            record_stage(assign_id_in_db, 'uploaded')
             
             if response.status_code == 302:
                 redirect_url = response.headers.get('Location')
@@ -146,15 +159,20 @@ class TurnitinService:
                 raise ValueError("未找到 UUID")
             
             uuid = uuid_match.group(1)
+            record_stage(assign_id_in_db, 'uuid_received')
             metadata = self.wait_for_metadata(uuid)
+            record_stage(assign_id_in_db, 'metadata_ready')
             self.confirm_submission(uuid)
+            record_stage(assign_id_in_db, 'confirmed')
             
             filename_uploaded = self._get_oid_from_assignment(assignment_id)['filename']
             if not filename_uploaded or filename_uploaded[0:10] not in filename:
-                logger.error(f'端口文件：{filename_uploaded}, 上传文件:{filename}')
+                logger.error('端口文件：%s, 上传文件:%s', filename_uploaded, filename)
                 raise RuntimeError('端口没有上传成功!')
             assign = WebAssignments.objects.get(assignment_id=assignment_id)
             WebAssignments.objects.filter(pk=assign.pk).update(upload_count=F('upload_count') + 1)
+        except CircuitOpenError:
+            raise
         except Exception as e:
             raise RuntimeError("尝试使用端口:%s" % assignment_id)
         return {'metadata': {'assignment_id': assignment_id}}
@@ -193,43 +211,44 @@ class TurnitinService:
                 return cookie[len(TurnitinWebConstants.SESSION_ID + '='):]
         raise ValueError("未找到 session-id")
 
-    def download_ai_file(self, assignment_id, filename):
-        """下载 AI 报告"""
+    def download_ai_file(self, assignment_id, filename, job_id=None):
+        """下载 AI 报告，job_id 为数据库作业 id，用于记录时间线"""
         try:
             # Step 1: Get OID
             oid = self._get_oid_from_assignment(assignment_id)['oid']
-            print('^'*100, oid)
+            record_stage(job_id, 'oid_found')
             
             # Step 2: Extract submission TRN and token
             submission_trn = self._extract_submission_trn(oid)
-            print('@'*100, submission_trn)
             
             # Step 3: Get session data
             session_data = self._get_session_data(submission_trn, assignment_id, oid)
-            print('&'*100, session_data)
             
             # Step 4: Generate AI report
             job_response = self._generate_ai_report(submission_trn, session_data, filename, assignment_id, oid)
-            print('!'*100, job_response)
             
             # Step 5: Get job ID
-            job_id = job_response.get('id')
-            if not job_id:
-                logger.error(f"Failed to get job ID for assignment {assignment_id}")
+            sas_job_id = job_response.get('id')
+            if not sas_job_id:
+                logger.error("Failed to get job ID for assignment %s", assignment_id)
                 return None
+            record_stage(job_id, 'ai_job_created')
             
             # Step 6: Wait for PDF report
-            pdf_url = self._wait_for_ai_report(job_id, session_data['session_token'])
+            pdf_url = self._wait_for_ai_report(sas_job_id, session_data['session_token'])
             if not pdf_url:
-                logger.error(f"PDF report generation timed out or failed for assignment {assignment_id}")
+                logger.error("PDF report generation timed out or failed for assignment %s", assignment_id)
                 return None
+            record_stage(job_id, 'ai_ready')
             
             # Step 7: Download PDF
             pdf_content = self._download_pdf_file(pdf_url, self.get_cookies())
             return pdf_content
         
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            logger.error(f"Error downloading AI report for assignment {assignment_id}: {str(e)}", exc_info=True)
+            logger.error("Error downloading AI report for assignment %s: %s", assignment_id, e, exc_info=True)
             return None
 
     def _get_oid_from_assignment(self, assignment_id):
@@ -240,56 +259,56 @@ class TurnitinService:
         class_url = classes[0]['url']
         self.get_assignments(class_url)
         
-        url = f"https://www.turnitin.com/assignment/type/paper/inbox/{assignment_id}?lang={TurnitinWebConstants.LANG_EN_US}"
+        url = TurnitinWebConstants.INBOX_URL_TEMPLATE % assignment_id
         response = self.session.get(url, headers={'Cookie': self.cookies}, timeout=600)
         
         if "Log in to Turnitin" in response.text:
-            logger.error(f"认证失败 - 被重定向到登录页面 for assignment {assignment_id}")
+            logger.error("认证失败 - 被重定向到登录页面 for assignment %s", assignment_id)
             raise ValueError("认证失败，请检查 Cookie")
         
         soup = BeautifulSoup(response.text, 'html.parser')
         inbox_table = soup.select_one("table.inbox_table")
         if not inbox_table:
-            logger.error(f"未找到 inbox_table for assignment {assignment_id}")
+            logger.error("未找到 inbox_table for assignment %s", assignment_id)
             raise ValueError(f"未找到收件箱表格，可能无提交记录或页面结构变化")
         
         row = inbox_table.select_one(f"tr.student-{TurnitinWebConstants.DEFAULT_USER_ID}")
         if not row:
-            logger.error(f"未找到提交行 for assignment {assignment_id} with user ID {TurnitinWebConstants.DEFAULT_USER_ID}")
+            logger.error("未找到提交行 for assignment %s with user ID %s", assignment_id, TurnitinWebConstants.DEFAULT_USER_ID)
             raise ValueError(f"未找到提交行，检查用户 ID 或提交记录")
         
         checkbox = row.select_one("input[name=object_checkbox]")
         if not checkbox:
-            logger.error(f"未找到 OID checkbox for assignment {assignment_id}")
+            logger.error("未找到 OID checkbox for assignment %s", assignment_id)
             raise ValueError(f"未找到 OID 元素，可能页面结构变化")
         
         oid = checkbox.get('value')
         if not oid:
-            logger.error(f"OID 为空 for assignment {assignment_id}")
+            logger.error("OID 为空 for assignment %s", assignment_id)
             raise ValueError(f"OID 为空")
         
-        logger.info(f"成功获取 OID: {oid} for assignment {assignment_id}")
+        logger.info("成功获取 OID: %s for assignment %s", oid, assignment_id)
         return {'oid': oid, 'filename':checkbox.get('title')}
 
     def _extract_submission_trn(self, oid):
         """提取 submission TRN 和 token"""
-        trn_url = f"https://ev.turnitin.com/paper/{oid}/sws_launch_token?lang=en_us&cv=1&output=json"
+        trn_url = TurnitinWebConstants.SWS_LAUNCH_TOKEN_URL_TEMPLATE % oid
         response = self.session.get(trn_url, headers={'Cookie': self.cookies}, timeout=600)
         response.raise_for_status()
         data = response.json()
-        logger.debug(f"Submission TRN response: {data}")
+        logger.debug("Submission TRN response: %s", data)
         submissions = data.get('payload', {}).get('config', {}).get('submissions', {})
         for key in submissions.keys():
             if key.startswith('oid:1:'):
                 trn = key.split('oid:1:')[1]
                 token = data.get('token')
-                logger.debug(f"-----------------------------------Extracted TRN: {trn}, Token: {token}")
+                logger.debug("-----------------------------------Extracted TRN: %s, Token: %s", trn, token)
                 return {'trn': trn, 'token': token}
         raise RuntimeError("无法提取 submission-trn")
 
     def _get_session_data(self, submission_trn, assignment_id, oid):
         """获取 session 数据"""
-        session_url = f"https://ev.turnitin.com/assignment/{assignment_id}/session_token?lang=en_us&cv=1&output=json&o={oid}"
+        session_url = TurnitinWebConstants.SESSION_TOKEN_URL_TEMPLATE % (assignment_id, oid)
         response = self.session.get(session_url, headers={
             'Authorization': f"Bearer {submission_trn['token']}",
             'Cookie': self.cookies
@@ -301,10 +320,10 @@ class TurnitinService:
 
     def _generate_ai_report(self, submission_trn, session_data, filename, assignment_id, oid):
         """生成 AI 报告并返回 job ID"""
-        sas_api_url = "https://sas-api-usw2.sas.turnitin.com/job"
+        sas_api_url = TurnitinWebConstants.SAS_JOB_URL
         submission_trn_value = f"trn:oid:::1:{submission_trn['trn']}"
-        logger.debug(f"Submission TRN: {submission_trn_value}")
-        logger.debug(f"Session token: {session_data['session_token']}")
+        logger.debug("Submission TRN: %s", submission_trn_value)
+        logger.debug("Session token: %s", session_data['session_token'])
         
         request_body = {
             "conversion": "SUBMISSION_REPORT_PDF",
@@ -340,16 +359,16 @@ class TurnitinService:
             'Content-Type': 'application/json',
             'authentication': session_data['session_token']
         }
-        logger.debug(f"Request body: {json.dumps(request_body, indent=2)}")
+        logger.debug("Request body: %s", LazyJson(request_body, indent=2))
         
         for attempt in range(3):
             response = self.session.post(sas_api_url, json=request_body, headers=headers, timeout=30)
-            logger.debug(f"Response: {response.status_code} - {response.text}")
+            logger.debug("Response: %s - %s", response.status_code, response.text)
             
             if response.status_code in [200, 201]:
                 return {"id": response.text.strip()}
             elif response.status_code == 401:
-                logger.warning(f"Attempt {attempt + 1} failed with 401, retrying with new session token...")
+                logger.warning("Attempt %s failed with 401, retrying with new session token...", attempt + 1)
                 session_data = self._get_session_data(submission_trn, assignment_id, oid)
                 request_body["config"]["sessionToken"] = session_data["session_token"]
                 request_body["extensions"][0]["config"]["sessionToken"] = session_data["session_token"]
@@ -361,7 +380,7 @@ class TurnitinService:
 
     def _wait_for_ai_report(self, job_id, session_token):
         """等待 AI 报告生成"""
-        sas_api_url = f"https://sas-api-usw2.sas.turnitin.com/job/{job_id}"
+        sas_api_url = f"{TurnitinWebConstants.SAS_JOB_URL}/{job_id}"
         for _ in range(30):
             response = self.session.get(sas_api_url, headers={
                 'Content-Type': 'application/json',
@@ -384,10 +403,12 @@ class TurnitinService:
         response.raise_for_status()
         return response.content
 
-    def download_plagiarism_file(self, assignment_id, user_id):
-        """下载重复率文件"""
+    def download_plagiarism_file(self, assignment_id, user_id, job_id=None):
+        """下载重复率文件，job_id 为数据库作业 id，用于记录时间线"""
         oid = self._get_oid_from_assignment(assignment_id)['oid']
+        record_stage(job_id, 'oid_found')
         download_url = self._get_download_url(assignment_id, oid, f"{assignment_id}_plagiarism.pdf", False, "nonAi", "N", "N")
+        record_stage(job_id, 'similarity_ready')
         return self._download_file(download_url)
 
     def _get_download_url(self, assignment_id, oid, filename, pdf, pdf_type, filter_reference, filter_quote):
@@ -1,14 +1,30 @@
 # turnitin_web_constants.py
+import os
+
+# 设置后所有 Turnitin 请求都发往本地替身服务（见 turnitin_admin/bench/turnitin_standin.py），用于离线压测
+STANDIN_URL = os.environ.get('TURNITIN_STANDIN_URL', '').rstrip('/')
+
+
 class TurnitinWebConstants:
+    # Base URLs
+    WWW_BASE = STANDIN_URL or "https://www.turnitin.com"
+    EV_BASE = STANDIN_URL or "https://ev.turnitin.com"
+    SAS_BASE = STANDIN_URL or "https://sas-api-usw2.sas.turnitin.com"
+    COOKIE_URL = f"{STANDIN_URL or 'http://localhost:8081'}/admin/api/turnitin/cookie"
+
     # URLs
-    LOGIN_URL = "https://www.turnitin.com/login_page.asp?lang=en_us"
-    HOMEPAGE = "https://www.turnitin.com/t_home.asp"
-    SUBMIT_URL = "https://www.turnitin.com/t_submit.asp"
-    CONFIRM_URL = "https://www.turnitin.com/submit_confirm.asp"
-    METADATA_URL = "https://www.turnitin.com/panda/get_submission_metadata.asp"
-    INBOX_URL_TEMPLATE = "https://www.turnitin.com/assignment/type/paper/inbox/%s?lang=en_us"
-    DOWNLOAD_URL = "https://ev.turnitin.com/app/carta/en_us/?ro=103&lang=en_us&s=1&u=1176178090&o="
-    SET_FILTER_URL = "https://ev.turnitin.com/paper/%s/similarity/options?lang=en_us&cv=1&output=json&tl=0"
+    LOGIN_URL = f"{WWW_BASE}/login_page.asp?lang=en_us"
+    HOMEPAGE = f"{WWW_BASE}/t_home.asp"
+    SUBMIT_URL = f"{WWW_BASE}/t_submit.asp"
+    CONFIRM_URL = f"{WWW_BASE}/submit_confirm.asp"
+    METADATA_URL = f"{WWW_BASE}/panda/get_submission_metadata.asp"
+    INSTRUCTOR_HOME_URL_TEMPLATE = WWW_BASE + "/class/%s/instructor_home?lang=en_us"
+    INBOX_URL_TEMPLATE = WWW_BASE + "/assignment/type/paper/inbox/%s?lang=en_us"
+    DOWNLOAD_URL = f"{EV_BASE}/app/carta/en_us/?ro=103&lang=en_us&s=1&u=1176178090&o="
+    SET_FILTER_URL = EV_BASE + "/paper/%s/similarity/options?lang=en_us&cv=1&output=json&tl=0"
+    SWS_LAUNCH_TOKEN_URL_TEMPLATE = EV_BASE + "/paper/%s/sws_launch_token?lang=en_us&cv=1&output=json"
+    SESSION_TOKEN_URL_TEMPLATE = EV_BASE + "/assignment/%s/session_token?lang=en_us&cv=1&output=json&o=%s"
+    SAS_JOB_URL = f"{SAS_BASE}/job"
     
     # Headers
     USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124"
@@ -16,7 +32,7 @@ class TurnitinWebConstants:
     ACCEPT_JSON = "application/json, text/javascript, */*; q=0.01"
     ACCEPT_TEXT = 'text/plain'
     CONTENT_TYPE_FORM = "application/x-www-form-urlencoded"
-    ACQUIRE_DOWNLOAD_URL_LINK = "https://ev.turnitin.com/paper/%s/queue_pdf?lang=en_us&cv=1&output=json"
+    ACQUIRE_DOWNLOAD_URL_LINK = EV_BASE + "/paper/%s/queue_pdf?lang=en_us&cv=1&output=json"
 
     # Cookie related
     LEGACY_SESSION_ID = "legacy-session-id"
@@ -38,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'turnitin_admin.middleware.exception_handler.GlobalExceptionMiddleware',
+    'turnitin_admin.middleware.profiling.SamplingProfilerMiddleware',  # 未开启 PROFILING['requests'] 时不加载
 ]
 
 ROOT_URLCONF = 'turnitin_admin.urls'
@@ -69,6 +70,7 @@ TEMPLATES = [
     },
 ]
 
+# 日志经内存队列交给后台线程写出，每条一行 JSON（见 turnitin_admin/logging_utils.py）
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -78,38 +80,60 @@ LOGGING = {
             'style': '{',
         },
     },
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+    'filters': {
+        # 上游交互的 DEBUG 日志量很大，只保留 5%
+        'sample_debug': {
+            '()': 'turnitin_admin.logging_utils.SamplingFilter',
+            'rate': 0.05,
         },
-        'file': {
-            'level': 'DEBUG',  # 降低日志级别以捕获更多信息
-            'class': 'logging.FileHandler',
+    },
+    'handlers': {
+        'queue': {
+            'class': 'turnitin_admin.logging_utils.AsyncQueueHandler',
             'filename': 'django_errors.log',
-            'formatter': 'verbose',
+            'console': True,
+            'queue_size': 10000,
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
-        'level': 'DEBUG',
+        'handlers': ['queue'],
+        'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'turnitin_admin': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
+        'turnitin_admin.service.turnitin_service': {
+            'filters': ['sample_debug'],
+        },
     },
 }
 
 WSGI_APPLICATION = 'turnitin_admin.wsgi.application'
 
+REST_FRAMEWORK = {
+    # 游标分页，单页最多 500 条（见 api/pagination.py）
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.IdCursorPagination',
+    'PAGE_SIZE': 50,
+    # 安装 orjson 时使用更快的 JSON 渲染/解析（见 api/renderers.py）
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
 # Database
 DATABASES = {
     'default': {
@@ -177,4 +201,84 @@ TIME_ZONE = 'Asia/Shanghai'  # 匹配 HKT
 USE_TZ = False
 
 REDIS_HOST = 'localhost'  
-REDIS_PORT = 6379       
+REDIS_PORT = 6379
+
+# 相同内容论文复用报告的时间窗口（分钟），0 表示关闭去重
+DEDUP_WINDOW_MINUTES = 24 * 60
+
+# 作业从提交到被 failed_task 判定失败（并退还次数）的时限（分钟）
+FAILED_TASK_TIMEOUT_MINUTES = 15
+
+# 上传准入控制
+ADMISSION_THROUGHPUT_WINDOW_MINUTES = 30  # 吞吐量统计窗口
+ADMISSION_DEFAULT_THROUGHPUT_PER_MINUTE = 1.0  # 吞吐量下限（篇/分钟）
+ADMISSION_DEADLINE_SAFETY = 0.8  # 预计完成时间不超过时限的 80%
+
+# 后台列表：表行数超过该值且无过滤条件时使用估算行数（见 api/pagination.py）
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# 已结束作业（已下载/失败/删除）超过保留天数后移入归档表
+# 多个归档任务并发时用 SKIP LOCKED 互相跳过（MySQL 8.0.1+），更旧的 MySQL 自动退回普通行锁
+ARCHIVE_RETENTION_DAYS = 90
+ARCHIVE_BATCH_SIZE = 1000
+
+# Turnitin 出站请求限流（见 turnitin_admin/service/rate_limiter.py），所有 worker 共享
+# families: 主机族 -> (每秒请求数, 突发容量)；account_rate: 同一账号所有主机族合计
+TURNITIN_RATE_LIMIT = {
+    'enabled': os.environ.get('TURNITIN_RATE_LIMIT_ENABLED', '1') == '1',
+    'account': os.environ.get('TURNITIN_ACCOUNT', 'default'),
+    'families': {
+        'www': (2.0, 5),
+        'ev': (2.0, 5),
+        'sas': (1.0, 3),
+    },
+    'account_rate': (4.0, 8),
+    'max_wait_seconds': 120,  # 超过后请求以 RateLimitTimeout 失败
+}
+
+# Turnitin 上游熔断（见 turnitin_admin/service/circuit_breaker.py），按主机族统计连续失败
+TURNITIN_CIRCUIT_BREAKER = {
+    'enabled': os.environ.get('TURNITIN_CIRCUIT_BREAKER_ENABLED', '1') == '1',
+    'failure_threshold': 5,  # 连续失败次数
+    'open_seconds': 60,  # 熔断持续时间，之后放行探测请求
+    'half_open_probes': 1,  # half_open 时同时放行的探测请求数
+}
+
+# 上传 / 下载 worker 自适应并发（AIMD，见 turnitin_admin/service/concurrency_limiter.py），所有 worker 共享上限
+# 作业的上游请求平均耗时不超过 target_latency_seconds 且失败率不超过 max_error_rate 时上限缓慢增加，否则按 decrease_factor 减少
+_CONCURRENCY_DEFAULTS = {
+    'min_limit': 1,
+    'max_limit': 8,  # 同时也是本进程线程池大小
+    'initial_limit': 2,
+    'target_latency_seconds': 5.0,
+    'max_error_rate': 0.1,
+    'decrease_factor': 0.7,
+    'decrease_cooldown_seconds': 30,  # 同一次拥塞只减少一次
+    'lease_seconds': 1800,  # 与作业锁时间一致，进程异常退出后租约自动回收
+    'dispatch_wait_seconds': 300,  # 单轮扫描等待租约的最长时间
+}
+TURNITIN_CONCURRENCY = {
+    'upload': dict(_CONCURRENCY_DEFAULTS),
+    'download': dict(_CONCURRENCY_DEFAULTS),
+}
+
+# /metrics 只允许这些地址访问（Prometheus 抓取端）
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# SQL 查询预算（见 turnitin_admin/query_budget.py）：默认超出时记日志，strict 时抛出异常
+QUERY_BUDGET = {
+    'enabled': os.environ.get('QUERY_BUDGET_ENABLED', '1') == '1',
+    'strict': os.environ.get('QUERY_BUDGET_STRICT') == '1',
+}
+
+# 采样性能分析（见 turnitin_admin/profiling.py），默认关闭，可用环境变量临时开启
+PROFILING = {
+    'requests': os.environ.get('PROFILE_REQUESTS') == '1',
+    'request_sample_rate': float(os.environ.get('PROFILE_REQUEST_SAMPLE_RATE', 0.01)),
+    'request_path_prefixes': [],  # 为空表示所有路径
+    'tasks': os.environ.get('PROFILE_TASKS') == '1',  # scan_reports / upload_to_turnitin_task / failed_task
+    'interval_ms': 5,
+    'min_duration_ms': 50,  # 太短的请求不写文件
+    'dir': os.path.join(BASE_DIR, 'profiles'),
+    'max_files': 200,
+}
@@ -0,0 +1,30 @@
+"""
+压测环境配置：DJANGO_SETTINGS_MODULE=turnitin_admin.settings_loadtest
+MySQL、Redis、媒体目录都指向本地独立实例，Turnitin 指向替身服务（run_turnitin_standin），
+避免压测数据写进正式环境
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, Q_CLUSTER
+
+if not os.environ.get('TURNITIN_STANDIN_URL'):
+    raise ImproperlyConfigured('压测环境必须设置 TURNITIN_STANDIN_URL')
+
+DATABASES['default'].update({
+    'NAME': os.environ.get('LOADTEST_DB_NAME', 'turniting_loadtest'),
+    'USER': os.environ.get('LOADTEST_DB_USER', 'root'),
+    'PASSWORD': os.environ.get('LOADTEST_DB_PASSWORD', ''),
+    'HOST': os.environ.get('LOADTEST_DB_HOST', '127.0.0.1'),
+    'PORT': os.environ.get('LOADTEST_DB_PORT', '3307'),
+})
+
+# 独立的 Redis 实例（各模块的 Redis 客户端固定使用 db 0，所以用端口区分）
+REDIS_HOST = os.environ.get('LOADTEST_REDIS_HOST', '127.0.0.1')
+REDIS_PORT = int(os.environ.get('LOADTEST_REDIS_PORT', 6380))
+Q_CLUSTER['redis'].update({'host': REDIS_HOST, 'port': REDIS_PORT})
+
+MEDIA_ROOT = os.environ.get('LOADTEST_MEDIA_ROOT', os.path.join(BASE_DIR, 'loadtest_media'))
+ALLOWED_HOSTS = ['localhost', '127.0.0.1']
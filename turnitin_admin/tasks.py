@@ -1,25 +1,41 @@
 from django.utils import timezone
-from api.models import WebUser, WebUserAssignments
+from api.models import WebUserAssignments, WebUserAssignmentsArchive, WebStoredFile
 from .service.turnitin_service import TurnitinService
-from django.db import transaction
+from .service.dedup_service import register_report
+from .service.storage_service import save_report
+from .service.credit_service import refund_for_failure
+from .service.admission_service import admission_controller, PENDING_STATUSES
+from .service import metrics
+from .service.timeline_service import record_stage
+from .service import circuit_breaker
+from .service.circuit_breaker import CircuitOpenError
+from .service.concurrency_limiter import AdaptiveConcurrencyLimiter
+from .service.http_session import track_upstream
+from .profiling import profile_task
+from .query_budget import query_budget, count_item
+from django.db import connection, transaction
 from asgiref.sync import async_to_sync
 from django.core.files.storage import default_storage
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from django.conf import settings
 from sqlalchemy import or_
-from django.db.models import Q
+from django.db.models import Q, Count
 
 import os
 import logging
 import redis
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-# 全局共享线程池
-MAX_WORKERS = 1  # 可根据服务器性能调整
-executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+# 等待并发租约的轮询间隔（秒）
+LEASE_POLL_SECONDS = 1
+
+# 各阶段依赖的上游主机族：熔断期间作业无法推进，这段时间不计入作业超时
+UPLOAD_FAMILIES = ['cookie', 'www']
+DOWNLOAD_FAMILIES = circuit_breaker.FAMILIES
 
 # Redis 客户端配置（需在 settings.py 中定义 REDIS_HOST 和 REDIS_PORT）
 redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
@@ -44,228 +60,367 @@ def release_lock(assignment_id):
     lock_key = f"lock:assignment:{assignment_id}"
     redis_client.delete(lock_key)
 
-def download_reports():
-    """Download AI and plagiarism reports for all assignments."""
-    if True: #with transaction.atomic():
-        assignments = WebUserAssignments.objects.filter(status=WebUserAssignments.Status.ANALYSING)
+def _deadline(create_time, timeout, intervals):
+    """作业超时时间点：创建时间 + 时限，再顺延作业创建以来的上游熔断时间"""
+    since = create_time.timestamp()
+    return create_time + timeout + timedelta(seconds=circuit_breaker.outage_overlap(intervals, since))
+
+@query_budget('update_queue_depth', max_queries=1)
+def update_queue_depth():
+    """按状态统计排队作业数，一条 GROUP BY 查询"""
+    counts = dict(
+        WebUserAssignments.objects.filter(status__in=PENDING_STATUSES)
+        .values_list('status').annotate(cnt=Count('id')).order_by()
+    )
+    for status in PENDING_STATUSES:
+        metrics.set_gauge('turnitin_queue_depth', {'status': status}, counts.get(status, 0))
+
+def _run_adaptive(pool, assignments, job):
+    """
+    按自适应并发上限（见 concurrency_limiter.py）把作业分发到线程池
+    每个作业结束后按其上游请求耗时 / 失败率调整上限；上游熔断时停止分发，剩余作业留给下一轮
+    """
+    limiter = AdaptiveConcurrencyLimiter(pool)
+    stop = threading.Event()
+    deadline = time.monotonic() + settings.TURNITIN_CONCURRENCY[pool]['dispatch_wait_seconds']
+
+    def run(assignment, lease):
+        try:
+            with track_upstream() as stats:
+                job(assignment)
+            limiter.observe(stats.requests, stats.seconds, stats.errors)
+        except CircuitOpenError:
+            stop.set()
+            limiter.backoff()
+        except Exception as e:
+            logger.error("%s 作业 %s 处理异常: %s", pool, assignment.id, e, exc_info=True)
+        finally:
+            limiter.release(lease)
+            # worker 线程复用，每个作业结束关闭本线程的数据库连接
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=limiter.max_limit, thread_name_prefix=f'{pool}-worker') as pool_executor:
         for assignment in assignments:
-            with transaction.atomic():
-                if WebUserAssignments.objects.filter(id=assignment.id) == WebUserAssignments.Status.FAILED:continue
-            try:
-                assignment_id = assignment.assignment_id
-                if not acquire_lock(assignment_id):
-                    logger.info(f"作业 {assignment_id} 已被其他进程锁定，跳过")
-                    continue
-
-                user_id = assignment.uid
-                title = assignment.title
-                storage_dir = os.path.dirname(assignment.filepath) if assignment.filepath else settings.MEDIA_ROOT
-
-                # 移除 UTC 转换
-                current_time = timezone.now()
-                create_time = assignment.create_datetime
-
-                time_diff = (current_time - create_time).total_seconds() / 60  # 分钟差
-                is_saved = False
-            
-
-                with transaction.atomic():
-                    if time_diff <= 10:
-                        # 在10分钟以内，尝试下载 AI 报告
-                        logger.info(f"作业 {assignment_id} 在10分钟内，尝试下载AI报告")
-                        turnitin_service = TurnitinService()
-                        async_to_sync(turnitin_service.initialize)()
-                        ai_content = turnitin_service.download_ai_file(
-                            assignment_id,
-                            assignment.filename.split("/")[-1]
-                        )
-
-                        if not ai_content:
-                            logger.info(f"作业 {assignment_id} AI报告下载失败或不存在，保持 ANALYSING 状态")
-                            release_lock(assignment_id)
-                            continue  # 10分钟内 AI 失败，不更改状态，等待下次任务
-
-                        # AI 下载成功，尝试下载重复率报告
-                        plagiarism_content = turnitin_service.download_plagiarism_file(assignment_id, user_id)
-
-                        ai_file_path = os.path.join(storage_dir, f"{title}_ai.pdf")
-                        plagiarism_file_path = os.path.join(storage_dir, f"{title}_plagiarism.pdf")
-                        full_ai_path = os.path.join(settings.MEDIA_ROOT, ai_file_path)
-                        full_plagiarism_path = os.path.join(settings.MEDIA_ROOT, plagiarism_file_path)
-
-                        # 保存 AI 报告
-                        if ai_content:
-                            with default_storage.open(ai_file_path, 'wb') as destination:
-                                os.makedirs(os.path.dirname(full_ai_path), exist_ok=True)
-                                destination.write(ai_content)
-                                destination.flush()
-                            logger.info(f"作业 {assignment_id} AI 报告已保存至 {ai_file_path}")
-
-                        # 保存重复率报告
-                        if plagiarism_content:
-                            with default_storage.open(plagiarism_file_path, 'wb') as destination:
-                                os.makedirs(os.path.dirname(full_plagiarism_path), exist_ok=True)
-                                destination.write(plagiarism_content)
-                                destination.flush()
-                            logger.info(f"作业 {assignment_id} 重复率报告已保存至 {plagiarism_file_path}")
-                        else:
-                            continue
-
-                        # AI 和重复率报告都成功，更新状态
-                        assignment.mark_downloaded()
-                        assignment.save()
-                        is_saved = True
-                        logger.info(f"作业 {assignment_id} AI和重复率报告下载完成，状态更新为 DOWNLOADED")
-
-                    else:
-                        # 超过10分钟，跳过 AI 报告，直接下载重复率报告
-                        logger.info(f"作业 {assignment_id} 超过10分钟，跳过AI下载，直接尝试下载重复率报告")
-                        turnitin_service = TurnitinService()
-                        async_to_sync(turnitin_service.initialize)()
-                        plagiarism_content = turnitin_service.download_plagiarism_file(assignment_id, user_id)
-
-                        if plagiarism_content:
-                            plagiarism_file_path = os.path.join(storage_dir, f"{title}_plagiarism.pdf")
-                            full_plagiarism_path = os.path.join(settings.MEDIA_ROOT, plagiarism_file_path)
-                            with default_storage.open(plagiarism_file_path, 'wb') as destination:
-                                os.makedirs(os.path.dirname(full_plagiarism_path), exist_ok=True)
-                                destination.write(plagiarism_content)
-                                destination.flush()
-                            logger.info(f"作业 {assignment_id} 重复率报告已保存至 {plagiarism_file_path}")
-                            assignment.mark_downloaded()
-                            assignment.save()
-                            is_saved = True
-                        else:
-                            logger.error(f"作业 {assignment_id} 重复率报告下载失败")
-                            raise RuntimeError('超过10分钟 没有重复率和AI')
-
-            except Exception as e:
-                error_context = {
-                    'assignment_id': assignment_id,
-                    'user_id': user_id,
-                    'storage_dir': storage_dir,
-                    'exception_type': type(e).__name__,
-                    'exception_message': str(e)
-                }
-                logger.error(
-                    f"后台下载任务失败: assignment_id={assignment_id}, user_id={user_id}, 错误: {str(e)}",
-                    exc_info=True,
-                    extra={'error_context': error_context}
+            lease = None
+            while lease is None and not stop.is_set() and time.monotonic() < deadline:
+                lease = limiter.try_acquire()
+                if lease is None:
+                    time.sleep(LEASE_POLL_SECONDS)
+            if lease is None:
+                logger.info("%s 任务停止分发，剩余作业留待下一轮", pool)
+                break
+            if stop.is_set():
+                limiter.release(lease)
+                logger.info("%s 任务停止分发，剩余作业留待下一轮", pool)
+                break
+            pool_executor.submit(run, assignment, lease)
+
+
+@query_budget('download_job', max_queries=40)
+def _download_one(assignment):
+    """下载单个作业的 AI 和重复率报告（在 worker 线程中执行）"""
+    with transaction.atomic():
+        if WebUserAssignments.objects.filter(id=assignment.id) == WebUserAssignments.Status.FAILED:return
+    in_flight = False
+    locked = False
+    try:
+        assignment_id = assignment.assignment_id
+        if not acquire_lock(assignment_id):
+            logger.info("作业 %s 已被其他进程锁定，跳过", assignment_id)
+            return
+        locked = True
+        metrics.inc_gauge('turnitin_worker_in_flight_jobs', {'pool': 'download'})
+        in_flight = True
+
+        user_id = assignment.uid
+
+        # 移除 UTC 转换
+        current_time = timezone.now()
+        create_time = assignment.timeout_start
+
+        time_diff = (current_time - create_time).total_seconds() / 60  # 分钟差
+        is_saved = False
+
+
+        with transaction.atomic():
+            if time_diff <= 10:
+                # 在10分钟以内，尝试下载 AI 报告
+                logger.info("作业 %s 在10分钟内，尝试下载AI报告", assignment_id)
+                turnitin_service = TurnitinService()
+                async_to_sync(turnitin_service.initialize)()
+                ai_content = turnitin_service.download_ai_file(
+                    assignment_id,
+                    assignment.filename.split("/")[-1],
+                    job_id=assignment.id
                 )
-            finally:
-                release_lock(assignment_id)
 
-def _upload_to_turnitin_task():
-    """异步任务：将文件上传到 Turnitin 并更新数据库"""
-    if True:#with transaction.atomic():
-        assignments = WebUserAssignments.objects.filter(status=WebUserAssignments.Status.SUBMITTED)
-        for assignment in assignments:
-            with transaction.atomic():
-                if WebUserAssignments.objects.filter(id=assignment.id) == WebUserAssignments.Status.FAILED:continue
-            try:
-                assignment_id = assignment.id  # 使用数据库主键 id 作为锁键
-                if not acquire_lock(assignment_id):
-                    logger.info(f"作业 {assignment_id} 已被其他进程锁定，跳过")
-                    continue
-
-                user_id = assignment.uid
-                cleaned_name = assignment.title
-                storage_path = assignment.filepath if assignment.filepath else ""
-
-                full_storage_path = os.path.join(settings.MEDIA_ROOT, storage_path) if storage_path else ""
-                logger.debug(f"Full storage path: {full_storage_path}")
-
-                # 移除 UTC 转换
-                current_time = timezone.now()
-                create_time = assignment.create_datetime
-                
-                if current_time - create_time > timedelta(minutes=10):
-                    release_lock(assignment_id)
-                    raise RuntimeError('timeout')
-                
-                if not storage_path or not default_storage.exists(full_storage_path):
-                    logger.error(f"作业 {assignment_id} 文件路径无效或文件不存在: {full_storage_path}")
+                if not ai_content:
+                    logger.info("作业 %s AI报告下载失败或不存在，保持 ANALYSING 状态", assignment_id)
                     release_lock(assignment_id)
-                    raise RuntimeError(f"作业 {assignment_id} 文件路径无效或文件不存在: {full_storage_path}")
+                    return  # 10分钟内 AI 失败，不更改状态，等待下次任务
+
+                # AI 下载成功，尝试下载重复率报告
+                plagiarism_content = turnitin_service.download_plagiarism_file(
+                    assignment_id, user_id, job_id=assignment.id)
 
-                    
+                if not plagiarism_content:
+                    return
 
-                is_saved = False
-                
+                # 报告按作业 id 分目录保存并登记到文件清单
+                ai_file_path = save_report(assignment.id, WebStoredFile.Kind.AI_REPORT, ai_content)
+                logger.info("作业 %s AI 报告已保存至 %s", assignment_id, ai_file_path)
+                plagiarism_file_path = save_report(assignment.id, WebStoredFile.Kind.PLAGIARISM_REPORT, plagiarism_content)
+                logger.info("作业 %s 重复率报告已保存至 %s", assignment_id, plagiarism_file_path)
+
+                # AI 和重复率报告都成功，更新状态
+                assignment.mark_downloaded()
+                assignment.save()
+                register_report(assignment, ai_file_path, plagiarism_file_path)
+                record_stage(assignment.id, 'saved')
+                admission_controller.record_completion(assignment.id)
+                is_saved = True
+                logger.info("作业 %s AI和重复率报告下载完成，状态更新为 DOWNLOADED", assignment_id)
+
+            else:
+                # 超过10分钟，跳过 AI 报告，直接下载重复率报告
+                logger.info("作业 %s 超过10分钟，跳过AI下载，直接尝试下载重复率报告", assignment_id)
                 turnitin_service = TurnitinService()
                 async_to_sync(turnitin_service.initialize)()
+                plagiarism_content = turnitin_service.download_plagiarism_file(
+                    assignment_id, user_id, job_id=assignment.id)
+
+                if plagiarism_content:
+                    plagiarism_file_path = save_report(
+                        assignment.id, WebStoredFile.Kind.PLAGIARISM_REPORT, plagiarism_content)
+                    logger.info("作业 %s 重复率报告已保存至 %s", assignment_id, plagiarism_file_path)
+                    assignment.mark_downloaded()
+                    assignment.save()
+                    register_report(assignment, None, plagiarism_file_path)
+                    record_stage(assignment.id, 'saved')
+                    admission_controller.record_completion(assignment.id)
+                    is_saved = True
+                else:
+                    logger.error("作业 %s 重复率报告下载失败", assignment_id)
+                    raise RuntimeError('超过10分钟 没有重复率和AI')
+
+    except CircuitOpenError as e:
+        # 上游熔断：本轮剩余作业都会直接失败，停止扫描，作业保持原状态等待下一轮
+        logger.warning("下载任务暂停: %s，作业 %s 延后处理", e, assignment_id)
+        raise
+    except Exception as e:
+        error_context = {
+            'assignment_id': assignment_id,
+            'user_id': user_id,
+            'job_id': assignment.id,
+            'exception_type': type(e).__name__,
+            'exception_message': str(e)
+        }
+        logger.error(
+            "后台下载任务失败: assignment_id=%s, user_id=%s, 错误: %s", assignment_id, user_id, e,
+            exc_info=True,
+            extra={'error_context': error_context}
+        )
+    finally:
+        # 没拿到锁时不能释放（锁属于其他 worker）
+        if locked:
+            release_lock(assignment_id)
+        if in_flight:
+            metrics.inc_gauge('turnitin_worker_in_flight_jobs', {'pool': 'download'}, -1)
+
+@query_budget('download_reports', max_queries=1)
+def download_reports():
+    """Download AI and plagiarism reports for all assignments."""
+    assignments = WebUserAssignments.objects.filter(status=WebUserAssignments.Status.ANALYSING)
+    _run_adaptive('download', assignments, _download_one)
 
-                with default_storage.open(storage_path, 'rb') as source_file:
-                    userfile_content = b''.join(source_file.chunks())
-
-                result = turnitin_service.submit(
-                    assignment_ids=[],
-                    title=cleaned_name,
-                    filename=storage_path,
-                    userfile=userfile_content,
-                    open_id=user_id,
-                    assign_id_in_db=assignment.id,
-                    last_assignment_id = '' if assignment.review == None else assignment.review
-                )
-
-                if 'assignment_id' in result.get('metadata', {}):
-                    with transaction.atomic():
-                        # 更新现有记录，而不是创建新记录
-                        assignment = WebUserAssignments.objects.get(id=assignment.id)
-                        assignment.assignment_id = result['metadata']['assignment_id']
-                        assignment.mark_analysising()
-                        assignment.save()
-                        is_saved = True
-                        logger.info(f"异步上传成功: user_id={user_id}, assignment_id={assignment.id}, turnitin_assignment_id={result['metadata']['assignment_id']}")
-
-            except Exception as e:
-                logger.error(
-                    f"异步上传失败: assignment_id={assignment_id}, user_id={user_id}, 错误: {str(e)}",
-                    exc_info=True
-                )
-                if 'current_time' in locals() and 'create_time' in locals():
-                    with transaction.atomic():
-                        assignment.review = str(e) if assignment.review  is None else assignment.review + ';' + str(e)
-                        assignment.save()
-            finally:
-                release_lock(assignment_id)
+@query_budget('upload_job', max_queries=25)
+def _upload_one(assignment):
+    """上传单个作业到 Turnitin 并更新数据库（在 worker 线程中执行）"""
+    with transaction.atomic():
+        if WebUserAssignments.objects.filter(id=assignment.id) == WebUserAssignments.Status.FAILED:return
+    in_flight = False
+    locked = False
+    try:
+        assignment_id = assignment.id  # 使用数据库主键 id 作为锁键
+        if not acquire_lock(assignment_id):
+            logger.info("作业 %s 已被其他进程锁定，跳过", assignment_id)
+            return
+        locked = True
+        metrics.inc_gauge('turnitin_worker_in_flight_jobs', {'pool': 'upload'})
+        in_flight = True
+        record_stage(assignment_id, 'picked_up')
+
+        user_id = assignment.uid
+        cleaned_name = assignment.title
+        storage_path = assignment.filepath if assignment.filepath else ""
+
+        full_storage_path = os.path.join(settings.MEDIA_ROOT, storage_path) if storage_path else ""
+        logger.debug("Full storage path: %s", full_storage_path)
+
+        # 移除 UTC 转换
+        current_time = timezone.now()
+        create_time = assignment.timeout_start
+
+        intervals = circuit_breaker.outage_intervals(UPLOAD_FAMILIES, create_time.timestamp())
+        if current_time > _deadline(create_time, timedelta(minutes=10), intervals):
+            release_lock(assignment_id)
+            raise RuntimeError('timeout')
+
+        if not storage_path or not default_storage.exists(full_storage_path):
+            logger.error("作业 %s 文件路径无效或文件不存在: %s", assignment_id, full_storage_path)
+            release_lock(assignment_id)
+            raise RuntimeError(f"作业 {assignment_id} 文件路径无效或文件不存在: {full_storage_path}")
+
+
+
+        is_saved = False
+
+        turnitin_service = TurnitinService()
+        async_to_sync(turnitin_service.initialize)()
+
+        with default_storage.open(storage_path, 'rb') as source_file:
+            userfile_content = b''.join(source_file.chunks())
+
+        result = turnitin_service.submit(
+            assignment_ids=[],
+            title=cleaned_name,
+            filename=assignment.filename,  # 逻辑文件名（用户目录/标题），存储路径为内容哈希
+            userfile=userfile_content,
+            open_id=user_id,
+            assign_id_in_db=assignment.id,
+            # 避开失败记录里的端口和重新排队前的端口
+            last_assignment_id=';'.join(filter(None, [assignment.review, assignment.previous_assignment_id]))
+        )
+
+        if 'assignment_id' in result.get('metadata', {}):
+            with transaction.atomic():
+                # 更新现有记录，而不是创建新记录
+                assignment = WebUserAssignments.objects.get(id=assignment.id)
+                assignment.assignment_id = result['metadata']['assignment_id']
+                assignment.mark_analysising()
+                assignment.save()
+                is_saved = True
+                logger.info("异步上传成功: user_id=%s, assignment_id=%s, turnitin_assignment_id=%s", user_id, assignment.id, result['metadata']['assignment_id'])
+
+    except CircuitOpenError as e:
+        # 上游熔断：不记入 review（不占用重试时使用的端口记录），停止扫描等待下一轮
+        logger.warning("上传任务暂停: %s，作业 %s 延后处理", e, assignment_id)
+        raise
+    except Exception as e:
+        logger.error(
+            "异步上传失败: assignment_id=%s, user_id=%s, 错误: %s", assignment_id, user_id, e,
+            exc_info=True
+        )
+        if 'current_time' in locals() and 'create_time' in locals():
+            with transaction.atomic():
+                assignment.review = str(e) if assignment.review  is None else assignment.review + ';' + str(e)
+                assignment.save()
+    finally:
+        # 没拿到锁时不能释放（锁属于其他 worker）
+        if locked:
+            release_lock(assignment_id)
+        if in_flight:
+            metrics.inc_gauge('turnitin_worker_in_flight_jobs', {'pool': 'upload'}, -1)
+
+@query_budget('upload_to_turnitin', max_queries=1)
+def _upload_to_turnitin_task():
+    """异步任务：将文件上传到 Turnitin 并更新数据库"""
+    assignments = WebUserAssignments.objects.filter(
+        status__in=[WebUserAssignments.Status.SUBMITTED, WebUserAssignments.Status.RETRY])
+    _run_adaptive('upload', assignments, _upload_one)
 
+@profile_task('scan_reports')
 def scan_reports():
     """定时任务，提交下载任务"""
-    logger.info(f"开始执行 scan_reports 任务，时间: {timezone.now()}")
+    logger.info("开始执行 scan_reports 任务，时间: %s", timezone.now())
+    update_queue_depth()
     download_reports()
-    logger.info(f"scan_reports 任务完成，时间: {timezone.now()}")
+    logger.info("scan_reports 任务完成，时间: %s", timezone.now())
 
+@profile_task('upload_to_turnitin_task')
 def upload_to_turnitin_task():
     """定时任务，提交上传任务"""
-    logger.info(f"开始执行 upload_to_turnitin_task 任务，时间: {timezone.now()}")
+    logger.info("开始执行 upload_to_turnitin_task 任务，时间: %s", timezone.now())
+    update_queue_depth()
     _upload_to_turnitin_task()
-    logger.info(f"upload_to_turnitin_task 任务完成，时间: {timezone.now()}")
+    logger.info("upload_to_turnitin_task 任务完成，时间: %s", timezone.now())
     
+@profile_task('failed_task')
+@query_budget('failed_task', max_queries=2, per_item=6)
 def failed_task():
+    # 熔断区间每轮只读一次，各作业按自己的创建时间计算重叠
+    since = (timezone.now() - timedelta(seconds=circuit_breaker.OUTAGE_RETENTION_SECONDS)).timestamp()
+    intervals = {
+        'upload': circuit_breaker.outage_intervals(UPLOAD_FAMILIES, since),
+        'download': circuit_breaker.outage_intervals(DOWNLOAD_FAMILIES, since),
+    }
+    timeout = timedelta(minutes=settings.FAILED_TASK_TIMEOUT_MINUTES)
     with transaction.atomic():
         assignments = WebUserAssignments.objects.filter(
             Q(status=WebUserAssignments.Status.SUBMITTED.value) |
-            Q(status=WebUserAssignments.Status.ANALYSING.value)
+            Q(status=WebUserAssignments.Status.ANALYSING.value) |
+            Q(status=WebUserAssignments.Status.RETRY.value)
         ).select_for_update()
     
         for assignment in assignments:
+            count_item()
             assignment_id = assignment.id  # 使用数据库主键 id 作为锁键
             if not acquire_lock(str(assignment_id) + '_to_failed'):
-                logger.info(f"作业 {assignment_id} 已被其他进程锁定，跳过")
+                logger.info("作业 %s 已被其他进程锁定，跳过", assignment_id)
                 continue
 
             user_id = assignment.uid
 
             # 移除 UTC 转换
             current_time = timezone.now()
-            create_time = assignment.create_datetime
+            create_time = assignment.timeout_start
             
-            if current_time - create_time > timedelta(minutes=15):
-                logger.error(f"作业 {assignment_id} 上传超时，上传时间：{assignment.update_datetime}")
+            stage = 'download' if assignment.status == WebUserAssignments.Status.ANALYSING else 'upload'
+            if current_time > _deadline(create_time, timeout, intervals[stage]):
+                logger.error("作业 %s 上传超时，上传时间：%s", assignment_id, assignment.update_datetime)
                 assignment.mark_failed()
                 assignment.save()
-                web_user = WebUser.objects.get(uid=user_id)
-                web_user.available_cnt += 1
-                web_user.save()
-            release_lock(str(assignment_id) + '_to_failed')
\ No newline at end of file
+                refund_for_failure(user_id, assignment_id)
+            release_lock(str(assignment_id) + '_to_failed')
+
+
+ARCHIVE_STATUSES = [
+    WebUserAssignments.Status.DOWNLOADED,
+    WebUserAssignments.Status.FAILED,
+    WebUserAssignments.Status.DELETED,
+]
+
+@query_budget('archive_finished_assignments', max_queries=1, per_item=3)
+def archive_finished_assignments(batch_size=None, max_batches=None):
+    """
+    定时任务：把超过保留期的已结束作业分批移入归档表
+    每批一个事务（复制 + 删除），中断后重新执行即可继续；归档表保留原 id，重复写入会被忽略
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.ARCHIVE_RETENTION_DAYS)
+    fields = [field.attname for field in WebUserAssignments._meta.concrete_fields]
+    archived = 0
+    batches = 0
+
+    # SKIP LOCKED 需要 MySQL 8.0.1+ / MariaDB 10.6+；旧版本退回普通行锁（并发执行时后者等待而不是跳过）
+    skip_locked = connection.features.has_select_for_update_skip_locked
+
+    logger.info("开始归档作业，截止时间: %s", cutoff)
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                WebUserAssignments.objects.select_for_update(skip_locked=skip_locked)
+                .filter(status__in=ARCHIVE_STATUSES, update_datetime__lt=cutoff)
+                .order_by('id')
+                .values(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            WebUserAssignmentsArchive.objects.bulk_create(
+                [WebUserAssignmentsArchive(**row) for row in rows], ignore_conflicts=True)
+            WebUserAssignments.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+        batches += 1
+        count_item()
+    logger.info("归档完成，本次归档 %s 条", archived)
+    return archived
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TransactionTestCase
+from django.utils import timezone
+
+from api.management.commands.check_query_budgets import BUDGETED_TASKS, BUDGETED_VIEWS
+from api.models import WebStoredFile, WebUser, WebUserAssignments
+from turnitin_admin import tasks, view
+from turnitin_admin.logging_utils import AsyncQueueHandler
+from turnitin_admin.query_budget import enforce_query_budgets, missing_budgets
+from turnitin_admin.service import circuit_breaker, storage_service
+from turnitin_admin.service import admission_service
+from turnitin_admin.service.admission_service import AdmissionRejected, admission_controller
+from turnitin_admin.service.dedup_service import register_report
+
+FORK_LOGGER = 'turnitin_admin.tests.fork'
+
+
+def _log_from_child():
+    logging.getLogger(FORK_LOGGER).info('child %s', os.getpid())
+
+
+class AsyncQueueHandlerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'app.log')
+        self.handler = AsyncQueueHandler(filename=self.filename)
+        self.logger = logging.getLogger(FORK_LOGGER)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+        for target in self.handler.targets:
+            target.close()
+        self.tmpdir.cleanup()
+
+    def _messages(self):
+        self.handler.close()
+        with open(self.filename, encoding='utf-8') as f:
+            return [json.loads(line)['message'] for line in f]
+
+    @unittest.skipUnless(hasattr(os, 'fork'), '需要 fork')
+    def test_forked_child_records_are_written(self):
+        # 与 django-q 一样用 fork 启动子进程
+        self.logger.info('parent')
+        process = multiprocessing.get_context('fork').Process(target=_log_from_child)
+        process.start()
+        process.join(10)
+        self.assertEqual(process.exitcode, 0)
+
+        messages = self._messages()
+        self.assertIn('parent', messages)
+        self.assertIn(f'child {process.pid}', messages)
+
+    def test_extras_are_serialized_on_calling_thread(self):
+        evaluated_on = []
+
+        class Lazy:
+            def __str__(self):
+                evaluated_on.append(threading.current_thread().name)
+                return 'lazy-user'
+
+        self.logger.info('extra', extra={'error_context': {'user': Lazy(), 'ids': (1, 2)}})
+        self.handler.close()
+
+        self.assertEqual(evaluated_on, [threading.current_thread().name])
+        with open(self.filename, encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(entry['error_context'], {'user': 'lazy-user', 'ids': [1, 2]})
+
+
+class FakeTurnitinService:
+    """Turnitin 替身：查询预算只关心数据库访问"""
+
+    async def initialize(self):
+        pass
+
+    def submit(self, **kwargs):
+        return {'metadata': {'assignment_id': f"tii-{kwargs['assign_id_in_db']}"}}
+
+    def download_ai_file(self, assignment_id, filename, job_id=None):
+        return b'%PDF-ai'
+
+    def download_plagiarism_file(self, assignment_id, user_id, job_id=None):
+        return b'%PDF-plagiarism'
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """
+    以严格模式实际调用每个视图和后台任务，超出 @query_budget 声明的预算即失败
+    视图通过 RequestFactory 直接调用（中间件会把异常转成 500）；Turnitin 用替身，Redis 使用配置中的实例
+    用 TransactionTestCase：TestCase 外层事务会让每个 atomic() 变成 SAVEPOINT，多出生产环境没有的查询
+    """
+    jobs = 5
+
+    def setUp(self):
+        self.uid = WebUser.objects.create(language='zh', nick_name='budget', available_cnt=100).uid
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = self.settings(MEDIA_ROOT=media_root, QUERY_BUDGET={'enabled': True, 'strict': False})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.factory = RequestFactory()
+
+    def _create_job(self, status=WebUserAssignments.Status.SUBMITTED, age=timedelta(0), **fields):
+        job = WebUserAssignments.objects.create(
+            user_id=self.uid, uid=self.uid, filename=f'{self.uid}/paper.docx', title='paper',
+            origin_title='paper.docx', status=status, **fields)
+        content = f'paper {job.id}'.encode()
+        content_hash = hashlib.sha256(content).hexdigest()
+        paper = storage_service.paper_path(content_hash, '.docx')
+        default_storage.save(paper, ContentFile(content))
+        storage_service.record_file(job.id, WebStoredFile.Kind.PAPER, paper, len(content), content_hash)
+        # create_datetime / update_datetime 是自动字段，用 update() 改成指定的作业年龄
+        WebUserAssignments.objects.filter(id=job.id).update(
+            filepath=paper, content_hash=content_hash,
+            create_datetime=timezone.now() - age, update_datetime=timezone.now() - age)
+        return WebUserAssignments.objects.get(id=job.id)
+
+    def _create_jobs(self, status, age=timedelta(0), **fields):
+        return [self._create_job(status, age, **fields) for _ in range(self.jobs)]
+
+    def test_every_view_and_task_declares_a_budget(self):
+        self.assertEqual(missing_budgets(view, BUDGETED_VIEWS), [])
+        self.assertEqual(missing_budgets(tasks, BUDGETED_TASKS), [])
+
+    # 视图
+
+    def test_home_view(self):
+        with enforce_query_budgets():
+            response = view.home_view(self.factory.get(f'/{self.uid}/'), user_id=self.uid)
+        self.assertEqual(response.status_code, 200)
+
+    def test_upload_file(self):
+        for reused in (False, True):  # 第二次上传相同内容命中报告复用
+            if reused:
+                job = WebUserAssignments.objects.get(uid=self.uid)
+                storage_service.save_report(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT, b'%PDF')
+                register_report(job, None, storage_service.report_path(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT))
+            request = self.factory.post('/turnitingood/upload/', {
+                'user_id': self.uid,
+                'document': SimpleUploadedFile('论文.docx', b'same paper content'),
+            })
+            with enforce_query_budgets():
+                response = view.upload_file(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['reused'], reused)
+
+    def test_get_web_user_assignments(self):
+        self._create_jobs(WebUserAssignments.Status.ANALYSING)
+        for params in ({}, {'history': '1'}, {'limit': '2', 'status': 'ANALYSING'}):
+            request = self.factory.get('/turnitingood/assignments/', {'user_id': self.uid, **params})
+            with enforce_query_budgets():
+                response = view.get_web_user_assignments(request)
+            self.assertEqual(response.status_code, 200)
+
+    def test_delete_job(self):
+        job = self._create_job(WebUserAssignments.Status.DOWNLOADED)
+        storage_service.save_report(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT, b'%PDF')
+        request = self.factory.post('/turnitingood/job/delete/', {'user_id': self.uid, 'job_id': job.id})
+        with enforce_query_budgets():
+            response = view.delete_job(request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_download_file(self):
+        job = self._create_job(WebUserAssignments.Status.DOWNLOADED)
+        storage_service.save_report(job.id, WebStoredFile.Kind.AI_REPORT, b'%PDF')
+        request = self.factory.get('/turnitingood/job/download/', {'user_id': self.uid, 'job_id': job.id, 'type': 'ai'})
+        with enforce_query_budgets():
+            response = view.download_file(request)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_metrics_view(self):
+        with enforce_query_budgets():
+            response = view.metrics_view(self.factory.get('/metrics'))
+        self.assertEqual(response.status_code, 200)
+
+    # 后台任务（分发任务的单个作业处理另外测，线程池里的查询不计入分发线程）
+
+    def test_update_queue_depth(self):
+        self._create_jobs(WebUserAssignments.Status.SUBMITTED)
+        with enforce_query_budgets():
+            tasks.update_queue_depth()
+
+    def test_download_reports_dispatch(self):
+        self._create_jobs(WebUserAssignments.Status.ANALYSING)
+        with mock.patch.object(tasks, '_download_one') as job, enforce_query_budgets():
+            tasks.download_reports()
+        self.assertEqual(job.call_count, self.jobs)
+
+    def test_upload_dispatch(self):
+        self._create_jobs(WebUserAssignments.Status.SUBMITTED)
+        with mock.patch.object(tasks, '_upload_one') as job, enforce_query_budgets():
+            tasks._upload_to_turnitin_task()
+        self.assertEqual(job.call_count, self.jobs)
+
+    @mock.patch.object(tasks, 'TurnitinService', FakeTurnitinService)
+    def test_download_one(self):
+        for age in (timedelta(0), timedelta(minutes=20)):  # 10 分钟内下载 AI + 重复率，之后只下载重复率
+            job = self._create_job(WebUserAssignments.Status.ANALYSING, age, assignment_id=f'tii-{age.seconds}')
+            with enforce_query_budgets():
+                tasks._download_one(job)
+            self.assertEqual(WebUserAssignments.objects.get(id=job.id).status, WebUserAssignments.Status.DOWNLOADED)
+
+    @mock.patch.object(tasks, 'TurnitinService', FakeTurnitinService)
+    def test_upload_one(self):
+        job = self._create_job(WebUserAssignments.Status.SUBMITTED)
+        with enforce_query_budgets():
+            tasks._upload_one(job)
+        self.assertEqual(WebUserAssignments.objects.get(id=job.id).status, WebUserAssignments.Status.ANALYSING)
+
+    def test_failed_task(self):
+        self._create_jobs(WebUserAssignments.Status.SUBMITTED,
+                          timedelta(minutes=settings.FAILED_TASK_TIMEOUT_MINUTES + 1))
+        with enforce_query_budgets():
+            tasks.failed_task()
+        self.assertEqual(WebUserAssignments.objects.filter(status=WebUserAssignments.Status.FAILED).count(), self.jobs)
+
+    def test_archive_finished_assignments(self):
+        self._create_jobs(WebUserAssignments.Status.DOWNLOADED, timedelta(days=settings.ARCHIVE_RETENTION_DAYS + 1))
+        with enforce_query_budgets():
+            archived = tasks.archive_finished_assignments(batch_size=2)
+        self.assertEqual(archived, self.jobs)
+
+
+class CircuitOutageDeadlineTests(TransactionTestCase):
+    """上游熔断期间作业无法推进，超时判断顺延中断时间"""
+
+    def setUp(self):
+        self.uid = WebUser.objects.create(language='zh', nick_name='outage', available_cnt=0).uid
+        self.age = timedelta(minutes=settings.FAILED_TASK_TIMEOUT_MINUTES + 5)
+        job = WebUserAssignments.objects.create(
+            user_id=self.uid, uid=self.uid, filename=f'{self.uid}/paper.docx', title='paper', origin_title='paper.docx')
+        WebUserAssignments.objects.filter(id=job.id).update(create_datetime=timezone.now() - self.age)
+        self.job_id = job.id
+
+    def _run_failed_task(self, intervals):
+        with mock.patch.object(circuit_breaker, 'outage_intervals', return_value=intervals):
+            tasks.failed_task()
+        return WebUserAssignments.objects.get(id=self.job_id).status
+
+    def test_job_fails_without_outage(self):
+        self.assertEqual(self._run_failed_task([]), WebUserAssignments.Status.FAILED)
+
+    def test_ongoing_outage_extends_deadline(self):
+        now = timezone.now().timestamp()
+        self.assertEqual(self._run_failed_task([(now - 600, now)]), WebUserAssignments.Status.SUBMITTED)
+
+    def test_outage_before_job_creation_is_ignored(self):
+        created = (timezone.now() - self.age).timestamp()
+        self.assertEqual(self._run_failed_task([(created - 3600, created)]), WebUserAssignments.Status.FAILED)
+
+    def test_outage_overlap_clips_to_job_lifetime(self):
+        self.assertEqual(circuit_breaker.outage_overlap([(0, 10), (20, 30)], 5), 15)
+
+
+class AdmissionOrderTests(TransactionTestCase):
+    """准入控制只限制需要排队提交 Turnitin 的上传，命中报告复用的上传不受影响"""
+
+    def setUp(self):
+        self.uid = WebUser.objects.create(language='zh', nick_name='admission', available_cnt=10).uid
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = self.settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.factory = RequestFactory()
+
+    def _upload(self, rejected=True):
+        view.redis_client.delete(f'upload_lock:{self.uid}')
+        request = self.factory.post('/turnitingood/upload/', {
+            'user_id': self.uid,
+            'document': SimpleUploadedFile('paper.docx', b'admission paper'),
+        })
+        side_effect = AdmissionRejected(60, 3600) if rejected else None
+        with mock.patch.object(admission_controller, 'check', side_effect=side_effect):
+            return view.upload_file(request)
+
+    def test_rejects_upload_that_needs_turnitin(self):
+        response = self._upload()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertFalse(WebUserAssignments.objects.filter(uid=self.uid).exists())
+
+    def test_reused_report_skips_admission(self):
+        self.assertEqual(self._upload(rejected=False).status_code, 200)
+        job = WebUserAssignments.objects.get(uid=self.uid)
+        storage_service.save_report(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT, b'%PDF')
+        register_report(job, None, storage_service.report_path(job.id, WebStoredFile.Kind.PLAGIARISM_REPORT))
+
+        response = self._upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['reused'])
+
+
+class AdmissionControllerTests(TransactionTestCase):
+
+    def setUp(self):
+        admission_service.redis_client.delete(admission_service.THROUGHPUT_CACHE_KEY, admission_service.COMPLETIONS_KEY)
+        self.controller = admission_service.AdmissionController()
+        self.uid = WebUser.objects.create(language='zh', nick_name='burst', available_cnt=0).uid
+
+    def test_burst_is_checked_against_current_queue_depth(self):
+        self.controller.check()  # 吞吐量已缓存
+        allowed_depth = int(self.controller.deadline_seconds / 60 * settings.ADMISSION_DEFAULT_THROUGHPUT_PER_MINUTE) - 1
+        WebUserAssignments.objects.bulk_create([
+            WebUserAssignments(user_id=self.uid, uid=self.uid, filename='f', title='t', origin_title='t')
+            for _ in range(allowed_depth + 1)
+        ])
+        with self.assertRaises(AdmissionRejected):
+            self.controller.check()
+
+    def test_redis_failure_fails_open(self):
+        with mock.patch.object(admission_service.redis_client, 'get', side_effect=admission_service.redis.RedisError):
+            self.assertIsNone(self.controller.check())
@@ -19,12 +19,13 @@ from django.urls import path, include
 from django.urls import path
 from django.views.generic import RedirectView
 from .view import home_view, upload_file, get_web_user_assignments\
-    ,delete_job, download_file
+    ,delete_job, download_file, metrics_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('turnitingood/', include('api.urls')),  # 包含 api 模块的 URL
+    path('metrics', metrics_view, name='metrics'),  # Prometheus 指标
     path('', home_view, name='home'),  # 匿名用户主页
     path('<str:user_id>/', home_view, name='home_with_user'),  # 指定用户 ID 的主页
     path('turnitingood/upload/', upload_file, name='upload_file'),
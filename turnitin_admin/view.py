@@ -1,25 +1,38 @@
 import logging
 from django.shortcuts import render
 from django.views.decorators.http import require_GET, require_POST
-from django.http import JsonResponse, HttpResponseBadRequest, FileResponse
+from django.http import JsonResponse, HttpResponseBadRequest, FileResponse, HttpResponse, HttpResponseForbidden
 from django.conf import settings
-from api.models import WebUser, WebUserAssignments
+from api.models import WebUser, WebUserAssignments, WebUserAssignmentsArchive, WebStoredFile
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from pypinyin import lazy_pinyin
 from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
 from pathlib import Path
 from django.http import StreamingHttpResponse
 
 from asgiref.sync import sync_to_async
 from asgiref.sync import sync_to_async, async_to_sync
 from .service.turnitin_service import TurnitinService  
+from .service.dedup_service import new_content_hasher, find_reusable_report, reuse_report
+from .service.credit_service import debit_for_upload, InsufficientCreditError
+from .service.admission_service import admission_controller, AdmissionRejected
+from .service.timeline_service import record_stage
+from .service.storage_service import (
+    DOWNLOAD_KINDS, delete_job_files, file_path as stored_file_path, incoming_path, paper_path, record_file,
+    store_paper,
+)
+from .service import metrics
+from .query_budget import query_budget
 from django_q.tasks import async_task
 
 import os
 import re
+import math
 import traceback
 import asyncio
 import redis
@@ -29,6 +42,10 @@ logger = logging.getLogger(__name__)
 
 redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0, decode_responses=True)
 
+# 作业列表分页大小
+JOBS_PAGE_SIZE = 50
+JOBS_MAX_PAGE_SIZE = 200
+
 
 def log_exception(e, request=None, extra_context=None):
     """统一的异常日志记录函数"""
@@ -40,10 +57,12 @@ def log_exception(e, request=None, extra_context=None):
     }
     
     if request:
+        # 只记录用户 id：request.user 是惰性对象，不能交给日志监听线程去求值
+        user = getattr(request, 'user', None)
         error_context.update({
             'path': request.path,
             'method': request.method,
-            'user': getattr(request, 'user', None),
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
             'params': dict(request.GET) if request.method == 'GET' else dict(request.POST)
         })
     
@@ -57,6 +76,15 @@ def log_exception(e, request=None, extra_context=None):
         extra={'error_context': error_context}
     )
 
+def _estimated_wait_minutes():
+    """页面显示的预计等待时间（分钟）"""
+    try:
+        return max(1, math.ceil(admission_controller.estimate()['eta_seconds'] / 60))
+    except Exception as e:
+        logger.warning("获取预计等待时间失败: %s", e)
+        return 2
+
+@query_budget('home_view', max_queries=3)
 def home_view(request, user_id=None):
     try:
         if user_id and user_id.strip():
@@ -81,6 +109,7 @@ def home_view(request, user_id=None):
             'user_id': user_id if user_id else 'anonymous',
             'language': language,
             'remaining_checks': remaining_checks,
+            'estimated_wait_minutes': _estimated_wait_minutes(),
             'jobs': jobs
         }
         return render(request, 'home/index.html', context)
@@ -91,10 +120,12 @@ def home_view(request, user_id=None):
             'user_id': 'anonymous',
             'language': 'zh',
             'remaining_checks': 0,
+            'estimated_wait_minutes': 2,
             'jobs': []
         }, status=200)
 
 
+@query_budget('upload_file', max_queries=30)
 @require_POST
 @transaction.atomic
 def upload_file(request):
@@ -147,51 +178,73 @@ def upload_file(request):
         cleaned_name = ''.join(lazy_pinyin(cleaned_name))  # 中文转拼音
         cleaned_name = re.sub(r'\.+', '', cleaned_name)  # 去掉多余的.
 
-        # 7. 构造存储路径
-        storage_dir = os.path.join(user_id)
-        storage_path = os.path.join(storage_dir, f"{cleaned_name}{file_ext}")
-        full_path = os.path.join(settings.MEDIA_ROOT, storage_path)
+        # 7. 构造存储路径：filename 为展示 / 提交 Turnitin 用的逻辑名，文件先写入临时路径
+        storage_path = os.path.join(user_id, f"{cleaned_name}{file_ext}")
+        incoming = incoming_path(file_ext)
+        full_path = default_storage.path(incoming)
 
         # 8. 确保目录存在并可写
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
         if not os.access(os.path.dirname(full_path), os.W_OK):
             raise PermissionError(f"目录 {os.path.dirname(full_path)} 无写权限")
 
-        logger.debug(f"MEDIA_ROOT: {settings.MEDIA_ROOT}")
-        logger.debug(f"Storage path: {storage_path}")
-        logger.debug(f"Full path: {full_path}")
+        logger.debug("Incoming path: %s", incoming)
 
-        # 9. 高效文件保存（分块写入）
+        # 9. 高效文件保存（分块写入，同时计算内容哈希），写完后移到按内容哈希分目录的位置
         try:
-            with default_storage.open(storage_path, 'wb') as destination:
+            hasher = new_content_hasher()
+            with default_storage.open(incoming, 'wb') as destination:
                 for chunk in file.chunks():
+                    hasher.update(chunk)
                     destination.write(chunk)
                 destination.flush()
-                logger.debug(f"文件写入完成: {storage_path}")
-
-            # 验证文件是否保存成功
-            if not default_storage.exists(full_path):
-                raise FileNotFoundError(f"文件未成功保存到 {storage_path}")
-
-            # 10. 创建初始数据库记录
-            initial_assignment = WebUserAssignments.objects.create(
-                user_id=web_user.uid,
-                uid=web_user.uid,
-                filename=storage_path,
-                title=cleaned_name,
-                origin_title=origin_title,
-                assignment_id="",
-                status=WebUserAssignments.Status.SUBMITTED,
-                filepath=storage_path,
-                create_datetime=timezone.now(),
-                update_datetime=timezone.now()
-            )
-
-            # 11. 更新用户次数
-            web_user.available_cnt -= 1
-            web_user.save()
-
-            # 12. 调度异步任务上传到 Turnitin
+            content_hash = hasher.hexdigest()
+            paper = paper_path(content_hash, file_ext)
+
+            # 10. 相同内容在时间窗口内已有报告，直接复用，不再提交 Turnitin
+            reusable = find_reusable_report(content_hash)
+            if not reusable:
+                # 准入检查：只有需要排队提交 Turnitin 的上传才受限，排队过多、无法在时限内完成时直接拒绝
+                try:
+                    admission_controller.check()
+                except AdmissionRejected:
+                    default_storage.delete(incoming)
+                    redis_client.delete(lock_key)
+                    raise
+
+            # 11. 创建初始数据库记录并扣减次数（同一保存点内，扣减失败则作业记录一并回滚）
+            with transaction.atomic():
+                initial_assignment = WebUserAssignments.objects.create(
+                    user_id=web_user.uid,
+                    uid=web_user.uid,
+                    filename=storage_path,
+                    title=cleaned_name,
+                    origin_title=origin_title,
+                    assignment_id="",
+                    status=WebUserAssignments.Status.SUBMITTED if not reusable else WebUserAssignments.Status.DOWNLOADED,
+                    filepath=paper,
+                    content_hash=content_hash,
+                    review=None if not reusable else f"复用作业 {reusable.source_job_id} 的报告",
+                    create_datetime=timezone.now(),
+                    update_datetime=timezone.now()
+                )
+
+                # 先登记引用再放置文件：并发删除同内容的最后一个作业时，登记会等删除事务结束，
+                # 之后文件已被删掉则由本次上传的临时文件补上
+                record_file(initial_assignment.id, WebStoredFile.Kind.PAPER, paper, file.size, content_hash)
+                store_paper(incoming, content_hash, file_ext)
+                logger.debug("文件写入完成: %s", paper)
+                if reusable:
+                    reuse_report(reusable, initial_assignment.id)
+
+                # 12. 条件 UPDATE 扣减次数并记录流水
+                debit_for_upload(web_user.uid, initial_assignment.id)
+
+            record_stage(initial_assignment.id, 'stored', at=initial_assignment.create_datetime)
+            if reusable:
+                record_stage(initial_assignment.id, 'saved', at=initial_assignment.create_datetime)
+
+            # 13. 调度异步任务上传到 Turnitin
             # async_task(
             #     'turnitin_admin.tasks.upload_to_turnitin_task',
             #     task_name=f"turnitin_upload_{initial_assignment.id}",
@@ -199,21 +252,35 @@ def upload_file(request):
             # )
             # logger.info(f"异步任务已调度: user_id={web_user.uid}, assignment_id={initial_assignment.id}")
 
-            # 13. 立即返回响应
+            # 14. 立即返回响应
             return JsonResponse({
-                'message': '文件上传成功，处理中',
+                'message': '文件上传成功，处理中' if not reusable else '文件上传成功，报告已生成',
                 'job_id': initial_assignment.id,
                 'filename': storage_path,
                 'status': initial_assignment.get_status_display(),
+                'reused': bool(reusable),
                 'timestamp': timezone.now().isoformat()
             })
 
+        except (InsufficientCreditError, AdmissionRejected):
+            raise
         except Exception as e:
             # if default_storage.exists(storage_path):
             #     default_storage.delete(storage_path)
             raise RuntimeError('上传失败，请重试')
             
 
+    except AdmissionRejected as e:
+        response = JsonResponse({
+            'error': str(e),
+            'details': str(e),
+            'status': 'error',
+            'retry_after': e.retry_after,
+            'eta_seconds': e.eta_seconds,
+            'timestamp': timezone.now().isoformat()
+        }, status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
     except Exception as e:
         extra_context = {
             'storage_path': storage_path if 'storage_path' in locals() else None,
@@ -237,42 +304,106 @@ def upload_file(request):
         if redis_client.get(lock_key):
             redis_client.delete(lock_key)
 
+@query_budget('get_web_user_assignments', max_queries=4)
 @require_GET
 def get_web_user_assignments(request):
     return async_to_sync(_get_web_user_assignments)(request)
 
 
+def _encode_jobs_cursor(row):
+    """游标 = 最后一条的 (create_datetime, id)"""
+    return f"{row['create_datetime'].isoformat()}_{row['id']}"
+
+
+def _decode_jobs_cursor(cursor):
+    created, _, job_id = cursor.rpartition('_')
+    created_at = parse_datetime(created)
+    if created_at is None or not job_id.isdigit():
+        raise ValueError("无效的 cursor 参数")
+    return created_at, int(job_id)
+
+
+def _jobs_page_queryset(model, user_id, limit, cursor=None, status=None, since=None):
+    """按 (create_datetime, id) 倒序的 keyset 分页，只取页面需要的字段"""
+    queryset = model.objects.filter(uid=user_id).exclude(
+        status=WebUserAssignments.Status.DELETED)
+    if status:
+        queryset = queryset.filter(status=status)
+    if since:
+        queryset = queryset.filter(create_datetime__gte=since)
+    if cursor:
+        created_at, job_id = cursor
+        queryset = queryset.filter(
+            Q(create_datetime__lt=created_at) | Q(create_datetime=created_at, id__lt=job_id))
+    return list(
+        queryset.order_by('-create_datetime', '-id')
+        .values('id', 'status', 'title', 'create_datetime')[:limit + 1]
+    )
+
+
+def _query_jobs_page(user_id, limit, cursor=None, status=None, since=None, include_archive=False):
+    """查询一页作业；include_archive 时同时读取归档表并按相同顺序归并"""
+    rows = _jobs_page_queryset(WebUserAssignments, user_id, limit, cursor, status, since)
+    if include_archive:
+        rows += _jobs_page_queryset(WebUserAssignmentsArchive, user_id, limit, cursor, status, since)
+        rows.sort(key=lambda row: (row['create_datetime'], row['id']), reverse=True)
+        rows = rows[:limit + 1]
+    return rows
+
+
 async def _get_web_user_assignments(request):
     try:
         user_id = request.GET.get('user_id')
         if not user_id:
             raise ValueError("缺少 user_id 参数")
 
+        # 分页与过滤参数
+        limit = int(request.GET.get('limit') or JOBS_PAGE_SIZE)
+        limit = max(1, min(limit, JOBS_MAX_PAGE_SIZE))
+        cursor = request.GET.get('cursor')
+        cursor = _decode_jobs_cursor(cursor) if cursor else None
+        status = request.GET.get('status')
+        if status and status not in WebUserAssignments.Status.values:
+            raise ValueError("无效的 status 参数")
+        include_archive = request.GET.get('history') in ('1', 'true')
+        since = request.GET.get('since')
+        if since:
+            since_value = parse_datetime(since) or parse_date(since)
+            if since_value is None:
+                raise ValueError("无效的 since 参数")
+            since = since_value
+
         # Fetch assignments asynchronously
-        assignments = await sync_to_async(
-            lambda: list(WebUserAssignments.objects.filter(uid=user_id).exclude(
-                     status=WebUserAssignments.Status.DELETED))
+        rows = await sync_to_async(
+            lambda: _query_jobs_page(user_id, limit, cursor=cursor, status=status, since=since,
+                                     include_archive=include_archive)
         )()
-        
-        web_user = await sync_to_async(lambda: WebUser.objects.get(uid=user_id))()
+        next_cursor = _encode_jobs_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+
+        remaining_checks = await sync_to_async(
+            lambda: WebUser.objects.values_list('available_cnt', flat=True).get(uid=user_id))()
+        estimated_wait_minutes = await sync_to_async(_estimated_wait_minutes)()
 
         # Prepare response data
         jobs_status = [
             {
-                'job_id': assignment.id,
-                'status': assignment.status,
-                'title': assignment.title,
-                'upload_time': assignment.create_datetime.isoformat()
+                'job_id': row['id'],
+                'status': row['status'],
+                'title': row['title'],
+                'upload_time': row['create_datetime'].isoformat()
             }
-            for assignment in assignments
+            for row in rows
         ]
 
         logger.info(f"检查用户 {user_id} 的作业状态，作业数量: {len(jobs_status)}")
         return JsonResponse({
             'status': 'success',
             'jobs': jobs_status,
+            'next_cursor': next_cursor,
             'user_id': user_id,
-            'remaining_checks': web_user.available_cnt,
+            'remaining_checks': remaining_checks,
+            'estimated_wait_minutes': estimated_wait_minutes,
             'timestamp': timezone.now().isoformat()
         })
 
@@ -286,6 +417,7 @@ async def _get_web_user_assignments(request):
             'details': str(e)
         }, status=500)
 
+@query_budget('delete_job', max_queries=12)
 @require_POST
 def delete_job(request):
     try:
@@ -295,11 +427,17 @@ def delete_job(request):
         if not all([user_id, job_id]):
             raise ValueError("缺少必要参数")
 
-        assignment = WebUserAssignments.objects.get(user_id=user_id, id=job_id)
-        if assignment.filepath and default_storage.exists(assignment.filepath):
-            default_storage.delete(assignment.filepath)
-        assignment.mark_delete()
-        assignment.save()
+        assignment = WebUserAssignments.objects.filter(user_id=user_id, id=job_id).first()
+        if assignment is None:
+            # 已归档的作业在归档表中标记删除
+            archived = WebUserAssignmentsArchive.objects.get(user_id=user_id, id=job_id)
+            delete_job_files(archived)
+            archived.status = WebUserAssignments.Status.DELETED
+            archived.save(update_fields=['status'])
+        else:
+            delete_job_files(assignment)
+            assignment.mark_delete()
+            assignment.save()
         
         logger.info(f"用户 {user_id} 删除作业 {job_id}")
         return JsonResponse({
@@ -328,6 +466,7 @@ def delete_job(request):
 
 
 
+@query_budget('download_file', max_queries=4)
 @require_GET
 def download_file(request):
     try:
@@ -338,24 +477,21 @@ def download_file(request):
         if not all([user_id, job_id, report_type]):
             raise ValueError("缺少 user_id、job_id 或 type 参数")
 
-        # 使用主键查找对应记录
-        assignment = WebUserAssignments.objects.get(id=job_id)
+        # 使用主键查找对应记录，找不到时查归档表
+        assignment = WebUserAssignments.objects.filter(id=job_id).first() \
+            or WebUserAssignmentsArchive.objects.get(id=job_id)
         if assignment.uid != user_id:
             raise PermissionError("用户无权访问该作业")
 
-        # 根据 report_type 确定文件路径
-        base_path = Path(assignment.filepath)
-        if report_type == 'report':
-            file_path = base_path.with_name(base_path.stem + '_plagiarism.pdf')
-        elif report_type == 'ai':
-            file_path = base_path.with_name(base_path.stem + '_ai.pdf')
-        else:
+        # 根据 report_type 从文件清单查找路径
+        if report_type not in DOWNLOAD_KINDS:
             raise ValueError("无效的 report_type 参数")
+        file_path = stored_file_path(assignment, DOWNLOAD_KINDS[report_type])
 
-        if not default_storage.exists(file_path):
+        if not file_path or not default_storage.exists(file_path):
             raise FileNotFoundError(f"文件 {file_path} 不存在")
 
-        download_filename = f"{assignment.title}_{report_type}_{timezone.now().strftime('%Y%m%d_%H%M%S')}{file_path.suffix}"
+        download_filename = f"{assignment.title}_{report_type}_{timezone.now().strftime('%Y%m%d_%H%M%S')}{Path(file_path).suffix}"
         file = default_storage.open(file_path, 'rb')
         response = FileResponse(file, as_attachment=True, filename=download_filename)
         logger.info(f"用户 {user_id} 下载作业 {job_id} 的文件: {download_filename}")
@@ -391,4 +527,13 @@ def download_file(request):
             'error': '内部服务器错误',
             'details': str(e),
             'status': 'error'
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+@query_budget('metrics_view', max_queries=0)
+@require_GET
+def metrics_view(request):
+    """Prometheus 抓取接口"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')